@@ -47,6 +47,7 @@ setup(
                       'jsonschema',
                       'neo4j',
                       'morph',
+                      'numpy',
                       'objectpath',
                       'py',
                       'python_cypher',
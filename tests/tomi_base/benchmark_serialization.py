@@ -0,0 +1,33 @@
+from timeit import timeit
+
+from tomi_graph.nodes.core import DEFAULT_ENCODING
+from tomi_graph.nodes.node_class import Node, NodeBaseClass
+from tomi_graph.serialization import binary
+
+NUMBER = 200
+
+leaves = [Node(dict(index=i, value=i / 3, label="leaf {i}".format(i=i))) for i in range(200)]
+root = Node(dict(children=[Node(leaves[i:i + 20]) for i in range(0, len(leaves), 20)]))
+
+json_string = str(root)
+encoded = binary.encode(root)
+
+print("json size:   {s} bytes".format(s=len(json_string.encode(DEFAULT_ENCODING))))
+print("binary size: {s} bytes".format(s=len(encoded)))
+
+
+def compare(json_label, json_time, binary_label, binary_time):
+    print("{j:<14}{t:.4f}s".format(j=json_label + ":", t=json_time))
+    print("{b:<14}{t:.4f}s".format(b=binary_label + ":", t=binary_time))
+    print("{b} speedup: {s:.2f}x".format(b=binary_label, s=json_time / binary_time))
+    assert binary_time < json_time, "{b} is slower than {j}".format(b=binary_label, j=json_label)
+
+
+compare("str", timeit(lambda: str(root), number=NUMBER),
+        "encode", timeit(lambda: binary.encode(root), number=NUMBER))
+compare("from_str", timeit(lambda: NodeBaseClass.from_str(json_string), number=NUMBER),
+        "decode", timeit(lambda: binary.decode(encoded), number=NUMBER))
+
+graph = root.graph
+compare("graph json", timeit(lambda: str(graph), number=NUMBER),
+        "graph encode", timeit(lambda: binary.encode(graph), number=NUMBER))
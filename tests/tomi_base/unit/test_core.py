@@ -7,9 +7,15 @@ from testfixtures import LogCapture
 from tomi_base.shared.logging import create_logger
 from tomi_base.shared.logging.auto.logging import auto_log
 
+from tomi_graph.entity_class_generator import EntityClassGenerator
 from tomi_graph.nodes.core import DEFAULT_ENCODING
 from tomi_graph.nodes.exceptions import CoreDocumentException, EncodingWarning, CircularReferenceWarning
 from tomi_graph.nodes.node_class import Node, NodeBaseClass
+from tomi_graph.serialization import binary
+from tomi_graph.serialization.json_stream import iter_json, dump
+from tomi_graph.version_aware_entity import VersionAwareEntity
+from tomi_graph.version_conflict_exception import VersionConflictException
+from tomi_graph.version_store import VersionStore
 
 globals()["cache"] = {}
 
@@ -80,6 +86,39 @@ def test_encoding_warning(recwarn):
     assert doc.encoding.lower() == encoding
 
 
+def test_declared_encoding_skips_detection(recwarn):
+    warnings.simplefilter("always")
+    doc = Node(data="d\u00e9j\u00e0 vu".encode(DEFAULT_ENCODING))
+    assert len(recwarn) == 0
+    assert doc.get_data() == "d\u00e9j\u00e0 vu"
+    assert doc.encoding == DEFAULT_ENCODING
+
+
+def test_encoding_sample_size(recwarn):
+    encoding = "utf-16"
+    bytes_val = dumps(TEST_VAL).encode(encoding)
+    warnings.simplefilter("always")
+    doc = Node(data=bytes_val, options={Node.ENCODING_SAMPLE_SIZE_OPTION: 8})
+    assert recwarn.pop(EncodingWarning)
+    assert doc.get_data() == dumps(TEST_VAL)
+
+
+def test_keep_bytes():
+    bytes_val = TEST_DATA.encode("utf-16")
+    doc = Node(data=bytes_val, options={Node.KEEP_BYTES_OPTION: True})
+    assert doc.get_data() == bytes_val
+    assert doc.encoding == DEFAULT_ENCODING
+
+    parent = Node(dict(raw=b"\x00\xff"))
+    for node in (doc, parent):
+        assert "".join(iter_json(node)) == str(node)
+        assert "bytes" in repr(node)
+    assert NodeBaseClass.from_str(str(doc)).get_data() == bytes_val
+    assert NodeBaseClass.from_str(str(parent)).get_data() == dict(raw=b"\x00\xff")
+    assert binary.decode(binary.encode(doc)).get_data() == bytes_val
+    assert str(binary.decode(binary.encode(parent))) == str(parent)
+
+
 def test_circular_warning(recwarn):
     warnings.simplefilter("always")
     inner_doc = Node()
@@ -89,6 +128,25 @@ def test_circular_warning(recwarn):
     assert recwarn.pop(CircularReferenceWarning)
 
 
+def test_trusted_load_skips_circular_check(recwarn):
+    warnings.simplefilter("always")
+    with Node.trusted_load():
+        inner_doc = Node()
+        main_doc = Node(data=inner_doc)
+        inner_doc.set_data(main_doc)
+    assert len(recwarn) == 0
+    assert Node.find_circular_reference(main_doc) is not None
+
+
+def test_find_circular_reference():
+    shared = [Node(TEST_DATA)]
+    assert Node.find_circular_reference(Node(dict(a=shared, b=shared))) is None
+
+    lst = [1, "two"]
+    lst.append(dict(lst=lst))
+    assert Node.find_circular_reference(lst) is lst
+
+
 def test_init_with_serialize_exc():
     val = dumps({"test": "value"})
     with pytest.raises(Exception) as e_info:
@@ -120,6 +178,20 @@ def test_from_str():
     assert str(dd) == str(d)
 
 
+def test_nested_from_str():
+    nested_type = EntityClassGenerator(NodeBaseClass, VersionAwareEntity).create("NestedType",
+                                                                               additional_fields=["field1"])
+    inner = nested_type(TEST_DATA)
+    inner.field1 = 1
+    outer = Node([dict(inner=inner), Node(TEST_DATA)]).new_version()
+
+    restored = Node.from_str(str(outer))
+    assert str(restored) == str(outer)
+    assert restored.version == 1
+    assert type(restored.get_data()[0]["inner"]) == nested_type
+    assert restored.get_data()[0]["inner"].field1 == 1
+
+
 def test_dict_from_str():
     dico = Node.from_str(dumps(dict(test=Node().toDict())))
     assert type(dico) == dict
@@ -145,6 +217,58 @@ def test_other_from_str():
     assert type(o["test"]) == str
 
 
+def test_streaming_serializer(tmpdir):
+    parent = Node([dict(docs=Node(Node(TEST_DATA))), Node(TEST_DATA)]).new_version()
+    assert "".join(iter_json(parent)) == str(parent)
+    assert "".join(iter_json(parent, chunk_size=1)) == str(parent)
+
+    target = tmpdir.mkdir("sub").join("node.json")
+    with open(str(target), "w") as fp:
+        dump(parent, fp)
+    assert target.read() == str(parent)
+
+
+def test_binary_serializer():
+    parent = Node([dict(docs=Node(Node(TEST_DATA)), n=-1.5, i=-42), Node(TEST_DATA), None, True]).new_version()
+    encoded = binary.encode(parent)
+    assert len(encoded) < len(str(parent).encode(DEFAULT_ENCODING))
+    assert str(binary.decode(encoded)) == str(parent)
+    assert str(binary.decode(encoded)) == str(NodeBaseClass.from_str(str(parent)))
+    assert binary.decode(encoded, new=True).id != parent.id
+
+    with pytest.raises(binary.BinaryFormatException):
+        binary.decode(str(parent).encode(DEFAULT_ENCODING))
+
+    lookalike = NodeBaseClass(dict(ref="NodeBaseClass:abc"), id="abc", name="NodeBaseClass:abc", key="NodeBaseClass:abc")
+    decoded = binary.decode(binary.encode(lookalike))
+    assert (decoded.name, decoded.key, decoded.get_data()) == (lookalike.name, lookalike.key, lookalike.get_data())
+    assert decoded.unique_index == lookalike.unique_index
+
+
+def test_bulk_create():
+    records = [dict(data=TEST_DATA, name="N{i}".format(i=i), key=i) for i in range(100)]
+    nodes = Node.bulk_create(records + [dict(id="FIXED", data=(1, 2))])
+    assert len(nodes) == 101
+    assert len(set(n.id for n in nodes)) == 101
+    assert len(set(n.create_date for n in nodes)) == 1
+    assert nodes[-1].id == "FIXED"
+    assert nodes[-1].get_data() == [1, 2]
+
+    built = Node(TEST_DATA, id=nodes[0].id, name="N0", key=0, create_date=nodes[0].create_date)
+    assert str(nodes[0]) == str(built)
+    assert nodes[0] == built
+
+    nodes[0].name = "renamed"
+    assert nodes[0] != built
+
+    typed = Node.bulk_create([dict(data="x")], node_type="BulkNode")
+    assert type(typed[0]).__name__ == "BulkNode"
+    assert type(typed[0]).bulk_create([dict(data="y")])[0].node_type == "BulkNode"
+
+    with pytest.raises(TypeError):
+        Node.bulk_create([dict(unknown=1)])
+
+
 def test_repr():
     d = Node()
     r = repr(d)
@@ -167,38 +291,163 @@ def test_hash():
     assert hash(d) != hash(dd)
 
 
+def test_fingerprint_cache():
+    d = Node(TEST_DATA)
+    fingerprint = d.fingerprint
+    assert fingerprint == d.fingerprint
+    assert fingerprint == d.clone(new=False).fingerprint
+
+    d.name = "name"
+    assert d.fingerprint != fingerprint
+
+    fingerprint = d.fingerprint
+    d.set_data(TEST_VAL)
+    assert d.fingerprint != fingerprint
+
+    fingerprint = d.fingerprint
+    assert d.new_version().fingerprint != fingerprint
+
+
+def test_merkle_fingerprint():
+    leaf = Node(TEST_DATA)
+    sibling = Node(TEST_DATA)
+    middle = Node(dict(leaf=leaf))
+    root = Node([middle, sibling])
+
+    fingerprint = root.fingerprint
+    sibling_fingerprint = sibling.fingerprint
+    assert root == root.clone(new=False)
+
+    leaf.name = "changed"
+    assert middle.__dict__["_fingerprint"] is None
+    assert root.__dict__["_fingerprint"] is None
+    assert sibling.__dict__["_fingerprint"] == sibling_fingerprint
+    assert root.fingerprint != fingerprint
+
+
+def test_copy_on_write_new_version():
+    v1 = Node(dict(big=list(range(1000)), nested=dict(value=1)))
+    v2 = v1.new_version()
+    assert v2.peek_data() is v1.peek_data()
+
+    v2.get_data()["nested"]["value"] = 2
+    assert v1.get_data()["nested"]["value"] == 1
+    assert v2.get_data()["nested"]["value"] == 2
+    assert dict.__getitem__(v2.peek_data(), "big") is dict.__getitem__(v1.peek_data(), "big")
+
+
+def test_copy_on_write_handed_out_data():
+    raw = dict(values=[1])
+    v1 = Node(raw)
+    data = v1.get_data()
+    assert data is raw
+    values = data["values"]
+    v2 = v1.new_version()
+    values.append(2)
+    data["other"] = 1
+    assert v2.get_data() == dict(values=[1])
+    assert v1.get_data() is data
+
+    values = v2.get_data()["values"]
+    v3 = v2.new_version()
+    values.append(3)
+    assert v3.get_data() == dict(values=[1])
+    assert v2.get_data() == dict(values=[1, 3])
+
+
+def test_copy_on_write_embedded_nodes():
+    child = Node(dict(value=1), name="child")
+    v1 = Node(dict(child=child))
+    v2 = v1.new_version()
+    fingerprint = v2.fingerprint
+
+    v2.get_data()["child"].name = "changed"
+    assert v1.get_data()["child"].name == "child"
+    assert child.name == "child"
+    assert v2.get_data()["child"].name == "changed"
+    assert v2.fingerprint != fingerprint
+
+
+def test_version_store():
+    v1 = Node(dict(a=1, b=dict(c=[1, 2])))
+    v2 = v1.new_version()
+    v2.get_data()["b"]["c"].append(3)
+    v3 = v2.new_version()
+
+    store = v1.version_store
+    assert store is v3.version_store
+    assert store.versions == [0, 1, 2]
+    assert store[1] is v2
+    assert store.at(5) is v3
+
+    changes = {path: (old, new) for path, old, new in store.diff(0, 1)}
+    assert changes[("data", "b", "c", 2)] == (VersionStore.MISSING, 3)
+    assert changes[(Node.serialize("version"),)] == (0, 1)
+    assert ("data", "a") not in changes
+
+    assert store.retain(keep_last=2) == 1
+    assert store.versions == [1, 2]
+
+
+def test_version_store_branches():
+    v0 = Node(dict(a=1))
+    v1 = v0.new_version()
+    v2 = v0.new_version(dict(a=2))
+
+    store = v0.version_store
+    assert store.versions == [0, 1, 2]
+    assert store[0] is v0
+    assert store[1] is v1
+    assert store[2] is v2
+    assert v2.get_data() == dict(a=2)
+    assert not v2.frozen
+
+    with pytest.raises(VersionConflictException):
+        store.add(v1.clone())
+
+
 def test_child():
     child = Node(TEST_DATA)
     parent = Node(child)
-    children = parent.children()
+    children = list(parent.children())
     assert child in children
     assert len(children) == 1
+    assert children[0] is child
+
+
+def test_children_copies():
+    child = Node(TEST_DATA)
+    parent = Node(dict(child=child))
+    copies = list(parent.children(copies=True))
+    assert len(copies) == 1
+    assert copies[0] == child
+    assert copies[0] is not child
 
 
 def test_children():
     parent = Node(Node(TEST_DATA), Node(TEST_DATA))
-    assert len(parent.children()) == 2
+    assert len(list(parent.children())) == 2
 
     parent = Node(Node(TEST_DATA), Node(TEST_DATA))
-    assert len(parent.children()) == 2
+    assert len(list(parent.children())) == 2
 
     parent = Node(Node(Node(TEST_DATA)))
-    assert len(parent.children()) == 2
+    assert len(list(parent.children())) == 2
 
     parent = Node(dict(docs=Node(Node(TEST_DATA))))
-    assert len(parent.children()) == 2
+    assert len(list(parent.children())) == 2
 
     parent = Node([dict(docs=Node(Node(TEST_DATA))), Node(TEST_DATA)])
-    assert len(parent.children()) == 3
+    assert len(list(parent.children())) == 3
 
     parent = Node(dict(docs=[Node(Node(TEST_DATA)), Node(TEST_DATA)]))
-    assert len(parent.children()) == 3
+    assert len(list(parent.children())) == 3
 
     parent = Node("STRING")
-    assert (len(parent.children())) == 0
+    assert (len(list(parent.children()))) == 0
 
     parent = Node("STRING", Node("STRING"))
-    assert (len(parent.children())) == 1
+    assert (len(list(parent.children()))) == 1
 
 
 def test_logger_warn(capture_logs):
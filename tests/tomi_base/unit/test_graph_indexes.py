@@ -32,3 +32,22 @@ def test_node_invalid_index():
 
     assert len(new_node().indexes) == 1
     assert len(getattr(new_node, IndexesSupport.INDEXES_CLASS_METHOD)()) == 0
+
+
+def test_compiled_indexes():
+    new_node = EntityClassGenerator(NodeBaseClass, VersionAwareEntity, IndexesSupport).create(
+        entity_type="CompiledNode", indexes={"by_name": ["name"]})
+    node = new_node(id="C1", name="first")
+
+    assert hasattr(new_node, IndexesSupport.INDEXES_EXTRACTOR)
+    assert node.unique_index == "CompiledNode:C1"
+    assert node.indexes["by_name"] == "first"
+    assert node.indexes == node._compute_indexes()
+
+    node.name = "second"
+    assert node.indexes["by_name"] == "second"
+    assert node.indexes == node._compute_indexes()
+
+    definitions = new_node.get_type_indexes()
+    definitions["other"] = ["id"]
+    assert "other" not in new_node.get_type_indexes()
@@ -1,14 +1,44 @@
+import numpy as np
+import pytest
+
+from tomi_graph.entity_class_generator import EntityClassGenerator
+from tomi_graph.graphs.core.unique_conflict import UniqueConflict
+from tomi_graph.graphs.exceptions import UniqueConstraintException
+from tomi_graph.graphs.expiry import ExpiryEngine
 from tomi_graph.graphs.graph import Graph
+from tomi_graph.graphs.loader import GraphLoader
+from tomi_graph.graphs.snapshot import GraphSnapshot, SnapshotFormatException
 from tomi_graph.graphs.node_data_graph import NodeDataGraph
+from tomi_graph.indexes_support import IndexesSupport
+from tomi_graph.nodes.core.node import CoreNodeClass
 from tomi_graph.nodes.node_class import NodeBaseClass
+from tomi_graph.query.exceptions import QueryParameterException, QuerySyntaxException
 from tomi_graph.relationships.core.direction import Direction
 from tomi_graph.relationships.relationship_class import Relationship, RelationshipBaseClass
+from tomi_graph.serialization import binary
+from tomi_graph.serialization.json_stream import iter_json
+from tomi_graph.version_aware_entity import VersionAwareEntity
 
 
 def test_graph():
     assert NodeDataGraph(NodeBaseClass())
 
 
+def test_graph_do_not_clone():
+    leaf = NodeBaseClass("leaf", id="LEAF")
+    middle = NodeBaseClass(dict(leaf=leaf, again=[leaf]), id="MIDDLE")
+    root = NodeBaseClass(middle, id="ROOT")
+
+    g = NodeDataGraph(root, do_not_clone=True)
+    assert g.root_node is root
+    assert set(g.nodes.keys()) == {"ROOT", "MIDDLE", "LEAF"}
+    assert g.nodes["MIDDLE"].get_data() == dict(leaf=dict(__type="NodeBaseClass", __id="LEAF"),
+                                                again=[dict(__type="NodeBaseClass", __id="LEAF")])
+    assert middle.peek_data() == dict(leaf=leaf, again=[leaf])
+    assert dict.__getitem__(middle.peek_data(), "leaf") is leaf
+    assert leaf.get_data() == "leaf"
+
+
 def test_complex_graph():
     ids = ["A", "B", "C", "D", "E", "ROOT"]
 
@@ -205,3 +235,468 @@ def test_graph_methods():
 
     assert len(g.nodes) == len(g2.nodes) + g_entities_count
     assert len(g.relationships) == len(g2.relationships) + g_relationships_count
+
+
+def test_streaming_graph_serializer():
+    e1 = NodeBaseClass("E1", id="E1")
+    e2 = NodeBaseClass(dict(e1=e1), id="E2")
+    e3 = NodeBaseClass("E3", id="E3")
+    g = e1 - e2 - e3
+
+    assert "".join(iter_json(g)) == CoreNodeClass.serialize_to_string(g.toDict())
+    assert "".join(iter_json(e2.graph)) == CoreNodeClass.serialize_to_string(e2.graph.toDict())
+
+
+def test_binary_graph_serializer():
+    e1 = NodeBaseClass("E1", id="E1")
+    e2 = NodeBaseClass(dict(e1=e1), id="E2")
+    e3 = NodeBaseClass("E3", id="E3")
+    g = e1 - e2 - e3
+
+    decoded = binary.decode(binary.encode(g))
+    assert type(decoded) == Graph
+    assert CoreNodeClass.serialize_to_string(decoded.toDict()) == CoreNodeClass.serialize_to_string(g.toDict())
+
+    decoded = binary.decode(binary.encode(e2.graph))
+    assert type(decoded) == NodeDataGraph
+    assert decoded.root_node.id == e2.id
+    assert CoreNodeClass.serialize_to_string(decoded.toDict()) == CoreNodeClass.serialize_to_string(
+        e2.graph.toDict())
+
+
+def test_adjacency():
+    e1 = NodeBaseClass("E1", id="E1")
+    e2 = NodeBaseClass("E2", id="E2")
+    e3 = NodeBaseClass("E3", id="E3")
+
+    g = Graph(Graph.NAMESPACE_DELIMITER)
+    g.add_relationship(Relationship(e1, e2, direction=Direction.LEFT_TO_RIGHT))
+    g.add_relationship(Relationship(e3, e2, direction=Direction.RIGHT_TO_LEFT))
+    undirected = Relationship(e1, e3)
+    g.add_relationship(undirected)
+
+    assert [n.id for n in g.neighbors(e1, direction=Direction.LEFT_TO_RIGHT)] == ["E2", "E3"]
+    assert [n.id for n in g.neighbors(e2, direction=Direction.RIGHT_TO_LEFT)] == ["E1"]
+    assert set(n.id for n in g.neighbors("E2")) == {"E1", "E3"}
+    assert g.out_degree(e1) == 2
+    assert g.in_degree(e2) == 1
+    assert g.out_degree(e2) == 1
+
+    g.subtract_relationship(undirected)
+    assert len(g.relationships) == 2
+    assert [n.id for n in g.neighbors(e1)] == ["E2"]
+
+    g.subtract_node(e2)
+    assert len(g.relationships) == 0
+    assert g.neighbors(e1) == []
+    assert set(g.nodes.keys()) == {"E1", "E3"}
+
+
+def test_add_relationships():
+    e1 = NodeBaseClass("E1", id="E1")
+    e2 = NodeBaseClass("E2", id="E2")
+    e3 = NodeBaseClass("E3", id="E3")
+    r1 = Relationship(e1, e2)
+    r2 = Relationship(e2, e3)
+
+    g = Graph(Graph.NAMESPACE_DELIMITER)
+    g.add_relationships([r1, r2, r1])
+    g.add_relationship(r2)
+
+    assert len(g.relationships) == 2
+    assert r1 in g.relationships
+    assert r2.id in g.relationships
+    assert g.relationships.get(r1.id) is r1
+    assert [r.id for r in g.relationships] == [r1.id, r2.id]
+
+
+def test_degrees():
+    e1 = NodeBaseClass("E1", id="E1")
+    e2 = NodeBaseClass("E2", id="E2")
+    e3 = NodeBaseClass("E3", id="E3")
+    e4 = NodeBaseClass("E4", id="E4")
+    r1 = Relationship(e1, e2, direction=Direction.LEFT_TO_RIGHT)
+
+    g = Graph(Graph.NAMESPACE_DELIMITER)
+    g.add_node(e4)
+    g.add_relationships([r1, Relationship(e2, e3)])
+
+    assert g.isolates == {"E4"}
+    assert g.degree(e2) == 2
+    assert g.degree("E4") == 0
+    assert g.degree_distribution() == {0: 1, 1: 2, 2: 1}
+
+    g.subtract_relationship(r1)
+    assert g.isolates == {"E1", "E4"}
+    assert g.degree_distribution() == {0: 2, 1: 2}
+
+
+def test_search_entities():
+    person = EntityClassGenerator(NodeBaseClass, VersionAwareEntity, IndexesSupport).create(
+        "IndexedPerson", indexes={"by_name": ["name"]})
+    bob = person("B", id="BOB", name="Bob")
+    ann = person("A", id="ANN", name="Ann")
+    other = NodeBaseClass("O", id="O", name="Bob")
+
+    g = Graph(Graph.NAMESPACE_DELIMITER)
+    for node in [bob, ann, other]:
+        g.add_node(node)
+
+    assert set(n.id for n in g.search_entities(name="Bob")) == {"BOB", "O"}
+    assert [n.id for n in g.search_entities(node_type=person, name="Bob")] == ["BOB"]
+    assert [n.id for n in g.search_entities(node_type="IndexedPerson", id="ANN")] == ["ANN"]
+    assert [n.id for n in g.search_entities(by_name="Bob")] == ["BOB"]
+    assert [n.id for n in g.search_entities(
+        **{IndexesSupport.get_unique_constraint_name(person): bob.unique_index})] == ["BOB"]
+    assert [n.id for n in g.search_entities(data="A")] == ["ANN"]
+    assert g.search_entities(undeclared_index="Bob") == []
+    assert len(g.search_entities()) == 3
+
+    bob.name = "Robert"
+    assert g.search_entities(by_name="Bob") == []
+    assert [n.id for n in g.search_entities(by_name="Robert")] == ["BOB"]
+
+    g.subtract_node(ann)
+    assert g.search_entities(name="Ann") == []
+
+
+def test_search_relationships():
+    e1 = NodeBaseClass("E1", id="E1")
+    e2 = NodeBaseClass("E2", id="E2")
+    e3 = NodeBaseClass("E3", id="E3")
+    r1 = Relationship(e1, e2, name="knows", direction=Direction.LEFT_TO_RIGHT, weight=1)
+    r2 = Relationship(e2, e3, name="knows", weight=2)
+    r3 = Relationship(e1, e3, name="likes", weight=1)
+
+    g = Graph(Graph.NAMESPACE_DELIMITER)
+    g.add_relationships([r1, r2, r3])
+
+    assert [r.id for r in g.search_relationships(name="knows")] == [r1.id, r2.id]
+    assert [r.id for r in g.search_relationships(name="knows", direction=Direction.NONE)] == [r2.id]
+    assert [r.id for r in g.search_relationships(rel_type=RelationshipBaseClass.__name__, data=dict(weight=1))] == [
+        r1.id, r3.id]
+
+    g.index_relationship_data("weight")
+    assert [r.id for r in g.search_relationships(data=dict(weight=1), name="likes")] == [r3.id]
+
+    r1(name="met", data=dict(weight=5))
+    assert [r.id for r in g.search_relationships(name="knows")] == [r2.id]
+    assert [r.id for r in g.search_relationships(data=dict(weight=5))] == [r1.id]
+
+    g.subtract_relationship(r1)
+    assert list(g.search_relationships(name="met")) == []
+
+
+def test_range_search():
+    nodes = [NodeBaseClass(str(i), id="R{i}".format(i=i), create_date=100 + i, update_date=200 - i, ttl=i * 10)
+             for i in range(5)]
+
+    g = Graph(Graph.NAMESPACE_DELIMITER)
+    for node in nodes:
+        g.add_node(node)
+
+    assert [n.id for n in g.range_search("create_date", 101, 103)] == ["R1", "R2", "R3"]
+    assert [n.id for n in g.range_search("create_date", 101, 103, include_low=False, include_high=False)] == ["R2"]
+    assert [n.id for n in g.range_search("update_date", low=198)] == ["R2", "R1", "R0"]
+    assert [n.id for n in g.ordered_nodes("ttl", reverse=True)] == ["R4", "R3", "R2", "R1", "R0"]
+    assert list(g.range_search("not_indexed")) == []
+
+    nodes[4].ttl = 5
+    assert [n.id for n in g.range_search("ttl", high=10)] == ["R0", "R4", "R1"]
+
+    g.subtract_node(nodes[0])
+    assert [n.id for n in g.range_search("ttl", high=10)] == ["R4", "R1"]
+
+
+def test_unique_constraints():
+    account = EntityClassGenerator(NodeBaseClass, VersionAwareEntity, IndexesSupport).create(
+        "UniqueAccount", unique_fields=["key"])
+    a1 = account("A1", id="A1", key="alice")
+    a2 = account("A2", id="A2", key="alice")
+    b = account("B", id="B", key="bob")
+
+    g = Graph(Graph.NAMESPACE_DELIMITER)
+    assert g.unique_conflict == UniqueConflict.RAISE
+    g.add_node(a1)
+    with pytest.raises(UniqueConstraintException):
+        g.add_node(a2)
+    assert g.add_node(a2, on_conflict=UniqueConflict.IGNORE) is a1
+    assert g.add_node(a2, on_conflict=UniqueConflict.REPLACE) is a2
+    assert set(g.nodes.keys()) == {"A2"}
+
+    with pytest.raises(UniqueConstraintException):
+        g.upsert_nodes([b, a1])
+    assert set(g.nodes.keys()) == {"A2"}
+
+    kept = g.upsert_nodes([b, a1, account("A3", id="A3", key="alice")], on_conflict=UniqueConflict.REPLACE)
+    assert [n.id for n in kept] == ["B", "A3"]
+    assert set(g.nodes.keys()) == {"B", "A3"}
+
+
+def test_unique_constraints_changes():
+    account = EntityClassGenerator(NodeBaseClass, VersionAwareEntity, IndexesSupport).create(
+        "ChangedAccount", unique_fields=["name"])
+    a1 = account("A1", id="A1", name="alice")
+    b = account("B", id="B", name="bob")
+    c = account("C", id="C", name="carol")
+
+    g = Graph(Graph.NAMESPACE_DELIMITER)
+    g.add_relationships([Relationship(a1, b), Relationship(b, c)])
+    other = Graph(Graph.NAMESPACE_DELIMITER)
+    other.add_node(b)
+    with pytest.raises(UniqueConstraintException):
+        b.name = "alice"
+    assert b.name == "bob"
+    assert g.get_unique(account, "alice") is a1
+    assert g.get_unique(account, "bob") is b
+    assert [n.id for n in g.search_entities(name="bob")] == ["B"]
+    assert other.get_unique(account, "bob") is b
+    assert other.get_unique(account, "alice") is None
+
+    g.unique_conflict = UniqueConflict.IGNORE
+    c.name = "alice"
+    assert set(g.nodes.keys()) == {"A1", "B", "C"}
+    assert g.get_unique(account, "alice") is a1
+    assert g.get_unique(account, "carol") is None
+    assert {n.id for n in g.search_entities(name="alice")} == {"A1", "C"}
+
+    g.unique_conflict = UniqueConflict.REPLACE
+    b.name = "alice"
+    assert set(g.nodes.keys()) == {"B", "C"}
+    assert g.get_unique(account, "alice") is b
+    assert len(g.relationships) == 1
+
+
+def test_expiry():
+    e1 = NodeBaseClass("E1", id="E1", ttl=10, create_date=1000)
+    e2 = NodeBaseClass("E2", id="E2", ttl=-1, create_date=1000)
+    e3 = NodeBaseClass("E3", id="E3", ttl=100, create_date=1000)
+
+    g = Graph(Graph.NAMESPACE_DELIMITER)
+    g.add_relationships([Relationship(e1, e2), Relationship(e2, e3)])
+
+    assert g.expire(now=1005) == []
+    assert [n.id for n in g.expire(now=1010)] == ["E1"]
+    assert set(g.nodes.keys()) == {"E2", "E3"}
+    assert len(g.relationships) == 1
+
+    e3.ttl = 5
+    assert [n.id for n in g.expire(now=1010, budget=1)] == ["E3"]
+    assert set(g.nodes.keys()) == {"E2"}
+
+    lazy = Graph(Graph.NAMESPACE_DELIMITER, lazy_expiry=True)
+    lazy.add_node(NodeBaseClass("OLD", id="OLD", ttl=1, create_date=1))
+    lazy.add_node(e2)
+    assert set(lazy.nodes.keys()) == {"E2"}
+
+
+def test_expiry_thread_readers():
+    now = ExpiryEngine.now()
+    g = Graph(Graph.NAMESPACE_DELIMITER)
+    kept = NodeBaseClass("KEPT", id="KEPT", name="node")
+    for i in range(2000):
+        node = NodeBaseClass(i, id="N{i}".format(i=i), name="node", ttl=1, create_date=now - 10)
+        g.add_relationship(Relationship(kept, node))
+
+    g.start_expiry(interval=0.0001, budget=10)
+    try:
+        while len(g.nodes) > 1:
+            assert all(n.name == "node" for n in g.search_entities(name="node"))
+            assert all(n.create_date <= now for n in g.range_search("create_date"))
+            assert all(r.node_1 is kept for r in g.search_relationships(rel_type=Relationship))
+            assert all(r is not None for r in g.node_relationships(kept))
+            with g.lock:
+                assert len(list(g.nodes.values())) >= 1
+    finally:
+        g.stop_expiry()
+    assert [n.id for n in g.search_entities(name="node")] == ["KEPT"]
+    assert len(g.relationships) == 0
+
+
+def test_csr_snapshot():
+    e1 = NodeBaseClass("E1", id="E1")
+    e2 = NodeBaseClass("E2", id="E2")
+    e3 = NodeBaseClass("E3", id="E3")
+
+    g = Graph(Graph.NAMESPACE_DELIMITER)
+    g.add_relationship(Relationship(e1, e2, direction=Direction.LEFT_TO_RIGHT))
+    g.add_relationship(Relationship(e3, e2, direction=Direction.RIGHT_TO_LEFT))
+    g.add_relationship(Relationship(e1, e3))
+
+    csr = g.freeze_csr()
+    assert csr.node_count == 3
+    assert csr.relationship_count == 3
+    assert [n.id for n in csr.neighbors("E1", direction=Direction.LEFT_TO_RIGHT)] == ["E2", "E3"]
+    assert [n.id for n in csr.neighbors("E2", direction=Direction.RIGHT_TO_LEFT)] == ["E1"]
+    assert set(n.id for n in csr.neighbors("E2")) == {"E1", "E3"}
+    assert csr.out_degrees().tolist() == [g.out_degree(n) for n in csr.node_ids]
+    assert csr.in_degrees().tolist() == [g.in_degree(n) for n in csr.node_ids]
+    with pytest.raises(ValueError):
+        csr.indices[0] = 0
+
+    _, relationships = csr.adjacency("E2", direction=Direction.RIGHT_TO_LEFT)
+    relationship = csr.relationship(relationships[0])
+    assert relationship.node_1.id == "E1" and relationship.node_2.id == "E2"
+    assert csr.node("E1") is relationship.node_1
+    assert csr.node("E1") is e1
+    csr.node("E1").name = "changed"
+    assert e1.name == "changed"
+
+    g.subtract_node(e2)
+    assert csr.node_count == 3
+    assert csr.node("E2") is e2
+
+
+def test_traversal():
+    knows = EntityClassGenerator(RelationshipBaseClass, VersionAwareEntity).create("KNOWS")
+    a, b, c, d, e = [NodeBaseClass(i, id=i) for i in ["A", "B", "C", "D", "E"]]
+
+    g = Graph(Graph.NAMESPACE_DELIMITER)
+    g.add_relationships([Relationship(a, b, direction=Direction.LEFT_TO_RIGHT, weight=5),
+                         Relationship(b, c, direction=Direction.LEFT_TO_RIGHT, weight=1),
+                         Relationship(a, d, direction=Direction.LEFT_TO_RIGHT, weight=1),
+                         knows(d, c, direction=Direction.LEFT_TO_RIGHT, weight=1),
+                         Relationship(c, e)])
+
+    assert [(s.node.id, s.depth) for s in g.bfs(a)] == [("A", 0), ("B", 1), ("D", 1), ("C", 2), ("E", 3)]
+    assert [s.node.id for s in g.dfs("A")] == ["A", "B", "C", "E", "D"]
+    assert [s.node.id for s in g.bfs("A", max_depth=1)] == ["A", "B", "D"]
+    assert [s.node.id for s in g.bfs("A", max_visits=2)] == ["A", "B"]
+    assert [s.node.id for s in g.bfs("C", direction=Direction.RIGHT_TO_LEFT)] == ["C", "B", "D", "E", "A"]
+    assert [s.node.id for s in g.bfs("A", rel_type=Relationship)] == ["A", "B", "D", "C", "E"]
+    assert [s.node.id for s in g.bfs("A", data={"weight": 1})] == ["A", "D", "C", "B"]
+
+    path = g.shortest_path("A", "E")
+    assert [s.node.id for s in path] == ["A", "B", "C", "E"]
+    assert path[0].relationship is None and path[1].relationship.node_2 is b
+    assert g.shortest_path("E", "A", direction=Direction.LEFT_TO_RIGHT) is None
+
+    cost, path = g.weighted_shortest_path("A", "E", direction=Direction.LEFT_TO_RIGHT)
+    assert cost == 3
+    assert [s.node.id for s in path] == ["A", "D", "C", "E"]
+    assert g.weighted_shortest_path("A", "E", direction=Direction.LEFT_TO_RIGHT, rel_type=Relationship)[0] == 7
+    assert [(s.node.id, cost) for s, cost in g.dijkstra("A", max_cost=2)] == [("A", 0), ("D", 1), ("C", 2)]
+
+
+def test_match():
+    person = EntityClassGenerator(NodeBaseClass, VersionAwareEntity, IndexesSupport).create(
+        "MatchPerson", indexes={"person_name": ["name"]}, unique_fields=["key"])
+    city = EntityClassGenerator(NodeBaseClass, VersionAwareEntity, IndexesSupport).create("MatchCity")
+    ref = EntityClassGenerator(RelationshipBaseClass, VersionAwareEntity).create("REF")
+    lives = EntityClassGenerator(RelationshipBaseClass, VersionAwareEntity).create("LIVES")
+
+    alice = person(id="P1", key="alice", name="Alice")
+    bob = person(id="P2", key="bob", name="Bob")
+    carol = person(id="P3", key="carol", name="Carol")
+    paris = city(id="C1", name="Paris")
+
+    g = Graph(Graph.NAMESPACE_DELIMITER)
+    g.add_relationships([ref(alice, bob, direction=Direction.LEFT_TO_RIGHT, since=2010),
+                         ref(bob, carol, direction=Direction.LEFT_TO_RIGHT, since=2020),
+                         lives(alice, paris, direction=Direction.LEFT_TO_RIGHT),
+                         lives(bob, paris, direction=Direction.LEFT_TO_RIGHT)])
+
+    query = "(a:MatchPerson {name: $n})-[:REF]->(b)"
+    assert g.explain(query, {"n": "Alice"}).splitlines()[0].startswith("NodeByIndex (a:MatchPerson) index=person_name")
+    assert [(m["a"].id, m["b"].id) for m in g.match(query, {"n": "Alice"})] == [("P1", "P2")]
+
+    query = "(p:MatchPerson)-[:LIVES]->(c:MatchCity {id: 'C1'})"
+    assert g.explain(query).splitlines() == ["NodeById (c:MatchCity) id='C1' rows=1",
+                                             "Expand (c:MatchCity)<-[:LIVES]-(p:MatchPerson)"]
+    assert [m["p"].id for m in g.match(query)] == ["P1", "P2"]
+
+    query = "(a)-[r:REF {since: 2020}]->(b:MatchPerson {key: $k})"
+    assert g.explain(query, {"k": "carol"}).startswith("NodeByUniqueConstraint (b:MatchPerson) index=UQ_MatchPerson")
+    assert [(m["a"].id, m["r"].data["since"]) for m in g.match(query, {"k": "carol"})] == [("P2", 2020)]
+
+    assert [(m["a"].id, m["b"].id, m["c"].id) for m in g.match("(a)-[:REF]->(b)-[:REF]->(c)")] == [("P1", "P2", "P3")]
+    assert [m["x"].id for m in g.match("(a:MatchPerson {key: 'alice'})--(x)--(b:MatchPerson {key: 'bob'})")] == ["C1"]
+    assert list(g.match("(a:Unknown)--(b)")) == []
+
+    with pytest.raises(QueryParameterException):
+        list(g.match("(a {name: $missing})"))
+    with pytest.raises(QuerySyntaxException):
+        list(g.match("(a)<-[:REF]->(b)"))
+
+
+def test_loader(tmp_path):
+    EntityClassGenerator(NodeBaseClass, VersionAwareEntity, IndexesSupport).create("LoadedAccount",
+                                                                                   unique_fields=["key"])
+    nodes = tmp_path / "nodes.jsonl"
+    nodes.write_text("\n".join([
+        '{"id": "A1", "node_type": "LoadedAccount", "key": "alice", "name": "Alice"}',
+        '{"id": "A2", "node_type": "LoadedAccount", "key": "bob", "name": "Bob"}',
+        '{"id": "C1", "name": "Paris", "country": "FR"}'
+    ]))
+    relationships = tmp_path / "relationships.csv"
+    relationships.write_text("\n".join([
+        "node_1,node_1_type,node_2,rel_type,direction,since",
+        "alice,LoadedAccount,A2,KNOWS,LEFT_TO_RIGHT,2010",
+        "A2,,C1,LIVES_IN,left_to_right,",
+        "A1,,UNKNOWN,LIVES_IN,,"
+    ]))
+
+    progress = []
+    loader = GraphLoader(batch_size=2, progress=lambda kind, count: progress.append((kind, count)))
+    g = loader.load(nodes=str(nodes), relationships=str(relationships))
+
+    assert progress == [("nodes", 2), ("nodes", 3), ("relationships", 2), ("relationships", 2)]
+    assert loader.relationships_skipped == 1
+    assert set(g.nodes.keys()) == {"A1", "A2", "C1"}
+    assert g.get_unique("LoadedAccount", "bob").id == "A2"
+    assert g.nodes["C1"].get_data() == {"country": "FR"}
+    assert [n.id for n in g.search_entities(node_type="LoadedAccount", name="Alice")] == ["A1"]
+
+    knows = next(g.search_relationships(rel_type="KNOWS"))
+    assert knows.node_1.id == "A1" and knows.direction == Direction.LEFT_TO_RIGHT
+    assert knows.data == {"since": "2010"}
+    assert [n.id for n in g.neighbors("A2", direction=Direction.LEFT_TO_RIGHT)] == ["C1"]
+
+    repeated = [dict(id="R1", node_1="A1", node_2="C1"), dict(id="R1", node_1="A1", node_2="C1")]
+    assert loader.load_relationships(repeated) == 1
+    assert (loader.relationships_loaded, loader.relationships_skipped) == (3, 2)
+
+    with g.deferred_indexing():
+        g.add_node(NodeBaseClass("D", id="D1", name="Deferred"))
+        assert g.search_entities(name="Deferred") == []
+    assert [n.id for n in g.search_entities(name="Deferred")] == ["D1"]
+
+
+def test_snapshot(tmp_path):
+    e1 = NodeBaseClass({"value": 1}, id="E1")
+    e2 = NodeBaseClass(NodeBaseClass("embedded"), id="E2")
+    e3 = NodeBaseClass("E3", id="E3")
+    e4 = NodeBaseClass("E4", id="E4")
+
+    g = Graph(Graph.NAMESPACE_DELIMITER)
+    g.add_node(e4)
+    g.add_relationships([Relationship(e1, e2, direction=Direction.LEFT_TO_RIGHT, weight=2),
+                         Relationship(e3, e2, direction=Direction.RIGHT_TO_LEFT),
+                         Relationship(e1, e3)])
+    path = g.save_snapshot(str(tmp_path / "graph.snapshot"))
+
+    with GraphSnapshot(path) as snapshot:
+        assert snapshot.node_count == 4
+        assert snapshot.relationship_count == 3
+        assert "E1" in snapshot and "UNKNOWN" not in snapshot
+        assert len(snapshot._nodes) == 0
+
+        assert str(snapshot.get("E2")) == str(e2)
+        assert len(snapshot._nodes) == 1
+        assert [n.id for n in snapshot.neighbors("E1", direction=Direction.LEFT_TO_RIGHT)] == ["E2", "E3"]
+        assert set(n.id for n in snapshot.neighbors("E2")) == {"E1", "E3"}
+        assert [snapshot.out_degree(n) for n in snapshot.node_ids()] == [g.out_degree(n) for n in snapshot.node_ids()]
+        assert snapshot.out_degree(np.int64(snapshot.index_of("E1"))) == g.out_degree("E1")
+        assert [snapshot.in_degree(n) for n in snapshot.node_ids()] == [g.in_degree(n) for n in snapshot.node_ids()]
+
+        neighbor, relationship = snapshot.adjacency("E2", direction=Direction.RIGHT_TO_LEFT)[0]
+        assert snapshot.node_id(neighbor) == "E1"
+        assert snapshot.relationship(relationship).data == {"weight": 2}
+        assert snapshot.relationship(relationship).node_1 is snapshot.get("E1")
+
+        loaded = snapshot.to_graph()
+        assert set(loaded.nodes.keys()) == {"E1", "E2", "E3", "E4"}
+        assert len(loaded.relationships) == 3
+
+    with pytest.raises(SnapshotFormatException):
+        GraphSnapshot(__file__)
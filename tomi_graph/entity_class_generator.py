@@ -1,5 +1,6 @@
 import inspect
 from collections.abc import MutableMapping, Iterable
+from operator import attrgetter
 
 from tomi_base.shared.meta_singleton import MetaSingleton
 
@@ -16,12 +17,13 @@ class EntityClassGenerator(object):
     def __init__(self, *base_classes):
         self.base_classes = base_classes
 
-    def create(self, entity_type=None, indexes=None, additional_fields=None):
+    def create(self, entity_type=None, indexes=None, additional_fields=None, unique_fields=None):
         if entity_type in EntityClassGenerator.class_registry.keys():
             entity_class = EntityClassGenerator.class_registry[entity_type]
             if set(self.base_classes).issubset(
                     set(inspect.getmro(entity_class))) and (entity_class.get_type_indexes() == indexes or (
-                    entity_class.get_type_indexes() == {} and indexes is None)):
+                    entity_class.get_type_indexes() == {} and indexes is None)) and (
+                    unique_fields is None or entity_class.get_unique_constraint_fields() == list(unique_fields)):
                 return entity_class
 
         new_class = type(entity_type if type(entity_type) == str else self.base_classes[0].__name__,
@@ -30,17 +32,28 @@ class EntityClassGenerator(object):
         def valid_field(f):
             return f.split(":")[0] in self.base_classes[0].get_properties_mapping(node_type=entity_type).values()
 
+        # indexes are validated once, get_type_indexes returns a copy of them
+        class_indexes = {}
+        if issubclass(type(indexes), MutableMapping):
+            for idx, fields in indexes.items():
+                valid_fields = [field for field in set(fields) if type(field) == str and valid_field(field)]
+                if len(valid_fields) > 0:
+                    class_indexes[idx] = valid_fields
+
         def idx_fields(cls):
-            class_indexes = {}
-            if issubclass(type(indexes), MutableMapping):
-                for idx, fields in indexes.items():
-                    valid_fields = [field for field in set(fields) if type(field) == str and valid_field(field)]
-                    if len(valid_fields) > 0:
-                        class_indexes[idx] = valid_fields
-            return class_indexes
+            return {idx: list(fields) for idx, fields in class_indexes.items()}
 
         setattr(new_class, IndexesSupport.INDEXES_CLASS_METHOD, classmethod(idx_fields))
 
+        # fields of the unique constraint of the type (see IndexesSupport.unique_index), the id by default
+        if issubclass(type(unique_fields), Iterable) and type(unique_fields) != str:
+            constraint_fields = [field for field in unique_fields if type(field) == str and valid_field(field)]
+            if len(constraint_fields) > 0:
+                setattr(new_class, "get_unique_constraint_fields", staticmethod(lambda: list(constraint_fields)))
+
+        if issubclass(new_class, IndexesSupport):
+            EntityClassGenerator.compile_index_extractors(new_class, class_indexes)
+
         # registering additional fields
         if issubclass(type(additional_fields), Iterable) and type(additional_fields) != str:
             for field in [f for f in additional_fields if not hasattr(new_class, f)]:
@@ -52,3 +65,48 @@ class EntityClassGenerator(object):
         EntityClassGenerator.class_registry[entity_type] = new_class
 
         return new_class
+
+    @staticmethod
+    def compile_index_extractors(entity_class, class_indexes):
+        """
+        Specialized functions computing the unique index and the indexes of the instances of entity_class, see
+        IndexesSupport.unique_index_extractor and IndexesSupport.indexes_extractor
+        :param entity_class:
+        :param class_indexes: validated indexes of the class
+        :return:
+        """
+        type_name = entity_class.__name__
+        null_value = IndexesSupport.NULL_INDEX_VALUE
+        constraint_name = IndexesSupport.get_unique_constraint_name(entity_class)
+
+        def getter(fields):
+            get = attrgetter(*fields)
+            if len(fields) == 1:
+                return lambda entity: (get(entity),)
+            return get
+
+        def values(entity, get, fields):
+            try:
+                return get(entity)
+            except AttributeError:
+                # same as getattr with a default value
+                return [getattr(entity, field, None) for field in fields]
+
+        unique_fields = list(entity_class.get_unique_constraint_fields())
+        get_unique_values = getter(unique_fields)
+
+        def unique_index_extractor(entity):
+            return ":".join([type_name] + [str(value) if value is not None else "" for value in
+                                           values(entity, get_unique_values, unique_fields)])
+
+        compiled_indexes = [(idx, getter(fields), fields) for idx, fields in class_indexes.items()]
+
+        def indexes_extractor(entity):
+            entity_indexes = {constraint_name: unique_index_extractor(entity)}
+            for idx, get, fields in compiled_indexes:
+                entity_indexes[idx] = ":".join(
+                    [str(value) if value is not None else null_value for value in values(entity, get, fields)])
+            return entity_indexes
+
+        setattr(entity_class, IndexesSupport.UNIQUE_INDEX_EXTRACTOR, staticmethod(unique_index_extractor))
+        setattr(entity_class, IndexesSupport.INDEXES_EXTRACTOR, staticmethod(indexes_extractor))
@@ -0,0 +1,7 @@
+from enum import Enum
+
+
+class UniqueConflict(Enum):
+    RAISE = "raise",
+    IGNORE = "ignore",
+    REPLACE = "replace",
@@ -0,0 +1,206 @@
+import numpy as np
+
+from tomi_graph.relationships.core.direction import Direction
+from tomi_graph.relationships.core.protection import Protection
+from tomi_graph.serialization import binary
+
+DIRECTIONS = list(Direction)
+PROTECTIONS = list(Protection)
+
+NODE_1_FIELD = "__node_1"
+NODE_2_FIELD = "__node_2"
+
+
+def _frozen(array):
+    array.flags.writeable = False
+    return array
+
+
+class CSRGraph(object):
+    """
+    Immutable compressed sparse row snapshot of a graph. Nodes are numbered 0..n-1 in the order of the graph, the
+    relationships 0..r-1, and the adjacency of node i is indices[indptr[i]:indptr[i + 1]] (outgoing) and
+    in_indices[in_indptr[i]:in_indptr[i + 1]] (incoming), edge_relationships giving the relationship of each entry.
+    Undirected relationships are followed both ways, as in Graph. Only the structure is frozen: node and relationship
+    objects are the ones of the graph, changes made to them are seen through both.
+    """
+
+    def __init__(self, graph):
+        """
+
+        :param graph: Graph frozen, left untouched
+        """
+        nodes = list(graph._nodes.values())
+        relationships = [r for r in graph._relationships if r is not None]
+
+        self._node_ids = [node.id for node in nodes]
+        self._node_index = {node_id: index for index, node_id in enumerate(self._node_ids)}
+        self._nodes = nodes
+
+        self.relationship_types = []
+        type_codes = {}
+        node_1 = np.empty(len(relationships), dtype=np.int64)
+        node_2 = np.empty(len(relationships), dtype=np.int64)
+        directions = np.empty(len(relationships), dtype=np.int8)
+        protections = np.empty(len(relationships), dtype=np.int8)
+        types = np.empty(len(relationships), dtype=np.int32)
+        self._relationship_ids = []
+        self._relationships = relationships
+
+        sources = []
+        targets = []
+        edges = []
+        for index, relationship in enumerate(relationships):
+            node_1[index] = self._node_index[relationship.node_1.id]
+            node_2[index] = self._node_index[relationship.node_2.id]
+            directions[index] = DIRECTIONS.index(relationship.direction)
+            protections[index] = PROTECTIONS.index(relationship.protection)
+            rel_type = relationship.rel_type
+            if rel_type not in type_codes:
+                type_codes[rel_type] = len(self.relationship_types)
+                self.relationship_types.append(rel_type)
+            types[index] = type_codes[rel_type]
+
+            self._relationship_ids.append(relationship.id)
+
+            if relationship.direction == Direction.LEFT_TO_RIGHT:
+                ends = [(node_1[index], node_2[index])]
+            elif relationship.direction == Direction.RIGHT_TO_LEFT:
+                ends = [(node_2[index], node_1[index])]
+            else:
+                ends = [(node_1[index], node_2[index]), (node_2[index], node_1[index])]
+            for source, target in ends:
+                sources.append(source)
+                targets.append(target)
+                edges.append(index)
+
+        self.relationship_node_1 = _frozen(node_1)
+        self.relationship_node_2 = _frozen(node_2)
+        self.relationship_direction = _frozen(directions)
+        self.relationship_protection = _frozen(protections)
+        self.relationship_type = _frozen(types)
+
+        sources = np.array(sources, dtype=np.int64)
+        targets = np.array(targets, dtype=np.int64)
+        edges = np.array(edges, dtype=np.int64)
+        self.indptr, self.indices, self.edge_relationships = CSRGraph._compress(len(nodes), sources, targets, edges)
+        self.in_indptr, self.in_indices, self.in_edge_relationships = CSRGraph._compress(len(nodes), targets,
+                                                                                         sources, edges)
+
+    @staticmethod
+    def _compress(size, rows, columns, edges):
+        order = np.argsort(rows, kind="stable")
+        indptr = np.zeros(size + 1, dtype=np.int64)
+        np.cumsum(np.bincount(rows, minlength=size), out=indptr[1:])
+        return _frozen(indptr), _frozen(columns[order]), _frozen(edges[order])
+
+    @property
+    def node_count(self):
+        return len(self._node_ids)
+
+    @property
+    def relationship_count(self):
+        return len(self._relationship_ids)
+
+    @property
+    def node_ids(self):
+        return list(self._node_ids)
+
+    def index_of(self, node):
+        """
+        Dense index of a node
+        :param node: node or node id
+        :return:
+        """
+        return self._node_index[node.id if hasattr(node, "id") else node]
+
+    def node(self, node):
+        """
+        Node object, the one of the graph
+        :param node: dense index or node id
+        :return:
+        """
+        return self._nodes[node if isinstance(node, (int, np.integer)) else self.index_of(node)]
+
+    def relationship(self, index):
+        """
+        Relationship object, the one of the graph
+        :param index: dense index of the relationship
+        :return:
+        """
+        return self._relationships[int(index)]
+
+    def node_payloads(self):
+        """
+        Binary serialization of the nodes in dense index order (see tomi_graph.serialization.binary), encoded on
+        each call
+        :return: list of bytes
+        """
+        return [binary.encode(node) for node in self._nodes]
+
+    def relationship_payloads(self):
+        """
+        Binary serialization of the relationship fields in dense index order, nodes excluded, encoded on each call
+        :return: list of bytes
+        """
+        payloads = []
+        for relationship in self._relationships:
+            fields = relationship.serialized_fields()
+            fields.pop(NODE_1_FIELD, None)
+            fields.pop(NODE_2_FIELD, None)
+            payloads.append(binary.encode(fields))
+        return payloads
+
+    def _slices(self, direction):
+        if direction == Direction.LEFT_TO_RIGHT:
+            return [(self.indptr, self.indices, self.edge_relationships)]
+        if direction == Direction.RIGHT_TO_LEFT:
+            return [(self.in_indptr, self.in_indices, self.in_edge_relationships)]
+        return [(self.indptr, self.indices, self.edge_relationships),
+                (self.in_indptr, self.in_indices, self.in_edge_relationships)]
+
+    def adjacency(self, node, direction=None):
+        """
+        Adjacency of a node as arrays, see Graph.neighbors for direction
+        :param node: dense index or node id
+        :param direction:
+        :return: (neighbor indices, relationship indices), a relationship appearing once
+        """
+        index = node if isinstance(node, (int, np.integer)) else self.index_of(node)
+        neighbors = []
+        relationships = []
+        for indptr, indices, edges in self._slices(direction):
+            start, stop = indptr[index], indptr[index + 1]
+            neighbors.append(indices[start:stop])
+            relationships.append(edges[start:stop])
+        if len(neighbors) == 1:
+            return neighbors[0], relationships[0]
+
+        neighbors = np.concatenate(neighbors)
+        relationships = np.concatenate(relationships)
+        # undirected relationships are both outgoing and incoming
+        _, first = np.unique(relationships, return_index=True)
+        first.sort()
+        return neighbors[first], relationships[first]
+
+    def neighbors(self, node, direction=None):
+        """
+        Nodes linked to node, see Graph.neighbors
+        :param node: dense index or node id
+        :param direction:
+        :return: list of nodes
+        """
+        neighbors, _ = self.adjacency(node, direction=direction)
+        seen = set()
+        result = []
+        for neighbor in neighbors.tolist():
+            if neighbor not in seen:
+                seen.add(neighbor)
+                result.append(self.node(neighbor))
+        return result
+
+    def out_degrees(self):
+        return np.diff(self.indptr)
+
+    def in_degrees(self):
+        return np.diff(self.in_indptr)
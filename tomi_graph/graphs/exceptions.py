@@ -0,0 +1,2 @@
+class UniqueConstraintException(Exception):
+    pass
@@ -0,0 +1,76 @@
+import heapq
+from datetime import datetime
+
+
+class ExpiryEngine(object):
+    """
+    Deadlines of the nodes of a graph, expiring at create_date + ttl (a negative ttl never expires), kept in a min
+    heap. Rescheduled and unscheduled nodes leave stale heap entries behind, skipped when they surface.
+    """
+
+    def __init__(self):
+        self._heap = []
+        self._deadlines = {}
+
+    @staticmethod
+    def now():
+        return int(datetime.utcnow().timestamp())
+
+    @staticmethod
+    def deadline(node):
+        ttl = getattr(node, "ttl", None)
+        create_date = getattr(node, "create_date", None)
+        if ttl is None or create_date is None or ttl < 0:
+            return None
+        return create_date + ttl
+
+    def schedule(self, node):
+        deadline = ExpiryEngine.deadline(node)
+        if deadline is None:
+            self.unschedule(node.id)
+            return
+        if self._deadlines.get(node.id) == deadline:
+            return
+        self._deadlines[node.id] = deadline
+        heapq.heappush(self._heap, (deadline, node.id))
+        if len(self._heap) > 2 * len(self._deadlines) + 64:
+            # too many stale entries
+            self._heap = [(d, node_id) for node_id, d in self._deadlines.items()]
+            heapq.heapify(self._heap)
+
+    def unschedule(self, node_id):
+        self._deadlines.pop(node_id, None)
+
+    @property
+    def next_deadline(self):
+        heap = self._heap
+        while len(heap) > 0 and self._deadlines.get(heap[0][1]) != heap[0][0]:
+            heapq.heappop(heap)
+        return heap[0][0] if len(heap) > 0 else None
+
+    def expired(self, now=None, budget=None):
+        """
+        Pops the nodes whose deadline has passed
+        :param now: reference timestamp, now by default
+        :param budget: maximum number of nodes popped
+        :return: list of node ids
+        """
+        now = ExpiryEngine.now() if now is None else now
+        heap = self._heap
+        expired = []
+        while len(heap) > 0 and (budget is None or len(expired) < budget):
+            deadline, node_id = heap[0]
+            if deadline > now:
+                break
+            heapq.heappop(heap)
+            if self._deadlines.get(node_id) == deadline:
+                del self._deadlines[node_id]
+                expired.append(node_id)
+        return expired
+
+    def clear(self):
+        self._heap = []
+        self._deadlines = {}
+
+    def __len__(self):
+        return len(self._deadlines)
@@ -1,27 +1,72 @@
+import threading
+import weakref
+from contextlib import contextmanager
+from functools import wraps
+from numbers import Number
 from uuid import uuid4
 
 from tomi_graph.nodes.nodes_dictionary import NodesDictionary
 
 from tomi_graph.graphs.core.graph import BaseGraph
+from tomi_graph.graphs.core.unique_conflict import UniqueConflict
+from tomi_graph.graphs.exceptions import UniqueConstraintException
+from tomi_graph.graphs import traversal
+from tomi_graph.graphs.expiry import ExpiryEngine
+from tomi_graph.indexes.hash_index import HashIndex
+from tomi_graph.indexes.range_index import RangeIndex
+from tomi_graph.indexes_support import IndexesSupport
 from tomi_graph.nodes.core.node import CoreNodeClass
 from tomi_graph.operators import GraphOperationDirection, GraphOperation, DefaultValues
 from tomi_graph.operators.operator_resolver import OperatorsResolver
+from tomi_graph.query.planner import Query
+from tomi_graph.relationships.core.direction import Direction
 from tomi_graph.relationships.core.relationship import CoreRelationshipClass
+from tomi_graph.relationships.relationships_collection import RelationshipsCollection
+
+
+def _synchronized(method):
+    @wraps(method)
+    def wrapper(self, *args, **kwargs):
+        with self._lock:
+            return method(self, *args, **kwargs)
+
+    return wrapper
 
 
 class Graph(OperatorsResolver, BaseGraph):
     NAMESPACE_DELIMITER = "/"
 
+    # maximum number of nodes evicted by an access to a graph expiring lazily
+    LAZY_EXPIRY_BUDGET = 100
+
+    # node fields indexed by every graph, on top of the indexes declared for the node types
+    INDEXED_FIELDS = ("node_type", "key", "name", "encoding", "ttl")
+
+    # node fields with an ordered index, along with the numeric additional fields of the node types
+    RANGE_INDEXED_FIELDS = ("create_date", "update_date", "ttl")
+
+    # node attributes none of the indexes depend on
+    UNINDEXED_ATTRIBUTES = ("_inner_data",)
+
+    # relationship fields indexed by every graph, keys of the relationship data are indexed on demand
+    RELATIONSHIP_INDEXED_FIELDS = ("rel_type", "name", "direction", "protection")
+
     @property
     def id(self):
         return self._id
 
     @property
     def relationships(self):
+        self._expire_lazily()
         return self._relationships
 
     @property
     def nodes(self):
+        """
+        Nodes by id, live: walk them holding the graph lock while the expiry thread (see start_expiry) runs
+        :return: NodesDictionary
+        """
+        self._expire_lazily()
         return self._nodes
 
     @property
@@ -36,67 +81,769 @@ class Graph(OperatorsResolver, BaseGraph):
     def namespace_delimiter(self):
         return Graph.NAMESPACE_DELIMITER
 
+    @property
+    def unique_conflict(self):
+        return self._unique_conflict
+
+    @unique_conflict.setter
+    def unique_conflict(self, value):
+        if type(value) != UniqueConflict:
+            raise TypeError("unique_conflict must be a {cls}".format(cls=UniqueConflict.__name__))
+        self._unique_conflict = value
+
     @property
     def isolates(self):
-        linked_entities = set(
-            [id for sublist in [[r.node_1.id, r.node_2.id] for r in self.relationships] for id
-             in sublist])
-        return set([e.id for e in self.nodes.values()]).difference(linked_entities)
+        # maintained as nodes and relationships come and go, not to be modified
+        self._expire_lazily()
+        return self._isolates
+
+    @property
+    def lock(self):
+        return self._lock
+
+    @property
+    def lazy_expiry(self):
+        return self._lazy_expiry
 
-    def __init__(self, namespace_root=None):
+    @lazy_expiry.setter
+    def lazy_expiry(self, value):
+        self._lazy_expiry = bool(value)
+
+    def __init__(self, namespace_root=None, unique_conflict=None, lazy_expiry=None):
+        """
+
+        :param namespace_root:
+        :param unique_conflict: what adding a node does when another node of the graph has the same unique key
+            (see IndexesSupport.unique_index) or when a node of the graph changes to the unique key of another one,
+            UniqueConflict.RAISE by default
+        :param lazy_expiry: evicts the expired nodes when the graph is accessed, see expire
+        """
         self._id = str(uuid4())
+        self._lock = threading.RLock()
+        self._lazy_expiry = lazy_expiry is True
+        self._expiry_thread = None
+        self._expiry_stop = None
+        self._unique_conflict = unique_conflict if type(unique_conflict) == UniqueConflict else UniqueConflict.RAISE
         self._nodes = NodesDictionary()
-        self._relationships = []
+        self._relationships = RelationshipsCollection()
         self._namespace_map = {}
         self._namespace_root = namespace_root if namespace_root is not None else Graph.NAMESPACE_DELIMITER
+        self._relationship_data_keys = []
+        # depth of the deferred_indexing contexts entered
+        self._indexing_deferred = 0
+        self._reset_indexes()
+
+    def _reset_indexes(self):
+        # adjacency maps: node id -> {relationship id: (neighbor id, relationship)}
+        self._outgoing = {}
+        self._incoming = {}
+        # relationship id -> oriented ends it was linked with, relationships only hold weak references to their nodes
+        self._linked_ends = {}
+        # node id -> number of relationships attached, a self relationship counting twice
+        self._degrees = {}
+        # degree -> number of nodes
+        self._degree_histogram = {}
+        self._isolates = set()
+        # hash indexes of node ids, by node field and by name for the indexes declared with IndexesSupport
+        self._field_indexes = {field: HashIndex(field) for field in Graph.INDEXED_FIELDS}
+        self._hash_indexes = {}
+        # ordered indexes of node ids by field, created as nodes with numeric values for the field come in
+        self._range_indexes = {}
+        # node id -> (field keys, declared index keys, ordered field values) the node is indexed under
+        self._indexed_keys = {}
+        # hash indexes of relationship ids, by relationship field and by indexed key of the relationship data
+        self._relationship_indexes = {field: HashIndex(field) for field in Graph.RELATIONSHIP_INDEXED_FIELDS}
+        self._relationship_data_indexes = {key: HashIndex(key) for key in self._relationship_data_keys}
+        # relationship id -> (field keys, data keys) the relationship is indexed under
+        self._relationship_keys = {}
+        # deadlines of the nodes with a ttl
+        self._expiry = ExpiryEngine()
+        # ids of the nodes and relationships added while indexing was deferred, in insertion order
+        self._pending_nodes = {}
+        self._pending_relationships = {}
+
+    def __getstate__(self):
+        state = dict(self.__dict__)
+        state.pop("_lock", None)
+        state.pop("_expiry_thread", None)
+        state.pop("_expiry_stop", None)
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.RLock()
+        self._expiry_thread = None
+        self._expiry_stop = None
+
+    @_synchronized
+    def expire(self, now=None, budget=None):
+        """
+        Evicts the nodes whose ttl has elapsed (create_date + ttl <= now) and the relationships attached to them
+        :param now: reference timestamp, now by default
+        :param budget: maximum number of nodes evicted
+        :return: list of evicted nodes
+        """
+        evicted = []
+        for node_id in self._expiry.expired(now=now, budget=budget):
+            node = self._nodes.get(node_id)
+            if node is not None:
+                self._remove_node(node_id)
+                evicted.append(node)
+        return evicted
+
+    @_synchronized
+    def freeze_csr(self):
+        """
+        Compressed sparse row snapshot of the graph structure for read heavy analytics, over the node and
+        relationship objects of the graph, requires numpy
+        :return: CSRGraph
+        """
+        from tomi_graph.graphs.csr_graph import CSRGraph
+        return CSRGraph(self)
+
+    def save_snapshot(self, path):
+        """
+        Writes a memory mapped snapshot of the graph to path, see tomi_graph.graphs.snapshot
+        :param path:
+        :return: path
+        """
+        from tomi_graph.graphs import snapshot
+        return snapshot.write(self, path)
+
+    def _expire_lazily(self):
+        if not self.__dict__.get("_lazy_expiry"):
+            return
+        next_deadline = self._expiry.next_deadline
+        if next_deadline is not None and next_deadline <= ExpiryEngine.now():
+            self.expire(budget=Graph.LAZY_EXPIRY_BUDGET)
+
+    def start_expiry(self, interval=1.0, budget=1000):
+        """
+        Evicts expired nodes from a background thread, every interval seconds and at most budget nodes per tick
+        :param interval: seconds between two ticks
+        :param budget: maximum number of nodes evicted per tick
+        :return:
+        """
+        if self._expiry_thread is not None:
+            return self
+        stop = threading.Event()
+
+        def run(graph_ref):
+            while not stop.wait(interval):
+                graph = graph_ref()
+                if graph is None:
+                    return
+                graph.expire(budget=budget)
+                del graph
+
+        self._expiry_stop = stop
+        self._expiry_thread = threading.Thread(target=run, args=(weakref.ref(self),), daemon=True,
+                                               name="graph-expiry-{id}".format(id=self._id))
+        self._expiry_thread.start()
+        return self
+
+    def stop_expiry(self):
+        if self._expiry_thread is None:
+            return self
+        self._expiry_stop.set()
+        if self._expiry_thread is not threading.current_thread():
+            self._expiry_thread.join()
+        self._expiry_thread = None
+        self._expiry_stop = None
+        return self
+
+    @staticmethod
+    def _index_keys(entity):
+        fields = {field: getattr(entity, field, None) for field in Graph.INDEXED_FIELDS}
+        fields["node_type"] = type(entity).__name__
+
+        ranges = {}
+        for field in Graph.RANGE_INDEXED_FIELDS + tuple(getattr(type(entity), "additional_fields", None) or ()):
+            value = getattr(entity, field, None)
+            # bools are numbers but not ordered against the other values of a field
+            if isinstance(value, Number) and type(value) != bool:
+                ranges[field] = value
+
+        return fields, dict(getattr(entity, "indexes", None) or {}), ranges
+
+    def _index_node(self, entity):
+        self._unindex_node(entity.id)
+        if self._indexing_deferred > 0:
+            # only the unique constraint is enforced until the indexes are rebuilt
+            unique_key = Graph._unique_key(entity)
+            fields, ranges = {}, {}
+            indexes = {unique_key[0]: unique_key[1]} if unique_key is not None else {}
+            self._pending_nodes[entity.id] = None
+        else:
+            fields, indexes, ranges = Graph._index_keys(entity)
+        for field, value in fields.items():
+            self._field_indexes[field].add(value, entity.id)
+        for name, key in indexes.items():
+            if name not in self._hash_indexes:
+                self._hash_indexes[name] = HashIndex(name)
+            self._hash_indexes[name].add(key, entity.id)
+        for field, value in ranges.items():
+            if field not in self._range_indexes:
+                self._range_indexes[field] = RangeIndex(field)
+            self._range_indexes[field].add(value, entity.id)
+        self._indexed_keys[entity.id] = (fields, indexes, ranges)
+        if self._indexing_deferred == 0:
+            self._expiry.schedule(entity)
+
+    def _unindex_node(self, node_id):
+        keys = self._indexed_keys.pop(node_id, None)
+        if keys is None:
+            return
+        fields, indexes, ranges = keys
+        for field, value in fields.items():
+            self._field_indexes[field].remove(value, node_id)
+        for name, key in indexes.items():
+            index = self._hash_indexes.get(name)
+            if index is not None:
+                index.remove(key, node_id)
+                if len(index) == 0:
+                    del self._hash_indexes[name]
+        for field, value in ranges.items():
+            index = self._range_indexes.get(field)
+            if index is not None:
+                index.remove(value, node_id)
+                if len(index) == 0:
+                    del self._range_indexes[field]
+
+    def range_search(self, field, low=None, high=None, include_low=True, include_high=True, reverse=False):
+        """
+        Nodes whose value for field lies between low and high, ordered by value. Nodes without a numeric value for
+        field are left out.
+        :param field: create_date, update_date, ttl or a numeric additional field
+        :param low: lower bound, None for no bound
+        :param high: upper bound, None for no bound
+        :param include_low:
+        :param include_high:
+        :param reverse: by decreasing values
+        :return: generator of nodes
+        """
+        self._expire_lazily()
+        with self._lock:
+            index = self._range_indexes.get(field)
+            if index is None:
+                return
+            node_ids = list(index.range(low=low, high=high, include_low=include_low, include_high=include_high,
+                                        reverse=reverse))
+        for node_id in node_ids:
+            node = self._nodes.get(node_id)
+            if node is not None:
+                yield node
+
+    def ordered_nodes(self, field, reverse=False):
+        """
+        Nodes ordered by their value for field, see range_search
+        :param field:
+        :param reverse:
+        :return: generator of nodes
+        """
+        return self.range_search(field, reverse=reverse)
+
+    def _index_relationship(self, relationship):
+        self._unindex_relationship(relationship.id)
+        if self._indexing_deferred > 0:
+            self._pending_relationships[relationship.id] = None
+            return
+        fields = {field: getattr(relationship, field, None) for field in Graph.RELATIONSHIP_INDEXED_FIELDS}
+        data = relationship.data if len(self._relationship_data_indexes) > 0 else {}
+        data_keys = {key: data[key] for key in self._relationship_data_indexes.keys() if key in data}
+        for field, value in fields.items():
+            self._relationship_indexes[field].add(value, relationship.id)
+        for key, value in data_keys.items():
+            self._relationship_data_indexes[key].add(value, relationship.id)
+        self._relationship_keys[relationship.id] = (fields, data_keys)
+
+    def _unindex_relationship(self, relationship_id):
+        keys = self._relationship_keys.pop(relationship_id, None)
+        if keys is None:
+            return
+        fields, data_keys = keys
+        for field, value in fields.items():
+            self._relationship_indexes[field].remove(value, relationship_id)
+        for key, value in data_keys.items():
+            self._relationship_data_indexes[key].remove(value, relationship_id)
+
+    @contextmanager
+    def deferred_indexing(self):
+        """
+        Within this context the nodes and relationships added are only indexed by the unique constraint of their
+        type, the other indexes (and the expiry schedule) are built in a second pass when the outermost context
+        exits, see rebuild_indexes. Searches made within the context miss the pending entities.
+        :return:
+        """
+        with self._lock:
+            self._indexing_deferred += 1
+        try:
+            yield self
+        finally:
+            with self._lock:
+                self._indexing_deferred -= 1
+                if self._indexing_deferred == 0:
+                    self.rebuild_indexes()
+
+    @_synchronized
+    def rebuild_indexes(self):
+        """
+        Indexes the nodes and relationships added while indexing was deferred
+        :return:
+        """
+        if self._indexing_deferred > 0:
+            return self
+        pending_nodes, self._pending_nodes = self._pending_nodes, {}
+        for node_id in pending_nodes:
+            node = self._nodes.get(node_id)
+            if node is not None:
+                self._index_node(node)
+        pending_relationships, self._pending_relationships = self._pending_relationships, {}
+        for relationship_id in pending_relationships:
+            relationship = self._relationships.get(relationship_id)
+            if relationship is not None:
+                self._index_relationship(relationship)
+        return self
+
+    @_synchronized
+    def get_unique(self, node_type, *values):
+        """
+        Node holding a unique key
+        :param node_type: name or class of the node type
+        :param values: values of the fields of the unique constraint of the type, in order
+        :return: node, None when no node holds the key
+        """
+        type_name = node_type.__name__ if issubclass(type(node_type), type) else node_type
+        index = self._hash_indexes.get(IndexesSupport.get_unique_constraint_name(type_name))
+        if index is None:
+            return None
+        key = ":".join([type_name] + [str(value) if value is not None else "" for value in values])
+        for node_id in index.get(key):
+            return self._nodes.get(node_id)
+        return None
+
+    @_synchronized
+    def index_relationship_data(self, *keys):
+        """
+        Indexes the values of the relationship data under keys, for search_relationships. Data are reindexed when
+        a relationship data is replaced (data setter, __call__), not when it is mutated in place.
+        :param keys:
+        :return:
+        """
+        new_keys = [key for key in keys if key not in self._relationship_data_keys]
+        if len(new_keys) == 0:
+            return self
+        self._relationship_data_keys.extend(new_keys)
+        for key in new_keys:
+            self._relationship_data_indexes[key] = HashIndex(key)
+        for relationship in self._relationships:
+            self._index_relationship(relationship)
+        return self
+
+    @_synchronized
+    def on_entity_changed(self, entity, name):
+        """
+        Watcher callback (see WatchedEntity), keeps the indexes of the nodes and relationships held by this graph up
+        to date. A node changing to the unique key of another node is handled after the unique_conflict of the graph:
+        RAISE raises a UniqueConstraintException (the node then rolls the change back), IGNORE keeps both nodes with
+        the other one holding the unique key, REPLACE removes the other node (along with its relationships).
+        :param entity:
+        :param name: attribute changed
+        :return:
+        """
+        if issubclass(type(entity), CoreRelationshipClass):
+            if entity.id in self._relationship_keys and self._relationships.get(entity.id) is entity:
+                self._index_relationship(entity)
+            return
+        if name in Graph.UNINDEXED_ATTRIBUTES:
+            return
+        if entity.id in self._indexed_keys and self._nodes.get(entity.id) is entity:
+            conflicts = self._unique_conflicts(entity)
+            if len(conflicts) > 0:
+                if self._unique_conflict == UniqueConflict.RAISE:
+                    raise UniqueConstraintException("Node {id} violates the unique constraint {c} held by {other}.".format(
+                        id=entity.id, c=Graph._unique_key(entity)[0], other=conflicts[0]))
+                if self._unique_conflict == UniqueConflict.IGNORE:
+                    self._index_node(entity)
+                    self._release_unique_key(entity)
+                    return
+                for node_id in conflicts:
+                    self._remove_node(node_id)
+            self._index_node(entity)
 
-    def add_node(self, entity, target=None):
+    def _set_degree(self, node_id, degree):
+        previous = self._degrees.get(node_id)
+        if previous is not None:
+            self._degree_histogram[previous] -= 1
+            if self._degree_histogram[previous] == 0:
+                del self._degree_histogram[previous]
+
+        if degree is None:
+            self._degrees.pop(node_id, None)
+            self._isolates.discard(node_id)
+            return
+
+        self._degrees[node_id] = degree
+        self._degree_histogram[degree] = self._degree_histogram.get(degree, 0) + 1
+        if degree == 0:
+            self._isolates.add(node_id)
+        else:
+            self._isolates.discard(node_id)
+
+    @staticmethod
+    def _node_id(node):
+        return node.id if issubclass(type(node), CoreNodeClass) else node
+
+    @staticmethod
+    def _ends(relationship):
+        """
+        Oriented ends of a relationship, undirected relationships are followed both ways
+        :param relationship:
+        :return: list of (from node id, to node id)
+        """
+        node_1_id = relationship.node_1.id
+        node_2_id = relationship.node_2.id
+        if relationship.direction == Direction.LEFT_TO_RIGHT:
+            return [(node_1_id, node_2_id)]
+        if relationship.direction == Direction.RIGHT_TO_LEFT:
+            return [(node_2_id, node_1_id)]
+        return [(node_1_id, node_2_id), (node_2_id, node_1_id)]
+
+    def _link(self, relationship):
+        ends = Graph._ends(relationship)
+        self._linked_ends[relationship.id] = ends
+        for node_id in ends[0]:
+            self._set_degree(node_id, self._degrees.get(node_id, 0) + 1)
+        for from_id, to_id in ends:
+            self._outgoing.setdefault(from_id, {})[relationship.id] = (to_id, relationship)
+            self._incoming.setdefault(to_id, {})[relationship.id] = (from_id, relationship)
+
+    def _unlink(self, relationship):
+        ends = self._linked_ends.pop(relationship.id, [])
+        if len(ends) > 0:
+            for node_id in ends[0]:
+                self._set_degree(node_id, self._degrees[node_id] - 1)
+        for from_id, to_id in ends:
+            for adjacency, node_id in ((self._outgoing, from_id), (self._incoming, to_id)):
+                adjacent = adjacency.get(node_id)
+                if adjacent is not None:
+                    adjacent.pop(relationship.id, None)
+                    if len(adjacent) == 0:
+                        del adjacency[node_id]
+
+    def _adjacent(self, node, direction=None):
+        """
+        Relationships of a node with the neighbor they lead to
+        :param node: node or node id
+        :param direction: Direction.LEFT_TO_RIGHT for outgoing relationships, Direction.RIGHT_TO_LEFT for incoming
+            ones, both otherwise
+        :return: generator of (relationship, neighbor id)
+        """
+        node_id = Graph._node_id(node)
+        if direction == Direction.LEFT_TO_RIGHT:
+            adjacencies = [self._outgoing]
+        elif direction == Direction.RIGHT_TO_LEFT:
+            adjacencies = [self._incoming]
+        else:
+            adjacencies = [self._outgoing, self._incoming]
+
+        seen = set()
+        for adjacency in adjacencies:
+            for relationship_id, (neighbor_id, relationship) in adjacency.get(node_id, {}).items():
+                if relationship_id not in seen:
+                    seen.add(relationship_id)
+                    yield relationship, neighbor_id
+
+    @_synchronized
+    def neighbors(self, node, direction=None):
+        """
+        Nodes linked to node, undirected relationships count in both directions
+        :param node: node or node id
+        :param direction: Direction.LEFT_TO_RIGHT for the targets of outgoing relationships, Direction.RIGHT_TO_LEFT
+            for the sources of incoming ones, any other value for both
+        :return: list of nodes
+        """
+        self._expire_lazily()
+        neighbors = {}
+        for _, neighbor_id in self._adjacent(node, direction=direction):
+            if neighbor_id not in neighbors and neighbor_id in self._nodes:
+                neighbors[neighbor_id] = self._nodes[neighbor_id]
+        return list(neighbors.values())
+
+    @_synchronized
+    def node_relationships(self, node, direction=None):
+        """
+        Relationships attached to node, see neighbors for direction
+        :param node: node or node id
+        :param direction:
+        :return: list of relationships
+        """
+        return [relationship for relationship, _ in self._adjacent(node, direction=direction)]
+
+    def degree(self, node):
+        """
+        Number of relationships attached to node, whatever their direction
+        :param node: node or node id
+        :return:
+        """
+        return self._degrees.get(Graph._node_id(node), 0)
+
+    @_synchronized
+    def degree_distribution(self):
+        """
+        Degree histogram of the graph
+        :return: dict of degree -> number of nodes, sorted by degree
+        """
+        return {degree: self._degree_histogram[degree] for degree in sorted(self._degree_histogram)}
+
+    def out_degree(self, node):
+        return len(self._outgoing.get(Graph._node_id(node), {}))
+
+    def in_degree(self, node):
+        return len(self._incoming.get(Graph._node_id(node), {}))
+
+    def bfs(self, start, **kwargs):
+        """
+        Breadth first traversal from start, see traversal.bfs for the arguments
+        :param start: node or node id
+        :return: generator of TraversalStep
+        """
+        self._expire_lazily()
+        return traversal.bfs(self, start, **kwargs)
+
+    def dfs(self, start, **kwargs):
+        """
+        Depth first traversal from start, see traversal.dfs for the arguments
+        :param start: node or node id
+        :return: generator of TraversalStep
+        """
+        self._expire_lazily()
+        return traversal.dfs(self, start, **kwargs)
+
+    def shortest_path(self, source, target, **kwargs):
+        """
+        Path with the fewest relationships, see traversal.shortest_path for the arguments
+        :param source: node or node id
+        :param target: node or node id
+        :return: list of TraversalStep, None when target is not reached
+        """
+        self._expire_lazily()
+        return traversal.shortest_path(self, source, target, **kwargs)
+
+    def dijkstra(self, source, **kwargs):
+        """
+        Nodes by increasing weighted distance from source, see traversal.dijkstra for the arguments
+        :param source: node or node id
+        :return: generator of (TraversalStep, distance)
+        """
+        self._expire_lazily()
+        return traversal.dijkstra(self, source, **kwargs)
+
+    def weighted_shortest_path(self, source, target, **kwargs):
+        """
+        Path of least weight, see traversal.weighted_shortest_path for the arguments
+        :param source: node or node id
+        :param target: node or node id
+        :return: (distance, list of TraversalStep), None when target is not reached
+        """
+        self._expire_lazily()
+        return traversal.weighted_shortest_path(self, source, target, **kwargs)
+
+    @staticmethod
+    def _unique_key(entity):
+        if not hasattr(entity, "unique_index"):
+            return None
+        return IndexesSupport.get_unique_constraint_name(type(entity)), entity.unique_index
+
+    def _release_unique_key(self, entity):
+        """
+        Unindexes the unique key of a node, left to the node already holding it
+        :param entity:
+        :return:
+        """
+        name, key = Graph._unique_key(entity)
+        self._indexed_keys[entity.id][1].pop(name, None)
+        self._hash_indexes[name].remove(key, entity.id)
+
+    def _unique_conflicts(self, entity):
+        """
+        Ids of the other nodes of the graph having the unique key of entity
+        :param entity:
+        :return: list of node ids
+        """
+        unique_key = Graph._unique_key(entity)
+        if unique_key is None:
+            return []
+        index = self._hash_indexes.get(unique_key[0])
+        if index is None:
+            return []
+        return [node_id for node_id in index.get(unique_key[1]) if node_id != entity.id]
+
+    @_synchronized
+    def add_node(self, entity, target=None, on_conflict=None):
+        """
+        Adds a node, enforcing the unique constraint of its type
+        :param entity:
+        :param target:
+        :param on_conflict: UniqueConflict overriding the one of the graph for this node: RAISE raises a
+            UniqueConstraintException, IGNORE keeps the node already in the graph, REPLACE removes it (along with its
+            relationships) in favor of entity
+        :return: the node the graph holds for the unique key of entity
+        """
         target = self if target is None else target
-        target.nodes[entity.id] = entity
+        if entity.id in target._indexed_keys and target._nodes.get(entity.id) is entity:
+            # already held, and indexed, by the graph
+            return entity
+        conflicts = target._unique_conflicts(entity)
+        if len(conflicts) > 0:
+            on_conflict = on_conflict if type(on_conflict) == UniqueConflict else target.unique_conflict
+            if on_conflict == UniqueConflict.RAISE:
+                raise UniqueConstraintException("Node {id} violates the unique constraint {c} held by {other}.".format(
+                    id=entity.id, c=Graph._unique_key(entity)[0], other=conflicts[0]))
+            if on_conflict == UniqueConflict.IGNORE:
+                return target._nodes[conflicts[0]]
+            for node_id in conflicts:
+                target._remove_node(node_id)
+
+        previous = target._nodes.get(entity.id)
+        if previous is not None and previous is not entity and hasattr(previous, "unwatch"):
+            previous.unwatch(target)
+        target._nodes[entity.id] = entity
+        if entity.id not in target._degrees:
+            target._set_degree(entity.id, 0)
+        target._index_node(entity)
+        if hasattr(entity, "watch"):
+            entity.watch(target)
+        return entity
+
+    @_synchronized
+    def upsert_nodes(self, nodes, on_conflict=None):
+        """
+        Adds nodes in one batch: conflicts within the batch are resolved first, the last node of a unique key winning
+        unless on_conflict is IGNORE, then against the graph. With RAISE, nothing is added if any node conflicts.
+        :param nodes: iterable of nodes
+        :param on_conflict: UniqueConflict, the one of the graph by default
+        :return: list of the nodes the graph holds for the unique keys of nodes
+        """
+        on_conflict = on_conflict if type(on_conflict) == UniqueConflict else self.unique_conflict
 
+        batch = {}
+        for node in nodes:
+            unique_key = Graph._unique_key(node)
+            unique_key = unique_key if unique_key is not None else (None, node.id)
+            existing = batch.get(unique_key)
+            if existing is not None and existing.id != node.id:
+                if on_conflict == UniqueConflict.RAISE:
+                    raise UniqueConstraintException("Nodes {id} and {other} share the unique key {k}.".format(
+                        id=node.id, other=existing.id, k=unique_key[1]))
+                if on_conflict == UniqueConflict.IGNORE:
+                    continue
+            batch[unique_key] = node
+
+        if on_conflict == UniqueConflict.RAISE:
+            for node in batch.values():
+                conflicts = self._unique_conflicts(node)
+                if len(conflicts) > 0:
+                    raise UniqueConstraintException(
+                        "Node {id} violates the unique constraint {c} held by {other}.".format(
+                            id=node.id, c=Graph._unique_key(node)[0], other=conflicts[0]))
+
+        return [self.add_node(node, on_conflict=on_conflict) for node in batch.values()]
+
+    @_synchronized
     def add_relationship(self, relationship, target=None):
         target = self if target is None else target
-        if relationship.id not in [r.id for r in target.relationships if r is not None]:
-            target.add_node(relationship.node_1)
-            target.add_node(relationship.node_2)
-            target.relationships.append(relationship)
+        if relationship.id not in target._relationships:
+            # a relationship whose node was ignored for a unique conflict is not added
+            if target.add_node(relationship.node_1) is not relationship.node_1 or target.add_node(
+                    relationship.node_2) is not relationship.node_2:
+                return
+            target._relationships.add(relationship)
+            target._link(relationship)
+            target._watch_relationship(relationship)
+
+    @_synchronized
+    def add_relationships(self, relationships, target=None):
+        """
+        Adds relationships in one pass, the ones already in the graph (or repeated in relationships) are skipped
+        :param relationships: iterable of relationships
+        :param target:
+        :return:
+        """
+        target = self if target is None else target
+        collection = target._relationships
+        for relationship in relationships:
+            if relationship is None or relationship.id in collection:
+                continue
+            if target.add_node(relationship.node_1) is not relationship.node_1 or target.add_node(
+                    relationship.node_2) is not relationship.node_2:
+                continue
+            collection.add(relationship)
+            target._link(relationship)
+            target._watch_relationship(relationship)
+
+    def _watch_relationship(self, relationship):
+        self._index_relationship(relationship)
+        if hasattr(relationship, "watch"):
+            relationship.watch(self)
 
     def add_graph(self, graph, target=None):
         target = self if target is None else target
 
         if target.id != self.id:
-            for relationship in self.relationships:
-                target.add_relationship(relationship, target=target)
+            target.add_relationships(self.relationships, target=target)
 
+        nodes = graph.nodes
         for isolate in graph.isolates:
-            target.add_node(graph.nodes[isolate], target=target)
+            target.add_node(nodes[isolate], target=target)
 
-        for relationship in graph.relationships:
-            target.add_relationship(relationship, target=target)
+        target.add_relationships(graph.relationships, target=target)
 
-        print("NAMESPACE", graph.namespace_map is not None and len(graph.namespace_map) > 0)
         if graph.namespace_map is not None and len(graph.namespace_map) > 0:
             target.namespace_map.update(graph.namespace_map)
 
         return target
 
+    @_synchronized
+    def _remove_node(self, node_id):
+        for relationship in self.node_relationships(node_id):
+            self.subtract_relationship(relationship)
+        node = self._nodes.get(node_id)
+        if node is not None:
+            del self._nodes[node_id]
+        if node_id not in self._nodes:
+            self._set_degree(node_id, None)
+            self._unindex_node(node_id)
+            self._expiry.unschedule(node_id)
+            if hasattr(node, "unwatch"):
+                node.unwatch(self)
+
     def subtract_node(self, node):
         if len(node.graph.relationships) == 0 and len(node.graph.nodes) == 1:
-            del self._nodes[node.id]
+            self._remove_node(node.id)
         else:
             self.subtract_graph(node.graph)
         return self
 
+    @_synchronized
     def subtract_relationship(self, relationship):
-        # if relationship.id in self._relationships.keys():
-        #     return  # TODO: throw warnings somewhere
-        #
-        # if len() > 0:
-        #     return
-        pass
+        found = self._relationships.get(relationship.id)
+        if found is None:
+            return self
+        self._relationships.discard(found)
+        self._unlink(found)
+        self._unindex_relationship(found.id)
+        if hasattr(found, "unwatch"):
+            found.unwatch(self)
+        return self
 
+    @_synchronized
     def subtract_graph(self, graph):
-        pass
+        for relationship in list(graph.relationships):
+            self.subtract_relationship(relationship)
+        for node_id in list(graph.nodes.keys()):
+            self._remove_node(node_id)
+        return self
 
     def operation_resolution(self, other, operation, direction):
         if operation == GraphOperation.ADD:
@@ -131,33 +878,123 @@ class Graph(OperatorsResolver, BaseGraph):
                                                                                             other=type(other).__name__))
 
     def search_relationships(self, **kwargs):
-        # Defaults for search arguments: name=None, rel_type=None, protection=None, data=None, on_gc_collect=NULL_VAL
-        search_arguments = {k: v for k, v in kwargs.items() if v != DefaultValues.RELATIONSHIP.value[k]}
-        print(search_arguments)
+        """
+        Relationships matching all the search arguments, answered from the graph indexes
+        :param kwargs: rel_type (name or class), name, direction, protection and data, a dict of values the
+            relationship data must hold (keys indexed with index_relationship_data are looked up, the others compared)
+        :return: generator of relationships
+        """
+        # Defaults for search arguments: name=None, rel_type=None, direction=None, protection=None, data=None,
+        #   on_gc_collect=NULL_VAL
+        self._expire_lazily()
+        defaults = DefaultValues.RELATIONSHIP.value
+        search_arguments = {k: v for k, v in kwargs.items() if k not in defaults or v != defaults[k]}
+        search_arguments.pop("on_gc_collect", None)
+        data = dict(search_arguments.pop("data", None) or {})
+
+        if issubclass(type(search_arguments.get("rel_type")), type):
+            search_arguments["rel_type"] = search_arguments["rel_type"].__name__
+        # the indexes are read under the graph lock, the expiry thread updates them
+        with self._lock:
+            candidates = []
+            for name, value in search_arguments.items():
+                index = self._relationship_indexes.get(name)
+                candidates.append(index.get(value) if index is not None else {})
+            for key in [k for k in data.keys() if k in self._relationship_data_indexes]:
+                candidates.append(self._relationship_data_indexes[key].get(data.pop(key)))
+
+            if len(candidates) == 0:
+                relationships = list(self._relationships)
+            else:
+                candidates.sort(key=len)
+                relationships = [self._relationships.get(i) for i in candidates[0] if
+                                 all(i in c for c in candidates[1:])]
+
+        for relationship in relationships:
+            if relationship is None:
+                continue
+            if len(data) > 0:
+                relationship_data = relationship.data
+                if not all(k in relationship_data and relationship_data[k] == v for k, v in data.items()):
+                    continue
+            yield relationship
 
     def search_entities(self, **kwargs):
+        """
+        Nodes matching all the search arguments, answered from the graph indexes
+        :param kwargs: node_type (name or class), id, encoding, key, name, ttl, data (compared with the data of the
+            nodes matching the other arguments) and the names of the indexes declared for the node types, with the
+            key the index computes (see IndexesSupport.indexes)
+        :return: list of nodes
+        """
         # Defaults for search arguments: node_type=None, id=None, encoding=None, key=None, name=None, data=None,
         #   ttl=-1
-        search_arguments = {k: v for k, v in kwargs.items() if v != DefaultValues.RELATIONSHIP.value[k]}
-        print(search_arguments)
+        self._expire_lazily()
+        defaults = DefaultValues.ENTITY.value
+        search_arguments = {k: v for k, v in kwargs.items() if k not in defaults or v != defaults[k]}
+        data = search_arguments.pop("data", None)
+
+        if issubclass(type(search_arguments.get("node_type")), type):
+            search_arguments["node_type"] = search_arguments["node_type"].__name__
+        # the indexes are read under the graph lock, the expiry thread updates them
+        with self._lock:
+            candidates = []
+            if "id" in search_arguments:
+                node_id = search_arguments.pop("id")
+                candidates.append({node_id: None} if node_id in self._nodes else {})
+            for name, value in search_arguments.items():
+                index = self._field_indexes.get(name) if name in Graph.INDEXED_FIELDS else self._hash_indexes.get(name)
+                candidates.append(index.get(value) if index is not None else {})
+
+            if len(candidates) == 0:
+                nodes = list(self._nodes.values())
+            else:
+                candidates.sort(key=len)
+                nodes = [self._nodes[i] for i in candidates[0] if all(i in c for c in candidates[1:])]
+
+        if data is not None:
+            nodes = [n for n in nodes if (n.peek_data() if hasattr(n, "peek_data") else n.get_data()) == data]
+        return nodes
+
+    def match(self, query, params=None):
+        """
+        Paths of the graph matching a pattern such as (a:Person {name: $n})-[:REF]->(b), see
+        tomi_graph.query.parser.parse for the syntax. The match starts from the most selective node of the pattern.
+        :param query: pattern
+        :param params: values of the $parameters of the pattern
+        :return: generator of dicts, variable -> node or relationship
+        """
+        self._expire_lazily()
+        return Query.compile(query).plan(self, params).execute()
+
+    def explain(self, query, params=None):
+        """
+        Plan match would follow for query
+        :param query: pattern
+        :param params:
+        :return: str
+        """
+        self._expire_lazily()
+        return Query.compile(query).plan(self, params).explain()
 
     @staticmethod
     def erase(self, obj):
         if issubclass(type(obj), CoreNodeClass):
-            found = [k for k, e in self.nodes.value_collection.items() if id(e) == id(obj)]
+            found = [k for k, e in self.nodes.items() if id(e) == id(obj)]
             if len(found) > 0:
-                value = self.nodes.get(found[0])()
-                del value
-                del self.nodes[found[0]]
+                self._remove_node(found[0])
 
         if issubclass(type(obj), CoreRelationshipClass):
-            found = [r for r in self.relationships.value_collection if id(r) == id(obj)]
+            found = [r for r in self.relationships if id(r) == id(obj)]
             if len(found) > 0:
-                value = self.relationships.get(found[0])()
-                del value
-                del self.relationships[found[0]]
+                self.subtract_relationship(found[0])
 
+    @_synchronized
     def clear(self):
-        self.nodes.clear()
-        self.relationships.clear()
+        for entity in list(self._nodes.values()) + list(self._relationships):
+            if hasattr(entity, "unwatch"):
+                entity.unwatch(self)
+        self._nodes.clear()
+        self._relationships.clear()
+        self._reset_indexes()
         self._namespace_map = {}
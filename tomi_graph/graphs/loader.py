@@ -0,0 +1,267 @@
+import csv
+import os
+from ujson import loads
+
+from tomi_graph.entity_class_generator import EntityClassGenerator
+from tomi_graph.graphs.graph import Graph
+from tomi_graph.nodes.core import DEFAULT_ENCODING
+from tomi_graph.nodes.node_class import Node
+from tomi_graph.relationships.core.direction import Direction
+from tomi_graph.relationships.core.protection import Protection
+from tomi_graph.relationships.relationship_class import Relationship, RelationshipBaseClass
+from tomi_graph.version_aware_entity import VersionAwareEntity
+
+JSONL = "jsonl"
+CSV = "csv"
+
+DEFAULT_BATCH_SIZE = 10000
+
+NODE_TYPE_FIELD = "node_type"
+NODE_FIELDS = ("id", "encoding", "key", "name", "data", "ttl", "create_date", "update_date", "options")
+
+REL_TYPE_FIELD = "rel_type"
+RELATIONSHIP_FIELDS = ("id", "node_1", "node_2", "node_1_type", "node_2_type", "name", "direction", "protection",
+                       "data")
+
+# CSV columns holding JSON values, the other columns are read as strings
+CSV_JSON_FIELDS = ("data", "ttl", "create_date", "update_date", "options")
+
+
+def _format(source, format):
+    if format is not None:
+        return format.lower()
+    if type(source) == str and os.path.splitext(source)[1].lower() == ".csv":
+        return CSV
+    return JSONL
+
+
+def _csv_value(field, value):
+    if value == "":
+        return None
+    if field in CSV_JSON_FIELDS:
+        try:
+            return loads(value)
+        except ValueError:
+            return value
+    return value
+
+
+def _parsed(lines, format):
+    if format == CSV:
+        for row in csv.DictReader(lines):
+            yield {field: _csv_value(field, value) for field, value in row.items()}
+    elif format == JSONL:
+        for line in lines:
+            line = line.strip()
+            if len(line) > 0:
+                yield loads(line)
+    else:
+        raise ValueError("Unsupported format {f}, {j} or {c} expected".format(f=format, j=JSONL, c=CSV))
+
+
+def read_records(source, format=None, encoding=DEFAULT_ENCODING):
+    """
+    Streams the records of a JSONL (one JSON object per line) or CSV (with a header row) source
+    :param source: file path, text file object or iterable of dicts (returned as they are)
+    :param format: JSONL or CSV, from the extension of a file path by default (JSONL unless .csv)
+    :param encoding: of file paths
+    :return: generator of dicts
+    """
+    if type(source) == str:
+        with open(source, "r", encoding=encoding, newline="") as fp:
+            yield from _parsed(fp, _format(source, format))
+    elif hasattr(source, "read"):
+        yield from _parsed(source, _format(source, format))
+    else:
+        yield from source
+
+
+def _enum(enum, value):
+    if value is None or type(value) == enum:
+        return value
+    for member in enum:
+        values = member.value if type(member.value) == tuple else (member.value,)
+        if str(value).upper() == member.name or value in values:
+            return member
+    raise ValueError("{v} is not a {e}".format(v=repr(value), e=enum.__name__))
+
+
+def _batches(records, size):
+    batch = []
+    for record in records:
+        batch.append(record)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if len(batch) > 0:
+        yield batch
+
+
+class GraphLoader(object):
+    """
+    Streams nodes and relationships from JSONL or CSV sources into a graph, in batches of bounded size. Nodes are
+    built with Node.bulk_create, typed by EntityClassGenerator after their node_type field, relationships after their
+    rel_type field and their ends are resolved by node id or by unique key. The graph indexes other than the unique
+    constraints are built in a second pass, once everything is loaded (see Graph.deferred_indexing).
+    Only the input is streamed: the graph loaded is held in memory, its size is bounded by the available RAM.
+    """
+
+    def __init__(self, graph=None, batch_size=DEFAULT_BATCH_SIZE, progress=None, on_conflict=None):
+        """
+
+        :param graph: graph loaded, a new Graph by default
+        :param batch_size: number of records built and added at once
+        :param progress: callable taking (kind, count), called after each batch with "nodes" or "relationships"
+            and the number of entities of that kind loaded so far
+        :param on_conflict: UniqueConflict for the nodes violating a unique constraint, see Graph.upsert_nodes
+        """
+        self._graph = Graph(Graph.NAMESPACE_DELIMITER) if graph is None else graph
+        self._batch_size = batch_size
+        self._progress = progress
+        self._on_conflict = on_conflict
+        # node type -> fields of its nodes, relationship type -> relationship class
+        self._node_fields = {}
+        self._relationship_classes = {}
+        self.nodes_loaded = 0
+        self.relationships_loaded = 0
+        self.relationships_skipped = 0
+
+    @property
+    def graph(self):
+        return self._graph
+
+    def load(self, nodes=None, relationships=None, format=None, node_type=None, rel_type=None):
+        """
+        Loads node sources then relationship sources, indexing the graph once at the end
+        :param nodes: source or list of sources of node records, see read_records
+        :param relationships: source or list of sources of relationship records
+        :param format: see read_records
+        :param node_type: type of the node records without node_type field
+        :param rel_type: type of the relationship records without rel_type field
+        :return: the graph
+        """
+        with self._graph.deferred_indexing():
+            for source in GraphLoader._sources(nodes):
+                self.load_nodes(source, format=format, node_type=node_type)
+            for source in GraphLoader._sources(relationships):
+                self.load_relationships(source, format=format, rel_type=rel_type)
+        return self._graph
+
+    @staticmethod
+    def _sources(sources):
+        if sources is None:
+            return []
+        return sources if type(sources) in (list, tuple) else [sources]
+
+    def _report(self, kind, count):
+        if self._progress is not None:
+            self._progress(kind, count)
+
+    def load_nodes(self, source, format=None, node_type=None):
+        """
+        Loads node records: the node fields (id, key, name, data...), the node_type field and, when there is no data
+        field, any other field as an entry of the node data
+        :param source: see read_records
+        :param format: see read_records
+        :param node_type: type of the records without node_type field
+        :return: number of nodes loaded
+        """
+        loaded = 0
+        for batch in _batches(read_records(source, format=format), self._batch_size):
+            by_type = {}
+            for record in batch:
+                record_type = record.get(NODE_TYPE_FIELD) or node_type
+                by_type.setdefault(record_type, []).append(self._node_record(record, record_type))
+            for record_type, records in by_type.items():
+                nodes = Node.bulk_create(records, node_type=record_type)
+                self._graph.upsert_nodes(nodes, on_conflict=self._on_conflict)
+            loaded += len(batch)
+            self.nodes_loaded += len(batch)
+            self._report("nodes", self.nodes_loaded)
+        return loaded
+
+    def _node_record(self, record, node_type):
+        # missing values (empty CSV cells) take the node defaults
+        record = {k: v for k, v in record.items() if v is not None}
+        fields = self._node_fields.get(node_type)
+        if fields is None:
+            node_class = EntityClassGenerator.class_registry.get(node_type) if node_type is not None else None
+            fields = set(NODE_FIELDS).union(getattr(node_class, "additional_fields", None) or [])
+            self._node_fields[node_type] = fields
+
+        record.pop(NODE_TYPE_FIELD, None)
+        others = {k: v for k, v in record.items() if k not in fields}
+        if len(others) == 0:
+            return record
+        node_record = {k: v for k, v in record.items() if k in fields}
+        if node_record.get("data") is None:
+            node_record["data"] = others
+        return node_record
+
+    def _relationship_class(self, rel_type):
+        relationship_class = self._relationship_classes.get(rel_type)
+        if relationship_class is None:
+            relationship_class = Relationship if rel_type is None else EntityClassGenerator(
+                RelationshipBaseClass, VersionAwareEntity).create(rel_type)
+            self._relationship_classes[rel_type] = relationship_class
+        return relationship_class
+
+    def _end(self, record, end):
+        value = record.get(end)
+        if value is None:
+            return None
+        end_type = record.get(end + "_type")
+        if end_type is not None:
+            # unique key, the values of a constraint on several fields given as a list
+            return self._graph.get_unique(end_type, *(value if type(value) in (list, tuple) else [value]))
+        return self._graph._nodes.get(str(value))
+
+    def load_relationships(self, source, format=None, rel_type=None):
+        """
+        Loads relationship records: node_1 and node_2 (node ids, or unique keys along with node_1_type and
+        node_2_type), rel_type, id, name, direction and protection (names of Direction and Protection members) and,
+        when there is no data field, any other field as an entry of the relationship data. Relationships whose ends
+        are not in the graph and relationships already in it are skipped.
+        :param source: see read_records
+        :param format: see read_records
+        :param rel_type: type of the records without rel_type field
+        :return: number of relationships loaded
+        """
+        loaded = 0
+        for batch in _batches(read_records(source, format=format), self._batch_size):
+            relationships = []
+            for record in batch:
+                node_1 = self._end(record, "node_1")
+                node_2 = self._end(record, "node_2")
+                if node_1 is None or node_2 is None:
+                    self.relationships_skipped += 1
+                    continue
+                data = record.get("data")
+                if data is None:
+                    data = {k: v for k, v in record.items() if
+                            k not in RELATIONSHIP_FIELDS and k != REL_TYPE_FIELD and v is not None}
+                relationship = self._relationship_class(record.get(REL_TYPE_FIELD) or rel_type)(
+                    node_1, node_2, name=record.get("name"), direction=_enum(Direction, record.get("direction")),
+                    protection=_enum(Protection, record.get("protection")), **data)
+                if record.get("id") is not None:
+                    object.__setattr__(relationship, "_id", str(record["id"]))
+                relationships.append(relationship)
+            count = len(self._graph._relationships)
+            self._graph.add_relationships(relationships)
+            added = len(self._graph._relationships) - count
+            self.relationships_skipped += len(relationships) - added
+            loaded += added
+            self.relationships_loaded += added
+            self._report("relationships", self.relationships_loaded)
+        return loaded
+
+
+def load_graph(nodes=None, relationships=None, graph=None, format=None, node_type=None, rel_type=None,
+               batch_size=DEFAULT_BATCH_SIZE, progress=None, on_conflict=None):
+    """
+    Loads a graph from node and relationship sources, see GraphLoader
+    :return: the graph
+    """
+    loader = GraphLoader(graph=graph, batch_size=batch_size, progress=progress, on_conflict=on_conflict)
+    return loader.load(nodes=nodes, relationships=relationships, format=format, node_type=node_type,
+                       rel_type=rel_type)
@@ -9,6 +9,7 @@ from tomi_graph.nodes.core.node import CoreNodeClass
 from tomi_graph.relationships.core.protection import Protection
 from tomi_graph.relationships.core.relation_type import RelationType
 from tomi_graph.relationships.relationship_class import RelationshipBaseClass
+from tomi_graph.relationships.relationships_collection import RelationshipsCollection
 from tomi_graph.version_aware_entity import VersionAwareEntity
 
 
@@ -25,26 +26,36 @@ class NodeDataGraph(Graph):
                 }
             return d
 
+        # embedded nodes may still be held by the caller (do_not_clone), the graph flattens clones of them, one per id
+        clones = {}
+
+        def private(d):
+            if not issubclass(type(d), CoreNodeClass) or d is self.root_node:
+                return d
+            if d.id not in clones:
+                clones[d.id] = d.clone(new=False)
+            return clones[d.id]
+
         def swap_with_id(d):
             if issubclass(type(d), dict) or type(d) == dict:
                 for idx, val in d.items():
                     d[idx] = to_id(val)
-                    swap_with_id(val)
+                    swap_with_id(private(val))
             elif issubclass(type(d), list) or type(d) == list:
                 for idx, val in enumerate(d):
                     d[idx] = to_id(val)
-                    swap_with_id(val)
+                    swap_with_id(private(val))
             elif issubclass(type(d), CoreNodeClass):
-                self._nodes[d.id] = d
+                self.add_node(d)
                 d_data = d.get_data()
                 if type(d_data) == tuple:
                     # some ugliness to bypass issues with the immutable nature of tuples
                     d.set_data(tuple(to_id(list(d_data))))
                 else:
                     d.set_data(to_id(d_data))
-                swap_with_id(d_data)
+                swap_with_id(private(d_data))
 
-        swap_with_id([self.root_node] + self.root_node.children())
+        swap_with_id([self.root_node] + [private(child) for child in self.root_node.children()])
 
         for k, v in self._nodes.items():
             data = v.get_data()
@@ -53,8 +64,8 @@ class NodeDataGraph(Graph):
                 for ref in list(
                         tree.execute('$..*[@.__type and @.__id]')):
                     rel_type = EntityClassGenerator(RelationshipBaseClass, VersionAwareEntity).create(self._rel_type)
-                    self._relationships.append(rel_type(node_1=self._nodes[v.id], node_2=self._nodes[ref["__id"]],
-                                                        rel_type=self._rel_type, protection=Protection.PRESERVE))
+                    self.add_relationship(rel_type(node_1=self._nodes[v.id], node_2=self._nodes[ref["__id"]],
+                                                   rel_type=self._rel_type, protection=Protection.PRESERVE))
 
     def _assemble(self, entity):
 
@@ -102,8 +113,10 @@ class NodeDataGraph(Graph):
         if not issubclass(type(value), CoreNodeClass):
             raise TypeError("Argument doc must be a class inheriting from {base}".format(base=CoreNodeClass.__name__))
         self._root_node = value
-        self._relationships = []
+        self._relationships = RelationshipsCollection()
         self._nodes = {}
+        self._namespace_map = None
+        self._reset_indexes()
         self._flatten()
 
     def assemble(self, update=None):
@@ -136,7 +149,7 @@ class NodeDataGraph(Graph):
 
             def calculate_namespace(parent_namespace):
                 id = parent_namespace.split(self.namespace_delimiter)[-1]
-                for rel in [r for r in self._relationships if r.node_1.id == id]:
+                for rel in [r for r in self.node_relationships(id) if r.node_1.id == id]:
                     child_namespace = "{base}{delimiter}{entity_id}".format(base=parent_namespace,
                                                                             entity_id=rel.node_2.id,
                                                                             delimiter=self.namespace_delimiter)
@@ -163,14 +176,37 @@ class NodeDataGraph(Graph):
 
         self._root_node = doc if do_not_clone else deepcopy(doc)
         self._namespace_map = None
-
-        if rel_type is None or type(rel_type) not in (str, RelationType):
-            self._rel_type = RelationType.EMBEDDED.string
-        else:
-            self._rel_type = rel_type.string if type(rel_type) == RelationType else rel_type.upper()
+        self._rel_type = NodeDataGraph.rel_type_name(rel_type)
 
         self._flatten()
 
+    @classmethod
+    def from_flattened(cls, root_node, nodes, relationships, rel_type=None):
+        """
+        Rebuilds a graph from nodes and relationships it produced, the root node is not flattened again
+        :param root_node: flattened root node
+        :param nodes: flattened nodes, the root node included
+        :param relationships:
+        :param rel_type:
+        :return:
+        """
+        graph = cls.__new__(cls)
+        Graph.__init__(graph, namespace_root=NodeDataGraph.NAMESPACE_DELIMITER)
+        graph._root_node = root_node
+        graph._namespace_map = None
+        graph._rel_type = NodeDataGraph.rel_type_name(rel_type)
+
+        for node in nodes:
+            graph.add_node(node)
+        graph.add_relationships(relationships)
+        return graph
+
+    @staticmethod
+    def rel_type_name(rel_type):
+        if rel_type is None or type(rel_type) not in (str, RelationType):
+            return RelationType.EMBEDDED.string
+        return rel_type.string if type(rel_type) == RelationType else rel_type.upper()
+
     def __repr__(self):
         return repr(self.toDict())
 
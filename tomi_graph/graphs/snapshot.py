@@ -0,0 +1,345 @@
+import mmap
+import os
+import struct
+import sys
+import zlib
+from numbers import Integral
+from ujson import dumps, loads
+
+from tomi_graph.graphs.graph import Graph
+from tomi_graph.nodes.core import DEFAULT_ENCODING
+from tomi_graph.relationships.core.direction import Direction
+from tomi_graph.serialization import binary
+
+# Layout: MAGIC, number of sections, (offset, length) of each section, then the sections, each aligned on 8 bytes.
+# Integer sections are little endian int64 arrays read in place from the mapped file.
+MAGIC = b"TGS\x01"
+ALIGNMENT = 8
+
+SECTIONS = (
+    "metadata",  # JSON: namespace root, relationship type names
+    "node_ids",  # utf-8 ids of the nodes, concatenated
+    "node_id_offsets",  # n + 1 offsets into node_ids
+    "id_table",  # open addressing hash table of node indices by id, -1 for empty slots
+    "node_offsets",  # n + 1 offsets into node_payloads
+    "node_payloads",  # binary serialization of the nodes
+    "indptr",  # outgoing adjacency, see CSRGraph
+    "indices",
+    "edge_relationships",
+    "in_indptr",  # incoming adjacency
+    "in_indices",
+    "in_edge_relationships",
+    "relationship_ends",  # node_1 and node_2 indices of each relationship
+    "relationship_types",  # index of the type name of each relationship in the metadata
+    "relationship_offsets",  # r + 1 offsets into relationship_payloads
+    "relationship_payloads"  # binary serialization of the relationship fields, nodes excluded
+)
+INTEGER_SECTIONS = ("node_id_offsets", "id_table", "node_offsets", "indptr", "indices", "edge_relationships",
+                    "in_indptr", "in_indices", "in_edge_relationships", "relationship_ends", "relationship_types",
+                    "relationship_offsets")
+
+HEADER = struct.Struct("<4sQ")
+SECTION = struct.Struct("<QQ")
+EMPTY_SLOT = -1
+
+
+class SnapshotFormatException(Exception):
+    pass
+
+
+def _slot(node_id, mask):
+    return zlib.crc32(node_id.encode(DEFAULT_ENCODING)) & mask
+
+
+def _offsets(chunks):
+    offsets = [0]
+    for chunk in chunks:
+        offsets.append(offsets[-1] + len(chunk))
+    return offsets
+
+
+def _integers(values):
+    values = list(values)
+    return struct.pack("<{n}q".format(n=len(values)), *values)
+
+
+def write(graph, path):
+    """
+    Writes a snapshot of graph to path, to be opened with GraphSnapshot. The file is written next to path and moved
+    in place once complete, processes opening path never see a partial snapshot.
+    :param graph: Graph
+    :param path:
+    :return: path
+    """
+    csr = graph.freeze_csr()
+    node_ids = [node_id.encode(DEFAULT_ENCODING) for node_id in csr.node_ids]
+
+    table_size = 1
+    while table_size < 2 * max(len(node_ids), 1):
+        table_size <<= 1
+    id_table = [EMPTY_SLOT] * table_size
+    for index, node_id in enumerate(csr.node_ids):
+        slot = _slot(node_id, table_size - 1)
+        while id_table[slot] != EMPTY_SLOT:
+            slot = (slot + 1) & (table_size - 1)
+        id_table[slot] = index
+
+    node_payloads = csr.node_payloads()
+    relationship_payloads = csr.relationship_payloads()
+    relationship_ends = []
+    for node_1, node_2 in zip(csr.relationship_node_1.tolist(), csr.relationship_node_2.tolist()):
+        relationship_ends.extend((node_1, node_2))
+
+    sections = {
+        "metadata": dumps({"namespace_root": graph.namespace_root,
+                           "relationship_types": csr.relationship_types}).encode(DEFAULT_ENCODING),
+        "node_ids": b"".join(node_ids),
+        "node_id_offsets": _integers(_offsets(node_ids)),
+        "id_table": _integers(id_table),
+        "node_offsets": _integers(_offsets(node_payloads)),
+        "node_payloads": b"".join(node_payloads),
+        "indptr": csr.indptr.astype("<i8").tobytes(),
+        "indices": csr.indices.astype("<i8").tobytes(),
+        "edge_relationships": csr.edge_relationships.astype("<i8").tobytes(),
+        "in_indptr": csr.in_indptr.astype("<i8").tobytes(),
+        "in_indices": csr.in_indices.astype("<i8").tobytes(),
+        "in_edge_relationships": csr.in_edge_relationships.astype("<i8").tobytes(),
+        "relationship_ends": _integers(relationship_ends),
+        "relationship_types": csr.relationship_type.astype("<i8").tobytes(),
+        "relationship_offsets": _integers(_offsets(relationship_payloads)),
+        "relationship_payloads": b"".join(relationship_payloads)
+    }
+
+    position = HEADER.size + SECTION.size * len(SECTIONS)
+    table = []
+    for name in SECTIONS:
+        position += -position % ALIGNMENT
+        table.append((position, len(sections[name])))
+        position += len(sections[name])
+
+    temporary_path = "{p}.{pid}.tmp".format(p=path, pid=os.getpid())
+    with open(temporary_path, "wb") as fp:
+        fp.write(HEADER.pack(MAGIC, len(SECTIONS)))
+        for offset, length in table:
+            fp.write(SECTION.pack(offset, length))
+        for name, (offset, _) in zip(SECTIONS, table):
+            fp.write(b"\x00" * (offset - fp.tell()))
+            fp.write(sections[name])
+    os.replace(temporary_path, path)
+    return path
+
+
+class GraphSnapshot(object):
+    """
+    Read only graph mapped from a file written by write: opening it only reads the header, the tables are read in
+    place from the mapping, shared with the other processes mapping the file, and nodes and relationships are decoded
+    on first access.
+    """
+
+    def __init__(self, path):
+        """
+
+        :param path: snapshot file
+        """
+        if sys.byteorder != "little":
+            raise SnapshotFormatException("Snapshots are mapped on little endian hosts only.")
+        self._path = path
+        with open(path, "rb") as fp:
+            self._mmap = mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ)
+        self._view = memoryview(self._mmap)
+
+        if len(self._view) < HEADER.size or bytes(self._view[:len(MAGIC)]) != MAGIC:
+            self.close()
+            raise SnapshotFormatException("{p} is not a graph snapshot.".format(p=path))
+        _, count = HEADER.unpack_from(self._view)
+        if count != len(SECTIONS):
+            self.close()
+            raise SnapshotFormatException("Unsupported snapshot layout in {p}.".format(p=path))
+
+        self._sections = {}
+        for position, name in enumerate(SECTIONS):
+            offset, length = SECTION.unpack_from(self._view, HEADER.size + position * SECTION.size)
+            section = self._view[offset:offset + length]
+            self._sections[name] = section.cast("q") if name in INTEGER_SECTIONS else section
+
+        metadata = loads(str(self._sections["metadata"], DEFAULT_ENCODING))
+        self._namespace_root = metadata["namespace_root"]
+        self._relationship_types = metadata["relationship_types"]
+        self._mask = len(self._sections["id_table"]) - 1
+        self._nodes = {}
+        self._relationships = {}
+
+    @property
+    def path(self):
+        return self._path
+
+    @property
+    def namespace_root(self):
+        return self._namespace_root
+
+    @property
+    def node_count(self):
+        return len(self._sections["node_offsets"]) - 1
+
+    @property
+    def relationship_count(self):
+        return len(self._sections["relationship_offsets"]) - 1
+
+    @property
+    def relationship_types(self):
+        return list(self._relationship_types)
+
+    def node_id(self, index):
+        offsets = self._sections["node_id_offsets"]
+        return str(self._sections["node_ids"][offsets[index]:offsets[index + 1]], DEFAULT_ENCODING)
+
+    def node_ids(self):
+        """
+        Ids of the nodes, in the order of the graph
+        :return: generator
+        """
+        return (self.node_id(index) for index in range(self.node_count))
+
+    def index_of(self, node):
+        """
+        Dense index of a node, looked up in the id table of the snapshot
+        :param node: node or node id
+        :return: index, None when the node is not in the snapshot
+        """
+        node_id = node.id if hasattr(node, "id") else node
+        id_table = self._sections["id_table"]
+        slot = _slot(node_id, self._mask)
+        while id_table[slot] != EMPTY_SLOT:
+            if self.node_id(id_table[slot]) == node_id:
+                return id_table[slot]
+            slot = (slot + 1) & self._mask
+        return None
+
+    def _index(self, node):
+        if isinstance(node, Integral):
+            # dense indexes as numpy returns them included
+            return int(node)
+        index = self.index_of(node)
+        if index is None:
+            raise KeyError(node.id if hasattr(node, "id") else node)
+        return index
+
+    def __contains__(self, node):
+        return self.index_of(node) is not None
+
+    def __len__(self):
+        return self.node_count
+
+    def node(self, node):
+        """
+        Node object, decoded on first access
+        :param node: dense index or node id
+        :return:
+        """
+        index = self._index(node)
+        decoded = self._nodes.get(index)
+        if decoded is None:
+            offsets = self._sections["node_offsets"]
+            decoded = binary.decode(self._sections["node_payloads"][offsets[index]:offsets[index + 1]])
+            self._nodes[index] = decoded
+        return decoded
+
+    def get(self, node_id, default=None):
+        index = self.index_of(node_id)
+        return self.node(index) if index is not None else default
+
+    def relationship(self, index):
+        """
+        Relationship object, decoded on first access along with its nodes
+        :param index: dense index of the relationship
+        :return:
+        """
+        decoded = self._relationships.get(index)
+        if decoded is None:
+            offsets = self._sections["relationship_offsets"]
+            ends = self._sections["relationship_ends"]
+            fields = binary.decode(self._sections["relationship_payloads"][offsets[index]:offsets[index + 1]])
+            fields["__node_1"] = self.node(ends[2 * index])
+            fields["__node_2"] = self.node(ends[2 * index + 1])
+            relationship_type = self._relationship_types[self._sections["relationship_types"][index]]
+            decoded = binary.relationship_from_fields(relationship_type, fields)
+            self._relationships[index] = decoded
+        return decoded
+
+    def adjacency(self, node, direction=None):
+        """
+        Adjacency of a node, see Graph.neighbors for direction
+        :param node: dense index or node id
+        :param direction:
+        :return: list of (neighbor index, relationship index), a relationship appearing once
+        """
+        index = self._index(node)
+        if direction == Direction.LEFT_TO_RIGHT:
+            prefixes = [""]
+        elif direction == Direction.RIGHT_TO_LEFT:
+            prefixes = ["in_"]
+        else:
+            prefixes = ["", "in_"]
+
+        adjacent = []
+        seen = set()
+        for prefix in prefixes:
+            indptr = self._sections[prefix + "indptr"]
+            indices = self._sections[prefix + "indices"]
+            edges = self._sections[prefix + "edge_relationships"]
+            for position in range(indptr[index], indptr[index + 1]):
+                # undirected relationships are both outgoing and incoming
+                if edges[position] not in seen:
+                    seen.add(edges[position])
+                    adjacent.append((indices[position], edges[position]))
+        return adjacent
+
+    def neighbors(self, node, direction=None):
+        """
+        Nodes linked to node, decoded on first access, see Graph.neighbors
+        :param node: dense index or node id
+        :param direction:
+        :return: list of nodes
+        """
+        neighbors = {}
+        for neighbor, _ in self.adjacency(node, direction=direction):
+            if neighbor not in neighbors:
+                neighbors[neighbor] = self.node(neighbor)
+        return list(neighbors.values())
+
+    def out_degree(self, node):
+        indptr = self._sections["indptr"]
+        index = self._index(node)
+        return indptr[index + 1] - indptr[index]
+
+    def in_degree(self, node):
+        indptr = self._sections["in_indptr"]
+        index = self._index(node)
+        return indptr[index + 1] - indptr[index]
+
+    def to_graph(self):
+        """
+        Graph holding every node and relationship of the snapshot
+        :return: Graph
+        """
+        graph = Graph(self._namespace_root)
+        for index in range(self.node_count):
+            graph.add_node(self.node(index))
+        graph.add_relationships(self.relationship(index) for index in range(self.relationship_count))
+        return graph
+
+    def close(self):
+        self._nodes = {}
+        self._relationships = {}
+        if getattr(self, "_sections", None) is not None:
+            for section in self._sections.values():
+                section.release()
+            self._sections = None
+        self._view.release()
+        self._mmap.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
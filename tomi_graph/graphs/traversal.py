@@ -0,0 +1,219 @@
+import heapq
+from collections import deque, namedtuple
+from itertools import count
+from numbers import Number
+
+# relationship is None for the start node
+TraversalStep = namedtuple("TraversalStep", ["node", "relationship", "depth"])
+
+
+def relationship_filter(rel_type=None, data=None, predicate=None):
+    """
+    Relationships a traversal may follow
+    :param rel_type: name or class of a relationship type, or a list of them, None for any type
+    :param data: dict of values the relationship data must hold
+    :param predicate: callable taking the relationship, followed when it returns True
+    :return: callable taking a relationship, None when every relationship is followed
+    """
+    if rel_type is None and data is None and predicate is None:
+        return None
+    rel_types = None
+    if rel_type is not None:
+        rel_types = {t.__name__ if issubclass(type(t), type) else t for t in
+                     (rel_type if type(rel_type) in (list, tuple, set) else [rel_type])}
+
+    def accept(relationship):
+        if rel_types is not None and type(relationship).__name__ not in rel_types:
+            return False
+        if data is not None:
+            # read only access, copy on write data must not be copied by a traversal
+            relationship_data = relationship.__dict__.get("_data") or {}
+            if not all(k in relationship_data and relationship_data[k] == v for k, v in data.items()):
+                return False
+        return predicate is None or predicate(relationship)
+
+    return accept
+
+
+def _expand(graph, node_id, direction, accept):
+    with graph.lock:
+        return [(relationship, neighbor_id) for relationship, neighbor_id in
+                graph._adjacent(node_id, direction=direction)
+                if neighbor_id in graph._nodes and (accept is None or accept(relationship))]
+
+
+def _start(graph, node):
+    node_id = graph._node_id(node)
+    start = graph._nodes.get(node_id)
+    if start is None:
+        raise KeyError("Node {i} is not in the graph.".format(i=node_id))
+    return start
+
+
+def _breadth_first(graph, start, direction, accept, max_depth, max_visits):
+    # (step, id of the node step was reached from)
+    node = _start(graph, start)
+    visited = {node.id}
+    queue = deque([(TraversalStep(node, None, 0), None)])
+    visits = 0
+    while len(queue) > 0 and (max_visits is None or visits < max_visits):
+        step, parent_id = queue.popleft()
+        yield step, parent_id
+        visits += 1
+        if max_depth is not None and step.depth >= max_depth:
+            continue
+        for relationship, neighbor_id in _expand(graph, step.node.id, direction, accept):
+            if neighbor_id not in visited:
+                visited.add(neighbor_id)
+                queue.append((TraversalStep(graph._nodes[neighbor_id], relationship, step.depth + 1), step.node.id))
+
+
+def bfs(graph, start, direction=None, rel_type=None, data=None, predicate=None, max_depth=None, max_visits=None):
+    """
+    Breadth first traversal, each node reached once through the first relationship leading to it
+    :param graph: Graph
+    :param start: node or node id
+    :param direction: Direction.LEFT_TO_RIGHT to follow outgoing relationships, Direction.RIGHT_TO_LEFT incoming ones,
+        both otherwise (see Graph.neighbors)
+    :param rel_type: see relationship_filter
+    :param data: see relationship_filter
+    :param predicate: see relationship_filter
+    :param max_depth: nodes further than max_depth relationships from start are not reached
+    :param max_visits: stops after max_visits nodes
+    :return: generator of TraversalStep
+    """
+    accept = relationship_filter(rel_type=rel_type, data=data, predicate=predicate)
+    for step, _ in _breadth_first(graph, start, direction, accept, max_depth, max_visits):
+        yield step
+
+
+def dfs(graph, start, direction=None, rel_type=None, data=None, predicate=None, max_depth=None, max_visits=None):
+    """
+    Depth first traversal in preorder, see bfs for the arguments
+    :return: generator of TraversalStep
+    """
+    accept = relationship_filter(rel_type=rel_type, data=data, predicate=predicate)
+    stack = [TraversalStep(_start(graph, start), None, 0)]
+    visited = set()
+    visits = 0
+    while len(stack) > 0 and (max_visits is None or visits < max_visits):
+        step = stack.pop()
+        if step.node.id in visited:
+            continue
+        visited.add(step.node.id)
+        yield step
+        visits += 1
+        if max_depth is not None and step.depth >= max_depth:
+            continue
+        # reversed so that the relationships are followed in their adjacency order
+        for relationship, neighbor_id in reversed(_expand(graph, step.node.id, direction, accept)):
+            if neighbor_id not in visited:
+                stack.append(TraversalStep(graph._nodes[neighbor_id], relationship, step.depth + 1))
+
+
+def _path(parents, target_id):
+    path = []
+    node_id = target_id
+    while node_id is not None:
+        step, node_id = parents[node_id]
+        path.append(step)
+    path.reverse()
+    return path
+
+
+def shortest_path(graph, source, target, direction=None, rel_type=None, data=None, predicate=None, max_depth=None,
+                  max_visits=None):
+    """
+    Path with the fewest relationships from source to target, see bfs for the other arguments
+    :param graph: Graph
+    :param source: node or node id
+    :param target: node or node id
+    :return: list of TraversalStep from source to target, None when target is not reached
+    """
+    accept = relationship_filter(rel_type=rel_type, data=data, predicate=predicate)
+    target_id = graph._node_id(target)
+    parents = {}
+    for step, parent_id in _breadth_first(graph, source, direction, accept, max_depth, max_visits):
+        parents[step.node.id] = (step, parent_id)
+        if step.node.id == target_id:
+            return _path(parents, target_id)
+    return None
+
+
+def _weight_function(weight, default_weight):
+    if callable(weight):
+        return weight
+
+    def relationship_weight(relationship):
+        relationship_data = relationship.__dict__.get("_data") or {}
+        return relationship_data.get(weight, default_weight) if hasattr(relationship_data, "get") else default_weight
+
+    return relationship_weight
+
+
+def _cheapest_first(graph, source, direction, accept, weight, max_cost, max_visits):
+    # (step, cost, id of the node step was reached from), by increasing cost
+    node = _start(graph, source)
+    costs = {node.id: 0}
+    settled = set()
+    tie = count()
+    heap = [(0, next(tie), TraversalStep(node, None, 0), None)]
+    visits = 0
+    while len(heap) > 0 and (max_visits is None or visits < max_visits):
+        cost, _, step, parent_id = heapq.heappop(heap)
+        if step.node.id in settled:
+            continue
+        settled.add(step.node.id)
+        yield step, cost, parent_id
+        visits += 1
+        for relationship, neighbor_id in _expand(graph, step.node.id, direction, accept):
+            if neighbor_id in settled:
+                continue
+            w = weight(relationship)
+            if not isinstance(w, Number) or w < 0:
+                raise ValueError("Relationship {i} has an invalid weight {w}.".format(i=relationship.id, w=repr(w)))
+            neighbor_cost = cost + w
+            known = costs.get(neighbor_id)
+            if (max_cost is None or neighbor_cost <= max_cost) and (known is None or neighbor_cost < known):
+                costs[neighbor_id] = neighbor_cost
+                heapq.heappush(heap, (neighbor_cost, next(tie),
+                                      TraversalStep(graph._nodes[neighbor_id], relationship, step.depth + 1),
+                                      step.node.id))
+
+
+def dijkstra(graph, source, direction=None, weight="weight", default_weight=1, rel_type=None, data=None,
+             predicate=None, max_cost=None, max_visits=None):
+    """
+    Nodes by increasing weighted distance from source (Dijkstra), see bfs for the other arguments
+    :param graph: Graph
+    :param source: node or node id
+    :param weight: key of the relationship data holding the weight, or callable taking the relationship, weights must
+        be positive numbers
+    :param default_weight: weight of the relationships without data under weight
+    :param max_cost: nodes further than max_cost are not reached
+    :return: generator of (TraversalStep, distance)
+    """
+    accept = relationship_filter(rel_type=rel_type, data=data, predicate=predicate)
+    for step, cost, _ in _cheapest_first(graph, source, direction, accept, _weight_function(weight, default_weight),
+                                         max_cost, max_visits):
+        yield step, cost
+
+
+def weighted_shortest_path(graph, source, target, direction=None, weight="weight", default_weight=1, rel_type=None,
+                           data=None, predicate=None, max_cost=None, max_visits=None):
+    """
+    Path of least weight from source to target, see dijkstra for the arguments
+    :param graph: Graph
+    :param source: node or node id
+    :param target: node or node id
+    :return: (distance, list of TraversalStep from source to target), None when target is not reached
+    """
+    accept = relationship_filter(rel_type=rel_type, data=data, predicate=predicate)
+    target_id = graph._node_id(target)
+    parents = {}
+    for step, cost, parent_id in _cheapest_first(graph, source, direction, accept,
+                                                 _weight_function(weight, default_weight), max_cost, max_visits):
+        parents[step.node.id] = (step, parent_id)
+        if step.node.id == target_id:
+            return cost, _path(parents, target_id)
+    return None
@@ -0,0 +1,53 @@
+class HashIndex(object):
+    """
+    Hash index of entity ids by key, the ids of a key are kept in insertion order
+    """
+
+    def __init__(self, name):
+        self._name = name
+        self._entries = {}
+
+    @property
+    def name(self):
+        return self._name
+
+    @staticmethod
+    def key(value):
+        # unhashable values are indexed by their string representation
+        try:
+            hash(value)
+            return value
+        except TypeError:
+            return str(value)
+
+    def add(self, key, entity_id):
+        self._entries.setdefault(HashIndex.key(key), {})[entity_id] = None
+
+    def remove(self, key, entity_id):
+        key = HashIndex.key(key)
+        entries = self._entries.get(key)
+        if entries is not None:
+            entries.pop(entity_id, None)
+            if len(entries) == 0:
+                del self._entries[key]
+
+    def get(self, key):
+        """
+        Ids of the entities indexed under key
+        :param key:
+        :return: ordered mapping of ids (values are meaningless), not to be modified and to be read under the lock of
+            the graph holding the index
+        """
+        return self._entries.get(HashIndex.key(key), {})
+
+    def keys(self):
+        return self._entries.keys()
+
+    def clear(self):
+        self._entries.clear()
+
+    def __contains__(self, key):
+        return HashIndex.key(key) in self._entries
+
+    def __len__(self):
+        return len(self._entries)
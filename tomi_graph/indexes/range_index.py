@@ -0,0 +1,64 @@
+from bisect import bisect_left, bisect_right
+
+
+class RangeIndex(object):
+    """
+    Ordered index of entity ids by value, range lookups cost O(log n + k). Entries are kept sorted by (value, id) in
+    two parallel lists: the keys locate an entry to remove it, the values are bisected by the range lookups.
+    """
+
+    def __init__(self, name):
+        self._name = name
+        self._keys = []
+        self._values = []
+
+    @property
+    def name(self):
+        return self._name
+
+    def add(self, value, entity_id):
+        key = (value, entity_id)
+        index = bisect_left(self._keys, key)
+        if index < len(self._keys) and self._keys[index] == key:
+            return
+        self._keys.insert(index, key)
+        self._values.insert(index, value)
+
+    def remove(self, value, entity_id):
+        key = (value, entity_id)
+        index = bisect_left(self._keys, key)
+        if index < len(self._keys) and self._keys[index] == key:
+            del self._keys[index]
+            del self._values[index]
+
+    def range(self, low=None, high=None, include_low=True, include_high=True, reverse=False):
+        """
+        Ids of the entities whose value lies between low and high
+        :param low: lower bound, None for no bound
+        :param high: upper bound, None for no bound
+        :param include_low:
+        :param include_high:
+        :param reverse: by decreasing values
+        :return: generator of ids, ordered by value
+        """
+        if low is None:
+            start = 0
+        else:
+            start = bisect_left(self._values, low) if include_low else bisect_right(self._values, low)
+        if high is None:
+            stop = len(self._values)
+        else:
+            stop = bisect_right(self._values, high) if include_high else bisect_left(self._values, high)
+
+        keys = self._keys
+        positions = range(stop - 1, start - 1, -1) if reverse else range(start, stop)
+        for position in positions:
+            if position < len(keys):
+                yield keys[position][1]
+
+    def clear(self):
+        self._keys = []
+        self._values = []
+
+    def __len__(self):
+        return len(self._keys)
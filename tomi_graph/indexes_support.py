@@ -4,12 +4,18 @@ from collections.abc import MutableSequence
 
 class IndexesSupport(ABC):
     INDEXES_CLASS_METHOD = "get_type_indexes"
+    # functions compiled for a class by EntityClassGenerator, see EntityClassGenerator.compile_index_extractors
+    UNIQUE_INDEX_EXTRACTOR = "unique_index_extractor"
+    INDEXES_EXTRACTOR = "indexes_extractor"
+    # instance attribute caching the indexes, for classes listing it in their TRANSIENT_FIELDS and dropping it when
+    # any other attribute is set
+    INDEXES_CACHE = "_indexes_cache"
     NULL_INDEX_VALUE = "null"
     UNIQUE_CONSTRAINT_PREFIX = "UQ"
 
     @classmethod
     def get_type_indexes(cls):
-        pass
+        return {}
 
     @staticmethod
     def get_unique_constraint_name(entity_type):
@@ -37,6 +43,19 @@ class IndexesSupport(ABC):
 
     @property
     def indexes(self):
+        cached = self.__dict__.get(IndexesSupport.INDEXES_CACHE)
+        if cached is not None:
+            return dict(cached)
+
+        extractor = getattr(type(self), IndexesSupport.INDEXES_EXTRACTOR, None)
+        entity_indexes = extractor(self) if extractor is not None else self._compute_indexes()
+
+        if IndexesSupport.INDEXES_CACHE in getattr(type(self), "TRANSIENT_FIELDS", ()):
+            object.__setattr__(self, IndexesSupport.INDEXES_CACHE, entity_indexes)
+            return dict(entity_indexes)
+        return entity_indexes
+
+    def _compute_indexes(self):
         def get_index_value(field):
             value = getattr(self, field, None)
             return str(value) if value is not None else IndexesSupport.NULL_INDEX_VALUE
@@ -45,12 +64,12 @@ class IndexesSupport(ABC):
 
         get_type_indexes = getattr(type(self), IndexesSupport.INDEXES_CLASS_METHOD, None)
         if get_type_indexes is not None and callable(get_type_indexes):
-            if len(get_type_indexes()) > 0:
-                for idx, fields in get_type_indexes().items():
-                    try:
-                        if issubclass(type(fields), MutableSequence):
-                            entity_indexes[idx] = ":".join([get_index_value(field) for field in fields])
-                    except (AttributeError, TypeError):
-                        continue
+            # a type without index definition has no index besides its unique constraint
+            for idx, fields in (get_type_indexes() or {}).items():
+                try:
+                    if issubclass(type(fields), MutableSequence):
+                        entity_indexes[idx] = ":".join([get_index_value(field) for field in fields])
+                except (AttributeError, TypeError):
+                    continue
 
         return entity_indexes
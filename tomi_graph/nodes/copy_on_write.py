@@ -0,0 +1,197 @@
+from copy import deepcopy
+
+from tomi_graph.nodes.core.node import CoreNodeClass
+
+# attribute of the nodes cloned into copy on write containers, holding the owner they were cloned for
+EMBEDDER = "_cow_embedder"
+
+
+class Owner(object):
+    """
+    Ownership token of the data of an entity, given to an entity and its clone when it is cloned: the containers and
+    the nodes embedded in their data are shared between them until either of them reaches them through its data.
+    """
+    __slots__ = ("shared",)
+
+    def __init__(self, shared=False):
+        self.shared = shared
+
+
+def own(value, owner):
+    """
+    Makes value private to owner: a dict or a list owned by someone else (or by nobody) is shallow copied into a
+    copy on write container, nested containers are left shared until they are reached in turn. A node shared with
+    other versions is cloned.
+    :param value: any value
+    :param owner: Owner
+    :return: value itself or its copy on write counterpart
+    """
+    if issubclass(type(value), (CopyOnWriteDict, CopyOnWriteList)) and value.owner is owner:
+        return value
+    if issubclass(type(value), dict):
+        return CopyOnWriteDict(value, owner)
+    if issubclass(type(value), list):
+        return CopyOnWriteList(value, owner)
+    if owner.shared and issubclass(type(value), CoreNodeClass) and value.__dict__.get(EMBEDDER) is not owner:
+        return value.embedded_copy(owner)
+    return value
+
+
+# values detach() shares as they are without looking further
+_ATOMIC_TYPES = frozenset((str, int, float, bool, bytes, type(None)))
+
+
+def _handed_out(value, handed_out):
+    if issubclass(type(value), (CopyOnWriteDict, CopyOnWriteList)):
+        return value.owner is handed_out
+    if issubclass(type(value), CoreNodeClass):
+        return handed_out is None or value.__dict__.get(EMBEDDER) is handed_out
+    # an entity never cloned hands out its data as it is
+    return handed_out is None and issubclass(type(value), (dict, list))
+
+
+def detach(value, handed_out, owner):
+    """
+    Data of a clone of an entity which handed out its data: the containers it handed out may still be mutated in place
+    by the code holding them, they are copied for the clone along with the nodes they hold. The other containers stay
+    shared and are copied on access.
+    :param value: data of the entity
+    :param handed_out: owner of the entity, None when it handed out its data as it is
+    :param owner: owner of the clone
+    :return: value itself or its copy
+    """
+    if not _handed_out(value, handed_out):
+        return value
+    if issubclass(type(value), CoreNodeClass):
+        return value.embedded_copy(owner)
+    if issubclass(type(value), dict):
+        detached = CopyOnWriteDict(value, owner)
+        for key, item in dict.items(value):
+            if type(item) in _ATOMIC_TYPES:
+                continue
+            if issubclass(type(item), CoreNodeClass):
+                dict.__setitem__(detached, key, item.embedded_copy(owner))
+            elif _handed_out(item, handed_out):
+                dict.__setitem__(detached, key, detach(item, handed_out, owner))
+    else:
+        detached = CopyOnWriteList(value, owner)
+        for index, item in enumerate(list.__iter__(value)):
+            if type(item) in _ATOMIC_TYPES:
+                continue
+            if issubclass(type(item), CoreNodeClass):
+                list.__setitem__(detached, index, item.embedded_copy(owner))
+            elif _handed_out(item, handed_out):
+                list.__setitem__(detached, index, detach(item, handed_out, owner))
+    return detached
+
+
+class CopyOnWriteDict(dict):
+    """
+    Shallow copy of a dict shared between versions of an entity. Values reached through the mapping API are made
+    private before being returned, so mutating them never affects the other versions. Read only walks should use
+    the dict methods (dict.items(d)...) which do not copy anything.
+    """
+    __slots__ = ("owner",)
+
+    def __init__(self, value, owner):
+        super().__init__(value)
+        self.owner = owner
+
+    def _owned(self, key):
+        value = dict.__getitem__(self, key)
+        owned = own(value, self.owner)
+        if owned is not value:
+            dict.__setitem__(self, key, owned)
+        return owned
+
+    def __getitem__(self, key):
+        return self._owned(key)
+
+    def get(self, key, default=None):
+        return self._owned(key) if key in self else default
+
+    def setdefault(self, key, default=None):
+        if key in self:
+            return self._owned(key)
+        dict.__setitem__(self, key, default)
+        return default
+
+    def values(self):
+        return [self._owned(k) for k in self]
+
+    def items(self):
+        return [(k, self._owned(k)) for k in self]
+
+    def pop(self, key, *default):
+        return own(dict.pop(self, key, *default), self.owner)
+
+    def popitem(self):
+        key, value = dict.popitem(self)
+        return key, own(value, self.owner)
+
+    def copy(self):
+        # the copy shares nothing with this container: all its values are treated as shared
+        return CopyOnWriteDict(self, Owner())
+
+    def __copy__(self):
+        return self.copy()
+
+    def __deepcopy__(self, memo):
+        copied = {}
+        memo[id(self)] = copied
+        for k, v in dict.items(self):
+            copied[deepcopy(k, memo)] = deepcopy(v, memo)
+        return copied
+
+    def __reduce__(self):
+        return dict, (dict(dict.items(self)),)
+
+
+class CopyOnWriteList(list):
+    """
+    Shallow copy of a list shared between versions of an entity, see CopyOnWriteDict.
+    """
+    __slots__ = ("owner",)
+
+    def __init__(self, value, owner):
+        super().__init__(list.__iter__(value))
+        self.owner = owner
+
+    def _owned(self, index):
+        value = list.__getitem__(self, index)
+        owned = own(value, self.owner)
+        if owned is not value:
+            list.__setitem__(self, index, owned)
+        return owned
+
+    def __getitem__(self, index):
+        if type(index) == slice:
+            return [self._owned(i) for i in range(*index.indices(len(self)))]
+        return self._owned(index)
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self._owned(i)
+
+    def __reversed__(self):
+        for i in reversed(range(len(self))):
+            yield self._owned(i)
+
+    def pop(self, index=-1):
+        return own(list.pop(self, index), self.owner)
+
+    def copy(self):
+        return CopyOnWriteList(self, Owner())
+
+    def __copy__(self):
+        return self.copy()
+
+    def __deepcopy__(self, memo):
+        copied = []
+        memo[id(self)] = copied
+        for v in list.__iter__(self):
+            copied.append(deepcopy(v, memo))
+        return copied
+
+    def __reduce__(self):
+        return list, (list(list.__iter__(self)),)
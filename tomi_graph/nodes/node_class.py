@@ -1,14 +1,19 @@
+import base64
+import hashlib
+import os
+import threading
 import uuid
 import warnings
-from collections.abc import MutableSequence
-from copy import deepcopy
+import weakref
+from collections.abc import MutableSequence, Mapping
+from contextlib import contextmanager
+from copy import copy, deepcopy
 from datetime import datetime
 from decimal import Decimal, InvalidOperation
 from io import TextIOBase
 from ujson import loads, load, dumps
 
 import chardet
-from objectpath import Tree
 from py._path.local import LocalPath
 from tomi_base.collections import get_defaults, flatten
 from tomi_base.shared.logging.auto.logging import auto_log
@@ -17,7 +22,8 @@ from tomi_graph.entity_class_generator import EntityClassGenerator
 from tomi_graph.graphs.graph import Graph
 from tomi_graph.graphs.node_data_graph import NodeDataGraph
 from tomi_graph.indexes_support import IndexesSupport
-from tomi_graph.nodes.core import BUILT_INS, DEFAULT_ENCODING
+from tomi_graph.nodes.core import DEFAULT_ENCODING
+from tomi_graph.nodes.copy_on_write import EMBEDDER, Owner, detach, own
 from tomi_graph.nodes.core.node import CoreNodeClass
 from tomi_graph.nodes.exceptions import CoreDocumentException, EncodingWarning, CircularReferenceWarning
 from tomi_graph.operators import GraphOperationDirection, GraphOperation
@@ -25,13 +31,27 @@ from tomi_graph.operators.operator_resolver import OperatorsResolver
 from tomi_graph.relationships.core.direction import Direction
 from tomi_graph.relationships.relationship_class import Relationship
 from tomi_graph.version_aware_entity import VersionAwareEntity
+from tomi_graph.watched_entity import WatchedEntity
 
+_load_context = threading.local()
 
-class NodeBaseClass(OperatorsResolver, CoreNodeClass, IndexesSupport):
+
+class NodeBaseClass(OperatorsResolver, CoreNodeClass, IndexesSupport, WatchedEntity):
     FIELD_SERIALIZATION_PREFIX = "__"
 
     CORE_FIELDS = ["encoding", "id", "key", "data", "name", "version", "create_date", "update_date", "ttl"]
 
+    # attributes holding derived state, writing them does not change the node content
+    TRANSIENT_FIELDS = ("_fingerprint", "_parents", "_cow_owner", "_handed_out", EMBEDDER, "_version_store",
+                        "_graph", "_new", "_watchers", IndexesSupport.INDEXES_CACHE)
+
+    # node options: keep bytes payloads undecoded, bound the prefix sampled when detecting an encoding
+    KEEP_BYTES_OPTION = "keep_bytes"
+    ENCODING_SAMPLE_SIZE_OPTION = "encoding_sample_size"
+
+    # default prefix size sampled for encoding detection, None samples the whole payload
+    ENCODING_SAMPLE_SIZE = None
+
     @staticmethod
     def serialize(name):
         return NodeBaseClass.FIELD_SERIALIZATION_PREFIX + name
@@ -100,7 +120,26 @@ class NodeBaseClass(OperatorsResolver, CoreNodeClass, IndexesSupport):
     def options(self):
         return self._options
 
+    def get_option(self, name, default=None):
+        return self._options.get(name, default) if isinstance(self._options, Mapping) else default
+
     def get_data(self):
+        owner = self.__dict__.get("_cow_owner")
+        if owner is None:
+            # never cloned: the data is handed out as it is, clone() copies what may still be mutated through it
+            object.__setattr__(self, "_handed_out", True)
+            return self._inner_data
+        # containers shared with other versions of this node are copied on access
+        data = own(self._inner_data, owner)
+        if data is not self._inner_data:
+            object.__setattr__(self, "_inner_data", data)
+        return data
+
+    def peek_data(self):
+        """
+        Data as stored, possibly shared with other versions of this node: for read only walks, must not be mutated
+        :return:
+        """
         return self._inner_data
 
     @property
@@ -111,6 +150,61 @@ class NodeBaseClass(OperatorsResolver, CoreNodeClass, IndexesSupport):
     def update_date(self):
         return self._update_date
 
+    @property
+    def fingerprint(self):
+        """
+        Merkle digest of the node: its own fields plus the fingerprints of the nodes embedded in its data.
+        The digest is cached until one of the node fields is assigned, which also clears the cached digests of
+        the nodes embedding it, so only the ancestors of a changed node are recomputed.
+        In place mutations of the data returned by get_data() are not tracked, call set_data() instead.
+        :return: hex digest
+        """
+        fingerprint = self.__dict__.get("_fingerprint")
+        if fingerprint is None:
+            fingerprint = self._compute_fingerprint()
+            object.__setattr__(self, "_fingerprint", fingerprint)
+        return fingerprint
+
+    def _compute_fingerprint(self):
+        def digest(o):
+            if issubclass(type(o), NodeBaseClass):
+                o._add_parent(self)
+                return {NodeBaseClass.serialize("type"): type(o).__name__,
+                        NodeBaseClass.serialize("fingerprint"): o.fingerprint}
+            if issubclass(type(o), dict):
+                return {k: digest(v) for k, v in dict.items(o)}
+            if issubclass(type(o), (list, tuple)):
+                return [digest(v) for v in o]
+            if type(o) in (bytes, bytearray):
+                return {NodeBaseClass.serialize("bytes"): hashlib.sha1(o).hexdigest()}
+            return o
+
+        object_value = self.serialized_fields()
+        object_value[NodeBaseClass.serialize("data")] = digest(self.peek_data())
+
+        return hashlib.sha1(CoreNodeClass.serialize_to_string({
+            NodeBaseClass.serialize("type"): type(self).__name__,
+            NodeBaseClass.serialize("object"): object_value
+        }).encode(DEFAULT_ENCODING)).hexdigest()
+
+    def _add_parent(self, parent):
+        parents = self.__dict__.get("_parents")
+        if parents is None:
+            parents = {}
+            object.__setattr__(self, "_parents", parents)
+        parents[id(parent)] = weakref.ref(parent)
+
+    def _invalidate_fingerprint(self):
+        pending = [self]
+        while len(pending) > 0:
+            node = pending.pop()
+            object.__setattr__(node, "_fingerprint", None)
+            for ref in list(node.__dict__.get("_parents", {}).values()):
+                parent = ref()
+                # a parent without cached digest has already been invalidated along with its own ancestors
+                if parent is not None and parent.__dict__.get("_fingerprint") is not None:
+                    pending.append(parent)
+
     @property
     def graph(self):
         if self._graph is None:
@@ -123,11 +217,14 @@ class NodeBaseClass(OperatorsResolver, CoreNodeClass, IndexesSupport):
 
     @property
     def unique_index(self):
+        extractor = getattr(type(self), IndexesSupport.UNIQUE_INDEX_EXTRACTOR, None)
+        if extractor is not None:
+            return extractor(self)
         return NodeBaseClass.create_unique_index(self, self.get_unique_constraint_fields())
 
     @property
     def indexes_definitions(self):
-        indexes_def = type(self).get_type_indexes()
+        indexes_def = type(self).get_type_indexes() or {}
         indexes_def[IndexesSupport.get_unique_constraint_name(type(self))] = self.get_unique_constraint_fields()
         return indexes_def
 
@@ -150,39 +247,136 @@ class NodeBaseClass(OperatorsResolver, CoreNodeClass, IndexesSupport):
 
         return dictionary
 
+    def serialized_fields(self):
+        """
+        Serialized node fields, data excluded
+        :return:
+        """
+        fields = {
+            NodeBaseClass.serialize("id"): self.id,
+            NodeBaseClass.serialize(type(self).unique_constraint_name()): self.unique_index,
+            NodeBaseClass.serialize("version"): self.version,
+            NodeBaseClass.serialize("name"): self.name,
+            NodeBaseClass.serialize("key"): str(self.key) if self.key is not None else None,
+            NodeBaseClass.serialize("encoding"): self.encoding,
+            NodeBaseClass.serialize("create_date"): self.create_date,
+            NodeBaseClass.serialize("update_date"): self.update_date,
+            NodeBaseClass.serialize("ttl"): self.ttl,
+        }
+        for name in getattr(type(self), "additional_fields", []):
+            fields[name] = getattr(self, name, None)
+
+        return fields
+
     def to_graph(self):
         return self.graph
 
     @auto_log()
     def set_data(self, data):
-        if type(data) == str or type(data) == bytes:
-            if type(data) == bytes:
-                encoding = chardet.detect(data)["encoding"]
-                if chardet.detect(data)["encoding"].lower() != self._encoding.lower():
-                    warnings.warn(
-                        EncodingWarning("Detected encoding {d} is different from node encoding {e}.".format(
-                            d=encoding, e=self._encoding)))
-                    self._encoding = encoding.lower()
-                    data = data.decode(encoding)
-                else:
-                    data = data.decode(self._encoding)
-            self._inner_data = data
-        elif type(data) in BUILT_INS and type(data) != tuple:
-            self._inner_data = data
-        elif type(data) == tuple:
-            self._inner_data = list(data)
-        elif type(data) == TextIOBase or type(data) == LocalPath:
+        self._inner_data = self._stored_data(data)
+
+        if not NodeBaseClass.is_trusted_load() and NodeBaseClass.find_circular_reference(self) is not None:
+            warnings.warn(CircularReferenceWarning("Circular reference detected."))
+
+    def _stored_data(self, data):
+        """
+        Data as the node stores it: bytes decoded, tuples as lists and files loaded
+        :param data:
+        :return:
+        """
+        if type(data) == bytes and not self.get_option(NodeBaseClass.KEEP_BYTES_OPTION, False):
+            return self._decode(data)
+        if type(data) == tuple:
+            return list(data)
+        if type(data) == TextIOBase or type(data) == LocalPath:
             try:
-                self._inner_data = load(data)
+                return load(data)
             except Exception as ex:
                 raise CoreDocumentException(ex)
-        else:
-            self._inner_data = data
+        return data
 
+    def _decode(self, data):
+        """
+        Decodes with the node encoding first, the encoding is only detected when that fails
+        :param data: bytes
+        :return: str
+        """
         try:
-            _ = str(self)
-        except RecursionError:
-            warnings.warn(CircularReferenceWarning("Circular reference detected."))
+            return data.decode(self._encoding)
+        except (UnicodeDecodeError, LookupError):
+            pass
+
+        sample_size = self.get_option(NodeBaseClass.ENCODING_SAMPLE_SIZE_OPTION, NodeBaseClass.ENCODING_SAMPLE_SIZE)
+        encoding = chardet.detect(data if sample_size is None else data[:sample_size])["encoding"]
+        if encoding is None:
+            raise CoreDocumentException("Unable to detect the encoding of the bytes payload.")
+
+        if encoding.lower() != self._encoding.lower():
+            warnings.warn(
+                EncodingWarning("Detected encoding {d} is different from node encoding {e}.".format(
+                    d=encoding, e=self._encoding)))
+            self._encoding = encoding.lower()
+        try:
+            return data.decode(encoding)
+        except UnicodeDecodeError as ex:
+            raise CoreDocumentException(ex)
+
+    @staticmethod
+    @contextmanager
+    def trusted_load():
+        """
+        Within this context (and thread) set_data skips the circular reference check, for bulk loads of trusted data
+        """
+        trusted = NodeBaseClass.is_trusted_load()
+        _load_context.trusted = True
+        try:
+            yield
+        finally:
+            _load_context.trusted = trusted
+
+    @staticmethod
+    def is_trusted_load():
+        return getattr(_load_context, "trusted", False)
+
+    @staticmethod
+    def find_circular_reference(o):
+        """
+        Iterative depth first walk of containers and embedded nodes, every object is visited once.
+        :param o: value to inspect
+        :return: the first object found to be reachable from itself, None if there is no cycle
+        """
+
+        def members(v):
+            if issubclass(type(v), NodeBaseClass):
+                return v.peek_data(),
+            if issubclass(type(v), CoreNodeClass):
+                return v.get_data(),
+            if issubclass(type(v), dict):
+                return dict.values(v)
+            if issubclass(type(v), (list, tuple, set, frozenset)):
+                return v
+            return None
+
+        on_path = set()
+        visited = set()
+        stack = [(o, False)]
+        while len(stack) > 0:
+            value, leaving = stack.pop()
+            if leaving:
+                on_path.discard(id(value))
+                continue
+            values = members(value)
+            if values is None:
+                continue
+            if id(value) in on_path:
+                return value
+            if id(value) in visited:
+                continue
+            visited.add(id(value))
+            on_path.add(id(value))
+            stack.append((value, True))
+            stack.extend((v, False) for v in values)
+        return None
 
     def bypass_update_date(self):
         """
@@ -233,29 +427,57 @@ class NodeBaseClass(OperatorsResolver, CoreNodeClass, IndexesSupport):
     def __str__(self):
         return CoreNodeClass.serialize_to_string(self.toDict())
 
+    def __setattr__(self, name, value):
+        missing = name not in self.__dict__
+        previous = self.__dict__.get(name)
+        super().__setattr__(name, value)
+        if name not in NodeBaseClass.TRANSIENT_FIELDS:
+            self._changed(name)
+            try:
+                self._notify_watchers(name)
+            except Exception:
+                # a watcher refused the change (a graph enforcing a unique constraint): the node and the watchers
+                # which took the change get the previous value back
+                if missing:
+                    self.__dict__.pop(name, None)
+                else:
+                    object.__setattr__(self, name, previous)
+                self._changed(name)
+                self._notify_watchers(name)
+                raise
+
+    def _changed(self, name):
+        self._invalidate_fingerprint()
+        self.__dict__.pop(IndexesSupport.INDEXES_CACHE, None)
+
+    def __getstate__(self):
+        # copies are not registered with the parents of the original and must recompute their digest
+        state = dict(self.__dict__)
+        state.pop("_parents", None)
+        state.pop("_cow_owner", None)
+        state.pop("_handed_out", None)
+        state.pop(EMBEDDER, None)
+        # copies are detached from the lineage of the original, new_version() attaches its clone explicitly
+        state.pop("_version_store", None)
+        # graphs watch the nodes they hold, not their copies
+        state.pop("_watchers", None)
+        state.pop(IndexesSupport.INDEXES_CACHE, None)
+        state["_fingerprint"] = None
+        return state
+
     def __eq__(self, other):
+        if issubclass(type(other), NodeBaseClass):
+            return self.fingerprint == other.fingerprint
         return str(self) == str(other)
 
     def __hash__(self):
-        return hash(str(self))
+        return hash(self.fingerprint)
 
     @staticmethod
     def to_dict(o):
         def dict_format(d):
-            object_value = {
-                NodeBaseClass.serialize("id"): d.id,
-                NodeBaseClass.serialize(type(d).unique_constraint_name()): d.unique_index,
-                NodeBaseClass.serialize("version"): d.version,
-                NodeBaseClass.serialize("name"): d.name,
-                NodeBaseClass.serialize("key"): str(d.key) if d.key is not None else None,
-                NodeBaseClass.serialize("encoding"): d.encoding,
-                NodeBaseClass.serialize("create_date"): d.create_date,
-                NodeBaseClass.serialize("update_date"): d.update_date,
-                NodeBaseClass.serialize("ttl"): d.ttl,
-                NodeBaseClass.serialize("data"): NodeBaseClass.to_dict(d.get_data()),
-            }
-            for name in getattr(type(o), "additional_fields", []):
-                object_value[name] = getattr(o, name, None)
+            object_value = d.serialized_fields()
+            object_value[NodeBaseClass.serialize("data")] = NodeBaseClass.to_dict(d.get_data())
 
             return {
                 NodeBaseClass.serialize("type"): type(d).__name__,
@@ -264,6 +486,8 @@ class NodeBaseClass(OperatorsResolver, CoreNodeClass, IndexesSupport):
 
         if type(o) == str:
             return o
+        if type(o) in (bytes, bytearray):
+            return NodeBaseClass.serialize_bytes(o)
         try:
             iter(o)
             if issubclass(type(o), dict) or type(o) == dict:
@@ -285,22 +509,65 @@ class NodeBaseClass(OperatorsResolver, CoreNodeClass, IndexesSupport):
             else:
                 return o
 
-    def children(self):
-        tree = Tree(loads(str(self)))
-        type_field = NodeBaseClass.serialize('type')
-        object_field = NodeBaseClass.serialize('object')
-        id_field = NodeBaseClass.serialize('id')
+    @staticmethod
+    def serialize_bytes(value):
+        """
+        Serialized form of the bytes a node keeps (see KEEP_BYTES_OPTION), base64 under a tag from_object reverses
+        :param value: bytes
+        :return: dict
+        """
+        return {NodeBaseClass.serialize("bytes"): base64.b64encode(value).decode("ascii")}
 
-        return [type(self).from_str(dumps(d[object_field]),
-                                    node_type=d[type_field] if type_field in d.keys() else None)
-                for d in list(tree.execute('$..*[@.' + type_field + ' and @.' + object_field + ']')) if
-                d[object_field][id_field] != self.id]
+    def children(self, copies=None):
+        """
+        Nodes embedded at any depth in the data of this node, walked lazily and depth first
+        :param copies: yields clones instead of the embedded nodes themselves
+        :return: generator
+        """
+        clones = copies if type(copies) == bool else False
+        visited = {id(self)}
+        stack = [self.peek_data()]
+        while len(stack) > 0:
+            value = stack.pop()
+            if issubclass(type(value), (CoreNodeClass, dict, list, tuple)):
+                if id(value) in visited:
+                    continue
+                visited.add(id(value))
+
+            if issubclass(type(value), CoreNodeClass):
+                if value.id != self.id:
+                    yield value.clone(new=False) if clones else value
+                stack.append(value.peek_data() if issubclass(type(value), NodeBaseClass) else value.get_data())
+            elif issubclass(type(value), dict):
+                stack.extend(reversed(list(dict.values(value))))
+            elif issubclass(type(value), list):
+                stack.extend(reversed(list(list.__iter__(value))))
+            elif type(value) == tuple:
+                stack.extend(reversed(value))
 
     def toDict(self):
         return NodeBaseClass.to_dict(deepcopy(self))
 
     def clone(self, new=None):
-        cloned = deepcopy(self)
+        """
+        Copy on write clone: the data is shared with this node, either of them copies a container when it first
+        reaches it through get_data() and clones the embedded nodes it reaches. Only the containers get_data() already
+        handed out are copied right away, for the clone.
+        :param new: resets the dates and ttl of the clone
+        :return:
+        """
+        handed_out = self.__dict__.get("_cow_owner")
+        cloned = copy(self)
+        # clones of a frozen version are writable
+        object.__setattr__(cloned, "_frozen", False)
+        owner = Owner(shared=True)
+        object.__setattr__(cloned, "_cow_owner", owner)
+        if handed_out is not None or self.__dict__.get("_handed_out"):
+            object.__setattr__(cloned, "_inner_data", detach(self._inner_data, handed_out, owner))
+        else:
+            object.__setattr__(self, "_cow_owner", Owner(shared=True))
+        object.__setattr__(cloned, "_options", deepcopy(self._options))
+        object.__setattr__(cloned, "_graph", None)
 
         new_instance = new if type(new) == bool else False
         cloned._create_date = int(datetime.utcnow().timestamp()) if new_instance else cloned.create_date
@@ -309,6 +576,20 @@ class NodeBaseClass(OperatorsResolver, CoreNodeClass, IndexesSupport):
 
         return cloned
 
+    def embedded_copy(self, owner):
+        """
+        Clone of this node for the data of owner, see copy_on_write.own: mutating it still invalidates the
+        fingerprints of the nodes embedding this one
+        :param owner: Owner
+        :return:
+        """
+        cloned = self.clone(new=False)
+        object.__setattr__(cloned, EMBEDDER, owner)
+        parents = self.__dict__.get("_parents")
+        if parents is not None:
+            object.__setattr__(cloned, "_parents", dict(parents))
+        return cloned
+
     @classmethod
     def from_str(cls, string_value, new=None, node_type=None, strict_on_new_type=True):
         """
@@ -319,8 +600,18 @@ class NodeBaseClass(OperatorsResolver, CoreNodeClass, IndexesSupport):
         :param strict_on_new_type: if set to true, creates a new type even if some fields in CORE_FIELDS are not present
         :return:
         """
+        return cls.from_object(loads(string_value), new=new, node_type=node_type)
+
+    @classmethod
+    def from_object(cls, o, new=None, node_type=None):
+        """
+        Builds the nodes straight from a parsed serialization, in a single pass over it
+        :param o: parsed value
+        :param new: creates a new object otherwise
+        :param node_type: name of node class
+        :return:
+        """
         new_instance = new if type(new) == bool else False
-        o = loads(string_value)
 
         type_field = NodeBaseClass.serialize('type')
         object_field = NodeBaseClass.serialize('object')
@@ -329,69 +620,139 @@ class NodeBaseClass(OperatorsResolver, CoreNodeClass, IndexesSupport):
         encoding_field = NodeBaseClass.serialize('encoding')
         key_field = NodeBaseClass.serialize('key')
         name_field = NodeBaseClass.serialize('name')
+        version_field = NodeBaseClass.serialize('version')
         create_date_field = NodeBaseClass.serialize('create_date')
         update_date_field = NodeBaseClass.serialize('update_date')
         ttl_field = NodeBaseClass.serialize('ttl')
+        bytes_field = NodeBaseClass.serialize('bytes')
 
-        additional_fields = [NodeBaseClass.serialize(name) for name in getattr(cls, "additional_fields", [])]
+        # node type -> [serialized fields, node class, additional fields], resolved once per type
+        resolved = {}
 
-        if node_type is not None:
-            if node_type in EntityClassGenerator.class_registry.keys():
-                klass = EntityClassGenerator.class_registry[node_type]
-            else:
+        def resolve(t):
+            if t not in resolved:
                 # TODO: Build a new type here if strict_on_new_type==False
-                if strict_on_new_type == False:
-                    klass = cls
+                klass = cls if t is None else EntityClassGenerator.class_registry.get(t, cls)
+                resolved[t] = [set(klass.get_properties_mapping(node_type=t).keys()), None,
+                               list(getattr(klass, "additional_fields", []))]
+            return resolved[t]
+
+        def node_class(t):
+            definition = resolve(t)
+            if definition[1] is None:
+                if t is None or t.upper() == NodeBaseClass.__name__.upper():
+                    definition[1] = NodeBaseClass
                 else:
-                    klass = cls
-        else:
-            klass = cls
-
-        if type(o) == dict and {type_field, object_field} == set(o.keys()):
-            return NodeBaseClass.from_str(dumps(o[object_field]), new=new_instance, node_type=o[type_field])
-
-        if type(o) == dict and set(klass.get_properties_mapping(node_type=node_type).keys()) == set(o.keys()):
-            id = str(uuid.uuid4()) if new_instance else o[id_field]
-
-            if node_type is None or node_type.upper() == NodeBaseClass.__name__.upper():
-                doc = NodeBaseClass(o[data_field], id=id,
-                                    encoding=o[encoding_field], key=o[key_field], name=o[name_field], )
-            else:
-                doc = EntityClassGenerator(
-                    NodeBaseClass,
-                    VersionAwareEntity,
-                    IndexesSupport).create(
-                    node_type,
-                    additional_fields=additional_fields)(
-                    o[data_field],
-                    id=id,
-                    encoding=o[encoding_field],
-                    key=o[key_field],
-                    name=o[name_field])
-
-            if type(o[data_field]) == dict and {object_field, type_field} == set(o[data_field].keys()):
-                doc.set_data(
-                    NodeBaseClass.from_str(dumps(o[data_field][object_field]), new=new_instance))
-            else:
-                doc.set_data(NodeBaseClass.from_str(dumps(o[data_field])))
-
-            doc._create_date = int(datetime.utcnow().timestamp()) if new_instance else o[create_date_field]
-            doc._update_date = doc._create_date if new_instance else o[update_date_field]
-            doc._ttl = -1 if new_instance else o[ttl_field]
+                    definition[1] = EntityClassGenerator(
+                        NodeBaseClass,
+                        VersionAwareEntity,
+                        IndexesSupport).create(t, additional_fields=definition[2])
+            return definition[1]
+
+        def build(value, t):
+            data = decode(value[data_field], None)
+            doc = node_class(t)(data,
+                                id=str(uuid.uuid4()) if new_instance else value[id_field],
+                                encoding=value[encoding_field],
+                                key=value[key_field],
+                                name=value[name_field],
+                                options={NodeBaseClass.KEEP_BYTES_OPTION: True} if type(data) == bytes else None)
+
+            doc._version = 0 if new_instance else value[version_field]
+            doc._create_date = int(datetime.utcnow().timestamp()) if new_instance else value[create_date_field]
+            doc._update_date = doc._create_date if new_instance else value[update_date_field]
+            doc._ttl = -1 if new_instance else value[ttl_field]
 
             # setting additional fields
-            for name in additional_fields:
-                setattr(doc, name, o[name])
+            for name in resolve(t)[2]:
+                setattr(doc, name, value[name])
 
             return doc
 
-        if type(o) == dict and set(klass.get_properties_mapping(node_type=node_type).keys()) != set(o.keys()):
-            return {k: NodeBaseClass.from_str(dumps(v), new=new_instance, ) for k, v in o.items()}
-
-        if type(o) == list:
-            return [NodeBaseClass.from_str(dumps(sub_o), new=new_instance) for sub_o in o]
+        def decode(value, t):
+            if type(value) == dict:
+                if len(value) == 2 and type_field in value and object_field in value:
+                    return decode(value[object_field], value[type_field])
+                if resolve(t)[0] == value.keys():
+                    return build(value, t)
+                if len(value) == 1 and bytes_field in value:
+                    return base64.b64decode(value[bytes_field])
+                return {k: decode(v, None) for k, v in value.items()}
+            if type(value) == list:
+                return [decode(v, None) for v in value]
+            return value
+
+        # a parsed serialization cannot hold circular references
+        with NodeBaseClass.trusted_load():
+            return decode(o, node_type)
 
-        return o
+    @classmethod
+    def bulk_create(cls, records, node_type=None):
+        """
+        Builds many nodes in one pass, skipping the per node work of __init__: ids are allocated in a single batch,
+        the nodes share one timestamp, fields are set directly, nothing is logged and data are not checked for
+        circular references (see trusted_load).
+        :param records: iterable of dicts of node fields: id, encoding, key, name, data, ttl, create_date,
+            update_date, options and the additional fields of the node type
+        :param node_type: name of the node class, the class bulk_create is called on by default
+        :return: list of nodes
+        """
+        if node_type is None or node_type == cls.__name__:
+            klass = cls
+        else:
+            klass = EntityClassGenerator.class_registry.get(node_type)
+            if klass is None or not issubclass(klass, NodeBaseClass):
+                klass = EntityClassGenerator(NodeBaseClass, VersionAwareEntity, IndexesSupport).create(node_type)
+
+        additional_fields = list(getattr(klass, "additional_fields", None) or [])
+        accepted_fields = {"id", "encoding", "key", "name", "data", "ttl", "create_date", "update_date",
+                           "options"}.union(additional_fields)
+
+        records = list(records)
+        missing_ids = sum(1 for record in records if record.get("id") is None)
+        random_ids = os.urandom(16 * missing_ids).hex()
+        timestamp = int(datetime.utcnow().timestamp())
+
+        nodes = []
+        next_id = 0
+        for record in records:
+            unexpected = [field for field in record.keys() if field not in accepted_fields]
+            if len(unexpected) > 0:
+                raise TypeError("Unexpected node fields: {f}".format(f=", ".join(sorted(unexpected))))
+
+            node_id = record.get("id")
+            if node_id is None:
+                node_id = random_ids[next_id:next_id + 32]
+                next_id += 32
+            encoding = record.get("encoding")
+            create_date = record.get("create_date")
+            create_date = timestamp if create_date is None else create_date
+            update_date = record.get("update_date")
+
+            node = object.__new__(klass)
+            node.__dict__.update({
+                "_frozen": False,
+                "_id": str(node_id),
+                "_encoding": encoding if type(encoding) == str else DEFAULT_ENCODING,
+                "_key": record.get("key"),
+                "_name": record.get("name"),
+                "_version": 0,
+                "_inner_data": None,
+                "_ttl": record.get("ttl", -1),
+                "_options": record.get("options"),
+                "_new": False,
+                "_create_date": create_date,
+                "_update_date": create_date if update_date is None else update_date,
+                "_graph": None
+            })
+            data = record.get("data")
+            if data is not None:
+                node.__dict__["_inner_data"] = node._stored_data(data)
+            for name in additional_fields:
+                if name in record:
+                    setattr(node, name, record[name])
+            nodes.append(node)
+        return nodes
 
     def __repr__(self):
         # In some corner cases __repr__ gets called before __init__
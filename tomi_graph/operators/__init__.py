@@ -51,4 +51,4 @@ def direction_from_val(value):
 
 class DefaultValues(Enum):
     ENTITY = dict(node_type=None, id=None, encoding=None, key=None, name=None, data=None, ttl=-1)
-    RELATIONSHIP = dict(name=None, rel_type=None, protection=None, data=None, on_gc_collect=NULL_VAL)
+    RELATIONSHIP = dict(name=None, rel_type=None, direction=None, protection=None, data=None, on_gc_collect=NULL_VAL)
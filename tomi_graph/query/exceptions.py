@@ -0,0 +1,6 @@
+class QuerySyntaxException(Exception):
+    pass
+
+
+class QueryParameterException(Exception):
+    pass
@@ -0,0 +1,148 @@
+import re
+from collections import namedtuple
+
+from tomi_graph.query.exceptions import QuerySyntaxException
+from tomi_graph.relationships.core.direction import Direction
+
+# label is a node type name, properties a dict of field -> Literal or Parameter
+NodePattern = namedtuple("NodePattern", ["variable", "label", "properties"])
+# rel_types is a list of relationship type names (any type when empty), properties are matched against the data of
+# the relationship, direction is Direction.LEFT_TO_RIGHT for -[]->, Direction.RIGHT_TO_LEFT for <-[]-, None for -[]-
+RelationshipPattern = namedtuple("RelationshipPattern", ["variable", "rel_types", "properties", "direction"])
+Parameter = namedtuple("Parameter", ["name"])
+
+TOKEN_PATTERN = re.compile(r"""
+    \s*(?:
+        (?P<parameter>\$[A-Za-z_][A-Za-z0-9_]*)
+        |(?P<string>'(?:[^'\\]|\\.)*'|"(?:[^"\\]|\\.)*")
+        |(?P<number>-?\d+(?:\.\d+)?(?:[eE][-+]?\d+)?)
+        |(?P<name>[A-Za-z_][A-Za-z0-9_]*)
+        |(?P<symbol><-|->|[()\[\]{}:,|-])
+    )""", re.VERBOSE)
+
+KEYWORDS = {"true": True, "false": False, "null": None}
+
+
+def _tokens(text):
+    position = 0
+    text = text.rstrip()
+    while position < len(text):
+        match = TOKEN_PATTERN.match(text, position)
+        if match is None:
+            raise QuerySyntaxException("Unexpected character at {p}: {t}".format(p=position, t=repr(text[position:])))
+        position = match.end()
+        kind = match.lastgroup
+        yield kind, match.group(kind), match.start(kind)
+
+
+class _Parser(object):
+    def __init__(self, text):
+        self.tokens = list(_tokens(text))
+        self.position = 0
+
+    def peek(self, value=None):
+        if self.position >= len(self.tokens):
+            return None
+        kind, token, _ = self.tokens[self.position]
+        if value is not None:
+            return token if kind == "symbol" and token == value else None
+        return kind, token
+
+    def next(self, value=None, kind=None):
+        if self.position >= len(self.tokens):
+            raise QuerySyntaxException("Unexpected end of query, {v} expected".format(v=value or kind))
+        token_kind, token, start = self.tokens[self.position]
+        if (value is not None and (token_kind != "symbol" or token != value)) or (kind is not None and
+                                                                                   token_kind != kind):
+            raise QuerySyntaxException("{v} expected at {p}, got {t}".format(v=value or kind, p=start, t=repr(token)))
+        self.position += 1
+        return token
+
+    def pattern(self):
+        elements = [self.node()]
+        while self.position < len(self.tokens):
+            elements.append(self.relationship())
+            elements.append(self.node())
+        return elements
+
+    def node(self):
+        self.next("(")
+        variable = self.next(kind="name") if self.peek() is not None and self.peek()[0] == "name" else None
+        label = None
+        if self.peek(":"):
+            self.next(":")
+            label = self.next(kind="name")
+        properties = self.properties() if self.peek("{") else {}
+        self.next(")")
+        return NodePattern(variable, label, properties)
+
+    def relationship(self):
+        if self.peek("<-"):
+            self.next("<-")
+            direction = Direction.RIGHT_TO_LEFT
+        else:
+            self.next("-")
+            direction = None
+
+        variable = None
+        rel_types = []
+        properties = {}
+        if self.peek("["):
+            self.next("[")
+            if self.peek() is not None and self.peek()[0] == "name":
+                variable = self.next(kind="name")
+            if self.peek(":"):
+                self.next(":")
+                rel_types.append(self.next(kind="name"))
+                while self.peek("|"):
+                    self.next("|")
+                    rel_types.append(self.next(kind="name"))
+            if self.peek("{"):
+                properties = self.properties()
+            self.next("]")
+
+        if self.peek("->"):
+            self.next("->")
+            if direction is not None:
+                raise QuerySyntaxException("A relationship can not point both ways")
+            direction = Direction.LEFT_TO_RIGHT
+        else:
+            self.next("-")
+        return RelationshipPattern(variable, rel_types, properties, direction)
+
+    def properties(self):
+        self.next("{")
+        properties = {}
+        while not self.peek("}"):
+            if len(properties) > 0:
+                self.next(",")
+            key = self.next(kind="name")
+            self.next(":")
+            properties[key] = self.value()
+        self.next("}")
+        return properties
+
+    def value(self):
+        token = self.peek()
+        if token is None:
+            raise QuerySyntaxException("Unexpected end of query, value expected")
+        kind, value = token
+        self.position += 1
+        if kind == "parameter":
+            return Parameter(value[1:])
+        if kind == "string":
+            return re.sub(r"\\(.)", r"\1", value[1:-1])
+        if kind == "number":
+            return float(value) if any(c in value for c in ".eE") else int(value)
+        if kind == "name" and value in KEYWORDS:
+            return KEYWORDS[value]
+        raise QuerySyntaxException("Value expected, got {t}".format(t=repr(value)))
+
+
+def parse(text):
+    """
+    Parses a path pattern such as (a:Person {name: $n})-[r:REF|LINK]->(b)<-[]-(c)
+    :param text:
+    :return: list alternating NodePattern and RelationshipPattern, starting and ending with a NodePattern
+    """
+    return _Parser(text).pattern()
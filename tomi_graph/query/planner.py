@@ -0,0 +1,230 @@
+from collections import namedtuple
+from functools import lru_cache
+
+from tomi_graph.graphs.traversal import relationship_filter
+from tomi_graph.indexes_support import IndexesSupport
+from tomi_graph.query.exceptions import QueryParameterException, QuerySyntaxException
+from tomi_graph.query.parser import parse, NodePattern, Parameter
+from tomi_graph.relationships.core.direction import Direction
+
+# how the nodes of the start pattern are found, ids an ordered mapping of candidate node ids
+Access = namedtuple("Access", ["operator", "index", "key", "ids"])
+# expansion from the node pattern at position source to the one at target through the relationship pattern at
+# relationship, direction as given to Graph._adjacent
+Expansion = namedtuple("Expansion", ["source", "relationship", "target", "direction"])
+
+REVERSED_DIRECTIONS = {
+    Direction.LEFT_TO_RIGHT: Direction.RIGHT_TO_LEFT,
+    Direction.RIGHT_TO_LEFT: Direction.LEFT_TO_RIGHT
+}
+
+
+class Query(object):
+    """
+    Compiled path pattern, see tomi_graph.query.parser.parse for the syntax
+    """
+
+    def __init__(self, text):
+        self._text = text
+        self._pattern = parse(text)
+        variables = [element.variable for element in self._pattern if element.variable is not None]
+        if len(variables) != len(set(variables)):
+            raise QuerySyntaxException("Variables must be unique in {q}".format(q=text))
+
+    @staticmethod
+    @lru_cache(maxsize=256)
+    def compile(text):
+        """
+        Compiled query, queries are cached by text
+        :param text:
+        :return: Query
+        """
+        return Query(text)
+
+    @property
+    def text(self):
+        return self._text
+
+    @property
+    def pattern(self):
+        return list(self._pattern)
+
+    def plan(self, graph, params=None):
+        """
+        Execution plan of the query over graph, the start is the node pattern with the fewest candidates
+        :param graph: Graph
+        :param params: values of the $parameters
+        :return: Plan
+        """
+        return Plan(self, graph, params or {})
+
+
+class Plan(object):
+    def __init__(self, query, graph, params):
+        self._query = query
+        self._graph = graph
+        pattern = query.pattern
+        self._nodes = pattern[0::2]
+        self._relationships = pattern[1::2]
+        self._node_properties = [Plan._resolve(p.properties, params) for p in self._nodes]
+        self._relationship_accept = [relationship_filter(rel_type=r.rel_types or None,
+                                                         data=Plan._resolve(r.properties, params) or None)
+                                     for r in self._relationships]
+
+        with graph.lock:
+            accesses = [self._access(position) for position in range(len(self._nodes))]
+        self._start = min(range(len(accesses)), key=lambda position: len(accesses[position].ids))
+        self._access_path = accesses[self._start]
+
+        # from the start to the right end of the pattern, then to its left end
+        self._expansions = []
+        for position in range(self._start, len(self._nodes) - 1):
+            self._expansions.append(Expansion(position, position, position + 1,
+                                              self._relationships[position].direction))
+        for position in range(self._start, 0, -1):
+            direction = self._relationships[position - 1].direction
+            self._expansions.append(Expansion(position, position - 1, position - 1,
+                                              REVERSED_DIRECTIONS.get(direction, direction)))
+
+    @staticmethod
+    def _resolve(properties, params):
+        resolved = {}
+        for field, value in properties.items():
+            if type(value) == Parameter:
+                if value.name not in params:
+                    raise QueryParameterException("Missing value for parameter ${p}".format(p=value.name))
+                value = params[value.name]
+            resolved[field] = value
+        return resolved
+
+    @staticmethod
+    def _index_key(values):
+        return ":".join([str(value) if value is not None else IndexesSupport.NULL_INDEX_VALUE for value in values])
+
+    def _access(self, position):
+        """
+        Most selective way to find the candidates of the node pattern at position, from the graph indexes
+        :param position:
+        :return: Access
+        """
+        graph = self._graph
+        label = self._nodes[position].label
+        properties = self._node_properties[position]
+
+        if "id" in properties:
+            node_id = properties["id"]
+            return Access("NodeById", None, node_id, {node_id: None} if node_id in graph._nodes else {})
+
+        accesses = []
+        if label is not None:
+            typed = graph._field_indexes["node_type"].get(label)
+            if len(typed) == 0:
+                return Access("NodeByType", "node_type", label, typed)
+            accesses.append(Access("NodeByType", "node_type", label, typed))
+
+            # the indexes of a type are declared on its class
+            node_class = type(graph._nodes[next(iter(typed))])
+            unique_fields = list(getattr(node_class, "get_unique_constraint_fields", lambda: [])())
+            if len(unique_fields) > 0 and all(field in properties for field in unique_fields):
+                name = IndexesSupport.get_unique_constraint_name(label)
+                key = ":".join([label] + [str(properties[field]) if properties[field] is not None else "" for field in
+                                          unique_fields])
+                index = graph._hash_indexes.get(name)
+                return Access("NodeByUniqueConstraint", name, key, index.get(key) if index is not None else {})
+
+            type_indexes = getattr(node_class, IndexesSupport.INDEXES_CLASS_METHOD, lambda: {})() or {}
+            for name, fields in type_indexes.items():
+                if all(field in properties for field in fields) and name in graph._hash_indexes:
+                    key = Plan._index_key([properties[field] for field in fields])
+                    accesses.append(Access("NodeByIndex", name, key, graph._hash_indexes[name].get(key)))
+
+        for field in [f for f in type(graph).INDEXED_FIELDS if f in properties and f != "node_type"]:
+            accesses.append(Access("NodeByField", field, properties[field],
+                                   graph._field_indexes[field].get(properties[field])))
+
+        if len(accesses) == 0:
+            return Access("AllNodes", None, None, graph._nodes)
+        return min(accesses, key=lambda access: len(access.ids))
+
+    def _accept_node(self, position, node):
+        pattern = self._nodes[position]
+        if pattern.label is not None and type(node).__name__ != pattern.label:
+            return False
+        return all(getattr(node, field, None) == value for field, value in self._node_properties[position].items())
+
+    def _adjacent(self, node_id, direction):
+        with self._graph.lock:
+            return list(self._graph._adjacent(node_id, direction=direction))
+
+    def _bindings(self, step, nodes, relationships, used):
+        if step == len(self._expansions):
+            yield nodes, relationships
+            return
+        expansion = self._expansions[step]
+        accept = self._relationship_accept[expansion.relationship]
+        for relationship, neighbor_id in self._adjacent(nodes[expansion.source].id, expansion.direction):
+            # a relationship is matched once in a path
+            if relationship.id in used or (accept is not None and not accept(relationship)):
+                continue
+            neighbor = self._graph._nodes.get(neighbor_id)
+            if neighbor is None or not self._accept_node(expansion.target, neighbor):
+                continue
+            nodes[expansion.target] = neighbor
+            relationships[expansion.relationship] = relationship
+            used.add(relationship.id)
+            yield from self._bindings(step + 1, nodes, relationships, used)
+            used.discard(relationship.id)
+
+    def execute(self):
+        """
+        Streams the matches of the query
+        :return: generator of dicts, variable -> node or relationship, for the variables of the pattern
+        """
+        with self._graph.lock:
+            start_ids = list(self._access_path.ids)
+        for node_id in start_ids:
+            node = self._graph._nodes.get(node_id)
+            if node is None or not self._accept_node(self._start, node):
+                continue
+            nodes = [None] * len(self._nodes)
+            nodes[self._start] = node
+            for matched_nodes, matched_relationships in self._bindings(0, nodes, [None] * len(self._relationships),
+                                                                       set()):
+                match = {}
+                for position, element in enumerate(self._query.pattern):
+                    if element.variable is not None:
+                        match[element.variable] = matched_nodes[position // 2] if position % 2 == 0 else \
+                            matched_relationships[position // 2]
+                yield match
+
+    @staticmethod
+    def _describe(element, name):
+        if type(element) == NodePattern:
+            label = ":" + element.label if element.label is not None else ""
+            return "({v}{l})".format(v=element.variable or "", l=label)
+        rel_types = ":" + "|".join(element.rel_types) if len(element.rel_types) > 0 else ""
+        return "[{v}{t}]".format(v=element.variable or name, t=rel_types)
+
+    def explain(self):
+        """
+        Human readable plan
+        :return: str, one operator per line
+        """
+        access = self._access_path
+        if access.index is not None:
+            detail = " index={i} key={k}".format(i=access.index, k=repr(access.key))
+        else:
+            detail = " id={k}".format(k=repr(access.key)) if access.key is not None else ""
+        lines = ["{o} {n}{d} rows={r}".format(o=access.operator, n=Plan._describe(self._nodes[self._start], None),
+                                               d=detail, r=len(access.ids))]
+        arrows = {Direction.LEFT_TO_RIGHT: ("-", "->"), Direction.RIGHT_TO_LEFT: ("<-", "-")}
+        for expansion in self._expansions:
+            left, right = arrows.get(expansion.direction, ("-", "-"))
+            lines.append("Expand {s}{a}{r}{b}{t}".format(
+                s=Plan._describe(self._nodes[expansion.source], None), a=left,
+                r=Plan._describe(self._relationships[expansion.relationship], ""), b=right,
+                t=Plan._describe(self._nodes[expansion.target], None)))
+        return "\n".join(lines)
+
+    def __str__(self):
+        return self.explain()
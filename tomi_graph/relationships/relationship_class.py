@@ -1,11 +1,12 @@
 import weakref
 from collections.abc import MutableMapping
-from copy import deepcopy
+from copy import copy
 from enum import Enum
 from uuid import uuid4
 
 from tomi_graph.entity_class_generator import EntityClassGenerator
 from tomi_graph.graphs.graph import Graph
+from tomi_graph.nodes.copy_on_write import Owner, detach, own
 from tomi_graph.nodes.core.node import CoreNodeClass
 from tomi_graph.operators import GraphOperationDirection, GraphOperation
 from tomi_graph.operators.operator_resolver import OperatorsResolver
@@ -15,11 +16,33 @@ from tomi_graph.relationships.core.relation_type import RelationType
 from tomi_graph.relationships.core.relationship import CoreRelationshipClass
 from tomi_graph.relationships.exceptions import CoreRelationshipException
 from tomi_graph.version_aware_entity import VersionAwareEntity
+from tomi_graph.watched_entity import WatchedEntity
 
 
-class RelationshipBaseClass(OperatorsResolver, CoreRelationshipClass):
+class RelationshipBaseClass(OperatorsResolver, CoreRelationshipClass, WatchedEntity):
+    # attributes holding derived state, not part of the relationship content
+    TRANSIENT_FIELDS = ("_cow_owner", "_handed_out", "_version_store", "_watchers")
+
     def clone(self, new=None):
-        return deepcopy(self)
+        """
+        Copy on write clone, the data is shared with this relationship until either of them accesses it, see
+        NodeBaseClass.clone
+        :param new:
+        :return:
+        """
+        handed_out = self.__dict__.get("_cow_owner")
+        cloned = copy(self)
+        object.__setattr__(cloned, "_frozen", False)
+        cloned.__dict__.pop("_version_store", None)
+        cloned.__dict__.pop("_watchers", None)
+        cloned.__dict__.pop("_handed_out", None)
+        owner = Owner(shared=True)
+        object.__setattr__(cloned, "_cow_owner", owner)
+        if handed_out is not None or self.__dict__.get("_handed_out"):
+            object.__setattr__(cloned, "_data", detach(self.__dict__.get("_data"), handed_out, owner))
+        else:
+            object.__setattr__(self, "_cow_owner", Owner(shared=True))
+        return cloned
 
     @property
     def id(self):
@@ -38,7 +61,14 @@ class RelationshipBaseClass(OperatorsResolver, CoreRelationshipClass):
 
     @property
     def data(self):
-        return self._data
+        owner = self.__dict__.get("_cow_owner")
+        if owner is None:
+            object.__setattr__(self, "_handed_out", True)
+            return self._data
+        data = own(self._data, owner)
+        if data is not self._data:
+            object.__setattr__(self, "_data", data)
+        return data
 
     @data.setter
     def data(self, value):
@@ -99,17 +129,29 @@ class RelationshipBaseClass(OperatorsResolver, CoreRelationshipClass):
         self._direction = direction if type(direction) == Direction else Direction.NONE
         self._data = data
 
-    def toDict(self):
+    def __setattr__(self, name, value):
+        super().__setattr__(name, value)
+        if name not in RelationshipBaseClass.TRANSIENT_FIELDS:
+            self._notify_watchers(name)
+
+    def serialized_fields(self):
+        """
+        Serialized relationship fields, the nodes are returned as they are
+        :return:
+        """
         def value(v):
             if issubclass(type(v), Enum):
                 return v.name
             elif type(v) == weakref.ReferenceType:
                 entity = v()
-                return entity.toDict() if issubclass(type(entity), CoreNodeClass) else None
+                return entity if issubclass(type(entity), CoreNodeClass) else None
             else:
                 return v
 
-        return {"_" + k: value(v) for k, v in self.__dict__.items()}
+        return {"_" + k: value(v) for k, v in self.__dict__.items() if k not in RelationshipBaseClass.TRANSIENT_FIELDS}
+
+    def toDict(self):
+        return {k: v.toDict() if issubclass(type(v), CoreNodeClass) else v for k, v in self.serialized_fields().items()}
 
     def __repr__(self):
 
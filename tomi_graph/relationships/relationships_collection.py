@@ -0,0 +1,48 @@
+from collections.abc import MutableSet
+
+
+class RelationshipsCollection(MutableSet):
+    """
+    Relationships of a graph in insertion order, keyed by relationship id so membership tests do not scan
+    """
+
+    def __init__(self, relationships=None):
+        self._dict = {}
+
+        for relationship in relationships if relationships is not None else []:
+            self.add(relationship)
+
+    @staticmethod
+    def _key(value):
+        return value if type(value) == str else getattr(value, "id", None)
+
+    def add(self, relationship):
+        if relationship is not None and relationship.id not in self._dict:
+            self._dict[relationship.id] = relationship
+
+    def append(self, relationship):
+        self.add(relationship)
+
+    def discard(self, relationship):
+        self._dict.pop(RelationshipsCollection._key(relationship), None)
+
+    def get(self, relationship_id, default=None):
+        return self._dict.get(relationship_id, default)
+
+    def clear(self):
+        self._dict.clear()
+
+    def __contains__(self, relationship):
+        return RelationshipsCollection._key(relationship) in self._dict
+
+    def __iter__(self):
+        return iter(list(self._dict.values()))
+
+    def __len__(self):
+        return len(self._dict)
+
+    def __str__(self):
+        return str(list(self._dict.values()))
+
+    def __repr__(self):
+        return repr(list(self._dict.values()))
@@ -0,0 +1,426 @@
+import re
+import struct
+import uuid
+from datetime import datetime
+from ujson import dumps
+
+from tomi_graph.entity_class_generator import EntityClassGenerator
+from tomi_graph.graphs.graph import Graph
+from tomi_graph.graphs.node_data_graph import NodeDataGraph
+from tomi_graph.indexes_support import IndexesSupport
+from tomi_graph.nodes.core import DEFAULT_ENCODING
+from tomi_graph.nodes.node_class import NodeBaseClass
+from tomi_graph.relationships.core.direction import Direction
+from tomi_graph.relationships.core.protection import Protection
+from tomi_graph.relationships.relationship_class import RelationshipBaseClass
+from tomi_graph.version_aware_entity import VersionAwareEntity
+
+# Layout: MAGIC, kind, payload. Field names and node types are written once and then referenced by a varint index
+# into the dictionary they belong to, strings and containers are length prefixed, ints are zigzag varints.
+MAGIC = b"TGB\x01"
+
+KIND_VALUE = 0
+KIND_GRAPH = 1
+KIND_NODE_DATA_GRAPH = 2
+
+NONE = 0
+FALSE = 1
+TRUE = 2
+INT = 3
+FLOAT = 4
+INTEGRAL_FLOAT = 5
+STRING = 6
+HEX_ID = 7
+LIST = 8
+DICT = 9
+NODE = 10
+NODE_REF = 11
+UNIQUE_INDEX = 12
+BYTES = 13
+
+HEX_ID_PATTERN = re.compile(r"[0-9a-f]{32}\Z")
+DOUBLE = struct.Struct("<d")
+
+
+class BinaryFormatException(Exception):
+    pass
+
+
+def encode(o):
+    """
+    Compact binary serialization of a node tree, a value holding nodes, a Graph or a NodeDataGraph
+    :param o:
+    :return: bytes
+    """
+    encoder = _Encoder()
+    encoder.buffer.extend(MAGIC)
+    if issubclass(type(o), NodeDataGraph):
+        encoder.buffer.append(KIND_NODE_DATA_GRAPH)
+        encoder.symbol(encoder.types, o._rel_type)
+        encoder.graph(o)
+        encoder.varint(encoder.node_refs[o.root_node.id])
+    elif issubclass(type(o), Graph):
+        encoder.buffer.append(KIND_GRAPH)
+        encoder.string(o.namespace_root)
+        encoder.graph(o)
+    else:
+        encoder.buffer.append(KIND_VALUE)
+        encoder.value(o)
+    return bytes(encoder.buffer)
+
+
+def decode(b, new=None):
+    """
+    Decodes the output of encode, nodes are built as NodeBaseClass.from_str would build them from str(), straight
+    from the payload
+    :param b: bytes like
+    :param new: creates new nodes, see NodeBaseClass.from_str
+    :return:
+    """
+    decoder = _Decoder(b, new=new)
+    if bytes(decoder.view[:len(MAGIC)]) != MAGIC:
+        raise BinaryFormatException("Not a binary node serialization.")
+    decoder.position = len(MAGIC) + 1
+    kind = decoder.view[len(MAGIC)]
+
+    if kind == KIND_NODE_DATA_GRAPH:
+        rel_type = decoder.symbol(decoder.types)
+        nodes, relationships, _ = decoder.graph()
+        root_node = nodes[decoder.varint()]
+        return NodeDataGraph.from_flattened(root_node, nodes, relationships, rel_type=rel_type)
+    if kind == KIND_GRAPH:
+        graph = Graph(decoder.string())
+        nodes, relationships, namespace_map = decoder.graph()
+        for node in nodes:
+            graph.add_node(node)
+        graph.add_relationships(relationships)
+        graph.namespace_map.update(namespace_map)
+        return graph
+    if kind == KIND_VALUE:
+        return decoder.value()
+    raise BinaryFormatException("Unknown payload kind {k}.".format(k=kind))
+
+
+def dump(o, fp):
+    fp.write(encode(o))
+
+
+def load(fp, new=None):
+    return decode(fp.read(), new=new)
+
+
+def _key(k):
+    # same conversion of keys as the JSON serialization
+    if type(k) == str:
+        return k
+    if k is None or type(k) in (bool, int, float):
+        return dumps(k)
+    return str(k)
+
+
+class _Encoder(object):
+    def __init__(self):
+        self.buffer = bytearray()
+        self.keys = {}
+        self.types = {}
+        self.node_refs = {}
+
+    def varint(self, n):
+        while n >= 0x80:
+            self.buffer.append((n & 0x7f) | 0x80)
+            n >>= 7
+        self.buffer.append(n)
+
+    def string(self, s):
+        encoded = s.encode(DEFAULT_ENCODING)
+        self.varint(len(encoded))
+        self.buffer.extend(encoded)
+
+    def symbol(self, table, s):
+        index = table.get(s)
+        if index is None:
+            table[s] = len(table)
+            self.varint(0)
+            self.string(s)
+        else:
+            self.varint(index + 1)
+
+    def mapping(self, items, unique_key=None, unique_index=None):
+        items = sorted(((_key(k), v) for k, v in items), key=lambda item: item[0])
+        self.varint(len(items))
+        for k, v in items:
+            self.symbol(self.keys, k)
+            if k == unique_key and v == unique_index:
+                self.buffer.append(UNIQUE_INDEX)
+            else:
+                self.value(v)
+
+    def node(self, node):
+        self.buffer.append(NODE)
+        self.symbol(self.types, type(node).__name__)
+        fields = node.serialized_fields()
+        fields[NodeBaseClass.serialize("data")] = node.peek_data()
+        self.mapping(fields.items(), unique_key=NodeBaseClass.serialize(type(node).unique_constraint_name()),
+                     unique_index=node.unique_index)
+
+    def value(self, v):
+        t = type(v)
+        if v is None:
+            self.buffer.append(NONE)
+        elif t == bool:
+            self.buffer.append(TRUE if v else FALSE)
+        elif t == int:
+            self.buffer.append(INT)
+            self.varint(v << 1 if v >= 0 else ((-v) << 1) - 1)
+        elif t == str:
+            if HEX_ID_PATTERN.match(v):
+                self.buffer.append(HEX_ID)
+                self.buffer.extend(bytes.fromhex(v))
+            else:
+                self.buffer.append(STRING)
+                self.string(v)
+        elif issubclass(t, NodeBaseClass):
+            self.node(v)
+        elif issubclass(t, dict):
+            self.buffer.append(DICT)
+            self.mapping(dict.items(v))
+        elif t in (bytes, bytearray):
+            # the payload of a node keeping its bytes, see NodeBaseClass.KEEP_BYTES_OPTION
+            self.buffer.append(BYTES)
+            self.varint(len(v))
+            self.buffer.extend(v)
+        elif issubclass(t, (list, tuple)):
+            self.buffer.append(LIST)
+            self.varint(len(v))
+            for item in (list.__iter__(v) if issubclass(t, list) else v):
+                self.value(item)
+        else:
+            try:
+                # floats and Decimal, the JSON serialization writes both as floats
+                number = float(v)
+            except (TypeError, ValueError):
+                raise TypeError("{v} is not serializable".format(v=repr(v)))
+            if number.is_integer() and abs(number) < 2 ** 53:
+                self.buffer.append(INTEGRAL_FLOAT)
+                n = int(number)
+                self.varint(n << 1 if n >= 0 else ((-n) << 1) - 1)
+            else:
+                self.buffer.append(FLOAT)
+                self.buffer.extend(DOUBLE.pack(number))
+
+    def graph(self, graph):
+        nodes = list(graph.nodes.values())
+        self.varint(len(nodes))
+        for index, node in enumerate(nodes):
+            self.node(node)
+            self.node_refs[node.id] = index
+
+        relationships = [r for r in graph.relationships if r is not None]
+        self.varint(len(relationships))
+        for relationship in relationships:
+            self.symbol(self.types, type(relationship).__name__)
+            self.buffer.append(DICT)
+            items = []
+            for k, v in relationship.serialized_fields().items():
+                if issubclass(type(v), NodeBaseClass) and v.id in self.node_refs:
+                    items.append((k, _NodeRef(self.node_refs[v.id])))
+                else:
+                    items.append((k, v))
+            self.varint(len(items))
+            for k, v in sorted(items, key=lambda item: item[0]):
+                self.symbol(self.keys, k)
+                if type(v) == _NodeRef:
+                    self.buffer.append(NODE_REF)
+                    self.varint(v.index)
+                else:
+                    self.value(v)
+
+        self.value(dict(graph.namespace_map) if graph.namespace_map is not None else None)
+
+
+class _NodeRef(object):
+    def __init__(self, index):
+        self.index = index
+
+
+ID_FIELD = NodeBaseClass.serialize("id")
+ENCODING_FIELD = NodeBaseClass.serialize("encoding")
+KEY_FIELD = NodeBaseClass.serialize("key")
+NAME_FIELD = NodeBaseClass.serialize("name")
+DATA_FIELD = NodeBaseClass.serialize("data")
+VERSION_FIELD = NodeBaseClass.serialize("version")
+CREATE_DATE_FIELD = NodeBaseClass.serialize("create_date")
+UPDATE_DATE_FIELD = NodeBaseClass.serialize("update_date")
+TTL_FIELD = NodeBaseClass.serialize("ttl")
+
+
+class _Decoder(object):
+    def __init__(self, b, new=None):
+        self.view = memoryview(b)
+        self.position = 0
+        self.keys = []
+        self.types = []
+        self.nodes = []
+        self.new = new if type(new) == bool else False
+        # node type -> (node class, additional fields)
+        self.node_classes = {}
+
+    def varint(self):
+        view = self.view
+        shift = 0
+        n = 0
+        while True:
+            byte = view[self.position]
+            self.position += 1
+            n |= (byte & 0x7f) << shift
+            if byte < 0x80:
+                return n
+            shift += 7
+
+    def zigzag(self):
+        n = self.varint()
+        return n >> 1 if n & 1 == 0 else -((n + 1) >> 1)
+
+    def string(self):
+        length = self.varint()
+        start = self.position
+        self.position += length
+        return str(self.view[start:self.position], DEFAULT_ENCODING)
+
+    def symbol(self, table):
+        index = self.varint()
+        if index == 0:
+            table.append(self.string())
+            return table[-1]
+        return table[index - 1]
+
+    def mapping(self):
+        o = {}
+        for _ in range(self.varint()):
+            k = self.symbol(self.keys)
+            o[k] = self.value()
+        return o
+
+    def node_class(self, node_type):
+        # resolved as NodeBaseClass.from_object resolves them
+        resolved = self.node_classes.get(node_type)
+        if resolved is None:
+            if node_type.upper() == NodeBaseClass.__name__.upper():
+                node_class = NodeBaseClass
+            else:
+                additional_fields = list(getattr(EntityClassGenerator.class_registry.get(node_type, NodeBaseClass),
+                                                 "additional_fields", []))
+                node_class = EntityClassGenerator(NodeBaseClass, VersionAwareEntity, IndexesSupport).create(
+                    node_type, additional_fields=additional_fields)
+            resolved = (node_class, list(getattr(node_class, "additional_fields", None) or []))
+            self.node_classes[node_type] = resolved
+        return resolved
+
+    def node(self):
+        node_class, additional_fields = self.node_class(self.symbol(self.types))
+        fields = {}
+        for _ in range(self.varint()):
+            k = self.symbol(self.keys)
+            if self.view[self.position] == UNIQUE_INDEX:
+                # computed from the other fields
+                self.position += 1
+            else:
+                fields[k] = self.value()
+
+        encoding = fields.get(ENCODING_FIELD)
+        if self.new:
+            create_date = int(datetime.utcnow().timestamp())
+            node_id, version, update_date, ttl = str(uuid.uuid4()), 0, create_date, -1
+        else:
+            node_id, version, ttl = str(fields.get(ID_FIELD)), fields.get(VERSION_FIELD), fields.get(TTL_FIELD)
+            create_date, update_date = fields.get(CREATE_DATE_FIELD), fields.get(UPDATE_DATE_FIELD)
+
+        # fields are set directly, as NodeBaseClass.bulk_create sets them: the decoded data is fresh and holds no
+        # circular reference
+        node = object.__new__(node_class)
+        node.__dict__.update({
+            "_frozen": False,
+            "_id": node_id,
+            "_encoding": encoding if type(encoding) == str else DEFAULT_ENCODING,
+            "_key": fields.get(KEY_FIELD),
+            "_name": fields.get(NAME_FIELD),
+            "_version": version,
+            "_inner_data": fields.get(DATA_FIELD),
+            "_ttl": ttl,
+            "_options": {NodeBaseClass.KEEP_BYTES_OPTION: True} if type(fields.get(DATA_FIELD)) == bytes else None,
+            "_new": False,
+            "_create_date": create_date,
+            "_update_date": update_date,
+            "_graph": None
+        })
+        for name in additional_fields:
+            setattr(node, name, fields.get(name))
+        return node
+
+    def value(self):
+        tag = self.view[self.position]
+        self.position += 1
+        if tag == NONE:
+            return None
+        if tag == FALSE:
+            return False
+        if tag == TRUE:
+            return True
+        if tag == INT:
+            return self.zigzag()
+        if tag == INTEGRAL_FLOAT:
+            return float(self.zigzag())
+        if tag == FLOAT:
+            start = self.position
+            self.position += DOUBLE.size
+            return DOUBLE.unpack(self.view[start:self.position])[0]
+        if tag == STRING:
+            return self.string()
+        if tag == HEX_ID:
+            start = self.position
+            self.position += 16
+            return self.view[start:self.position].hex()
+        if tag == BYTES:
+            length = self.varint()
+            start = self.position
+            self.position += length
+            return bytes(self.view[start:self.position])
+        if tag == LIST:
+            return [self.value() for _ in range(self.varint())]
+        if tag == DICT:
+            return self.mapping()
+        if tag == NODE:
+            return self.node()
+        if tag == NODE_REF:
+            return self.nodes[self.varint()]
+        raise BinaryFormatException("Unknown tag {t} at {p}.".format(t=tag, p=self.position - 1))
+
+    def graph(self):
+        self.nodes = [self.value() for _ in range(self.varint())]
+
+        relationships = []
+        for _ in range(self.varint()):
+            relationship_type = self.symbol(self.types)
+            fields = self.value()
+            relationships.append(relationship_from_fields(relationship_type, fields))
+
+        return self.nodes, relationships, self.value() or {}
+
+
+def relationship_from_fields(relationship_type, fields):
+    """
+    Builds a relationship from its serialized fields (see RelationshipBaseClass.serialized_fields)
+    :param relationship_type: name of the relationship class
+    :param fields: serialized fields, the nodes as node objects
+    :return:
+    """
+    relationship_class = EntityClassGenerator(RelationshipBaseClass, VersionAwareEntity).create(relationship_type)
+    data = fields.pop("__data", None) or {}
+    relationship = relationship_class(fields.pop("__node_1"),
+                                      fields.pop("__node_2"),
+                                      direction=Direction[fields.pop("__direction")],
+                                      protection=Protection[fields.pop("__protection")],
+                                      **data)
+    for k, v in fields.items():
+        object.__setattr__(relationship, k[1:], v)
+    return relationship
@@ -0,0 +1,109 @@
+from collections.abc import Mapping
+from ujson import dumps
+
+from tomi_graph.graphs.core.graph import BaseGraph
+from tomi_graph.nodes.core.node import CoreNodeClass
+from tomi_graph.nodes.node_class import NodeBaseClass
+
+DEFAULT_INDENT = 4
+DEFAULT_CHUNK_SIZE = 64 * 1024
+
+
+def iter_json(o, indent=DEFAULT_INDENT, sort_keys=True, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Streams the JSON serialization of a value holding nodes, relationships or graphs. Nothing is copied: the value
+    is walked read only and the output is the one of CoreNodeClass.serialize_to_string(o.toDict()), that is str(o)
+    for nodes.
+    :param o: node, relationship, graph or any JSON serializable value
+    :param indent: same as ujson, 0 for compact output
+    :param sort_keys:
+    :param chunk_size: minimum size of the chunks yielded
+    :return: generator of str chunks
+    """
+    buffer = []
+    size = 0
+    for chunk in _chunks(o, indent, sort_keys, 0):
+        buffer.append(chunk)
+        size += len(chunk)
+        if size >= chunk_size:
+            yield "".join(buffer)
+            buffer = []
+            size = 0
+    if len(buffer) > 0:
+        yield "".join(buffer)
+
+
+def dump(o, fp, indent=DEFAULT_INDENT, sort_keys=True, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Writes the JSON serialization of o to the file like object fp, see iter_json
+    """
+    for chunk in iter_json(o, indent=indent, sort_keys=sort_keys, chunk_size=chunk_size):
+        fp.write(chunk)
+
+
+def _as_serializable(o):
+    # entities as the structure their toDict() would return, without copying their content
+    if issubclass(type(o), NodeBaseClass):
+        fields = o.serialized_fields()
+        fields[NodeBaseClass.serialize("data")] = o.peek_data()
+        return {
+            NodeBaseClass.serialize("type"): type(o).__name__,
+            NodeBaseClass.serialize("object"): fields
+        }
+    if issubclass(type(o), BaseGraph):
+        return dict(__nodes=o.nodes, __relationships=o.relationships, __namespace_map=o.namespace_map)
+    if hasattr(o, "serialized_fields"):
+        return o.serialized_fields()
+    if issubclass(type(o), CoreNodeClass) or (hasattr(o, "toDict") and not isinstance(o, Mapping)):
+        return o.toDict()
+    if type(o) in (bytes, bytearray):
+        return NodeBaseClass.serialize_bytes(o)
+    return o
+
+
+def _key(k):
+    if type(k) == str:
+        return dumps(k)
+    if k is None or type(k) in (bool, int, float):
+        return dumps(dumps(k))
+    return dumps(str(k))
+
+
+def _items(o, sort_keys):
+    keys = sorted(o.keys()) if sort_keys else o.keys()
+    if issubclass(type(o), dict):
+        # plain dict access, copy on write containers must not be copied by a read only walk
+        return ((k, dict.__getitem__(o, k)) for k in keys)
+    return ((k, o[k]) for k in keys)
+
+
+def _chunks(o, indent, sort_keys, level):
+    o = _as_serializable(o)
+
+    if isinstance(o, Mapping):
+        opening, closing = "{", "}"
+        members = _items(o, sort_keys)
+    elif issubclass(type(o), list):
+        opening, closing = "[", "]"
+        members = ((None, v) for v in list.__iter__(o))
+    elif issubclass(type(o), tuple) or (hasattr(o, "__iter__") and type(o) not in (str, bytes, bytearray)):
+        opening, closing = "[", "]"
+        members = ((None, v) for v in o)
+    else:
+        yield dumps(o)
+        return
+
+    separator = "\n" + " " * (indent * (level + 1)) if indent > 0 else ""
+    key_separator = ": " if indent > 0 else ":"
+    started = False
+    for k, v in members:
+        yield ("," if started else opening) + separator
+        if opening == "{":
+            yield _key(k) + key_separator
+        started = True
+        yield from _chunks(v, indent, sort_keys, level + 1)
+
+    if started:
+        yield ("\n" + " " * (indent * level) if indent > 0 else "") + closing
+    else:
+        yield opening + closing
@@ -3,6 +3,7 @@ from abc import ABC, abstractmethod
 from datetime import datetime
 
 from tomi_graph.frozen_entity_warning import FrozenEntityWarning
+from tomi_graph.version_store import VersionStore
 
 
 class VersionAwareEntity(ABC):
@@ -12,6 +13,20 @@ class VersionAwareEntity(ABC):
             object.__setattr__(self, "_frozen", False)
         return getattr(self, "_frozen", False)
 
+    @property
+    def version_store(self):
+        """
+        Versions of this entity, created with the entity as its first version and shared by the versions
+        derived from it with new_version()
+        :return:
+        """
+        store = self.__dict__.get("_version_store")
+        if store is None:
+            store = VersionStore()
+            object.__setattr__(self, "_version_store", store)
+            store.add(self)
+        return store
+
     @abstractmethod
     def clone(self, new=None):
         raise NotImplementedError
@@ -35,20 +50,31 @@ class VersionAwareEntity(ABC):
         object.__setattr__(self, "_frozen", False)
 
     def new_version(self, data=None):
+        """
+        Writable clone of this entity, which is frozen. Versions are numbered after the latest version of the lineage,
+        so branching twice from the same version gives two distinct versions.
+        :param data: data of the new version
+        :return:
+        """
         timestamp = int(datetime.utcnow().timestamp())
+        store = self.version_store
         clone = self.clone()
-        try:
-            clone._version += 1
-        except TypeError:
+        version = getattr(self, "_version", 0)
+        if type(version) != int:
             try:
-                setattr(self, "_version", int(getattr(self, "_version", 0)))
-            except ValueError:
-                setattr(self, "_version", 0)
-            clone._version = getattr(self, "_version", 0) + 1
+                version = int(version)
+            except (TypeError, ValueError):
+                version = 0
+            setattr(self, "_version", version)
+        latest = store.latest_version
+        clone._version = max(version, latest if latest is not None else version) + 1
         self.freeze()
 
         if data is not None:
             clone.set_data(data)
         clone._update_date = timestamp
 
+        object.__setattr__(clone, "_version_store", store)
+        store.add(clone)
+
         return clone
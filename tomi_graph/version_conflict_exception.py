@@ -0,0 +1,2 @@
+class VersionConflictException(Exception):
+    pass
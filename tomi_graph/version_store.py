@@ -0,0 +1,159 @@
+from bisect import bisect_left, bisect_right
+from datetime import datetime
+
+from tomi_graph.version_conflict_exception import VersionConflictException
+
+
+class _Missing(object):
+    def __repr__(self):
+        return "MISSING"
+
+
+class VersionStore(object):
+    """
+    Lineage of a version aware entity. Versions are copy on write clones of each other, so the store only pays for
+    what changed between two versions.
+    """
+    MISSING = _Missing()
+
+    def __init__(self, keep_last=None, max_age=None):
+        """
+
+        :param keep_last: number of most recent versions retained
+        :param max_age: versions last updated more than max_age seconds ago are pruned
+        """
+        self._versions = []
+        self._entities = []
+        self._keep_last = keep_last
+        self._max_age = max_age
+
+    @property
+    def versions(self):
+        return list(self._versions)
+
+    @property
+    def latest(self):
+        return self._entities[-1] if len(self._entities) > 0 else None
+
+    @property
+    def latest_version(self):
+        return self._versions[-1] if len(self._versions) > 0 else None
+
+    def add(self, entity):
+        """
+        Adds a version of the entity, raises VersionConflictException when the store holds another entity with the
+        same version number
+        :param entity:
+        :return:
+        """
+        version = int(getattr(entity, "version", getattr(entity, "_version", 0)))
+        index = bisect_left(self._versions, version)
+        if index < len(self._versions) and self._versions[index] == version:
+            if self._entities[index] is not entity:
+                raise VersionConflictException("Version {v} is already in the store.".format(v=version))
+        else:
+            self._versions.insert(index, version)
+            self._entities.insert(index, entity)
+        self.prune()
+
+    def get(self, version, default=None):
+        index = bisect_left(self._versions, version)
+        if index < len(self._versions) and self._versions[index] == version:
+            return self._entities[index]
+        return default
+
+    def at(self, version):
+        """
+        Latest version lower or equal to version
+        :param version:
+        :return:
+        """
+        index = bisect_right(self._versions, version)
+        return self._entities[index - 1] if index > 0 else None
+
+    def retain(self, keep_last=None, max_age=None):
+        self._keep_last = keep_last
+        self._max_age = max_age
+        return self.prune()
+
+    def prune(self, now=None):
+        """
+        Applies the retention policies, the latest version is always kept
+        :param now: reference timestamp for max_age
+        :return: number of versions pruned
+        """
+        count = 0
+        if self._keep_last is not None:
+            count = max(0, len(self._versions) - max(1, int(self._keep_last)))
+        if self._max_age is not None:
+            now = int(datetime.utcnow().timestamp()) if now is None else now
+            while count < len(self._versions) - 1:
+                update_date = getattr(self._entities[count], "update_date", None)
+                if update_date is None or update_date >= now - self._max_age:
+                    break
+                count += 1
+        if count > 0:
+            del self._versions[:count]
+            del self._entities[:count]
+        return count
+
+    def diff(self, from_version, to_version):
+        """
+        Compact difference between two versions
+        :return: list of (path, old value, new value), MISSING standing for absent values
+        """
+        return VersionStore.compare(self[from_version], self[to_version])
+
+    @staticmethod
+    def compare(old, new):
+        def fields(entity):
+            if hasattr(entity, "serialized_fields"):
+                return entity.serialized_fields()
+            return {k: v for k, v in entity.__dict__.items() if k != "_data" and k not in getattr(
+                entity, "TRANSIENT_FIELDS", ())}
+
+        def data(entity):
+            return entity.peek_data() if hasattr(entity, "peek_data") else entity.__dict__.get("_data")
+
+        changes = []
+
+        def walk(path, a, b):
+            # unchanged structures are shared between versions and skipped without being walked
+            if a is b:
+                return
+            if issubclass(type(a), dict) and issubclass(type(b), dict):
+                for k in set(dict.keys(a)).union(dict.keys(b)):
+                    walk(path + (k,), dict.get(a, k, VersionStore.MISSING), dict.get(b, k, VersionStore.MISSING))
+            elif issubclass(type(a), list) and issubclass(type(b), list):
+                for idx in range(max(len(a), len(b))):
+                    walk(path + (idx,),
+                         list.__getitem__(a, idx) if idx < len(a) else VersionStore.MISSING,
+                         list.__getitem__(b, idx) if idx < len(b) else VersionStore.MISSING)
+            elif type(a) != type(b) or a != b:
+                changes.append((path, a, b))
+
+        walk(("data",), data(old), data(new))
+        walk((), fields(old), fields(new))
+        return changes
+
+    def __getitem__(self, version):
+        entity = self.get(version, VersionStore.MISSING)
+        if entity is VersionStore.MISSING:
+            raise KeyError(version)
+        return entity
+
+    def __contains__(self, version):
+        return self.get(version, VersionStore.MISSING) is not VersionStore.MISSING
+
+    def __len__(self):
+        return len(self._versions)
+
+    def __iter__(self):
+        return iter(list(self._entities))
+
+    def __copy__(self):
+        # copies of an entity belong to the same lineage
+        return self
+
+    def __deepcopy__(self, memo):
+        return self
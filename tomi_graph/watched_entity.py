@@ -0,0 +1,38 @@
+import weakref
+
+
+class WatchedEntity(object):
+    """
+    Entity notifying the objects watching it (graphs maintaining indexes over it) when one of its fields changes.
+    Watchers are only weakly referenced and must implement on_entity_changed(entity, name), raising to refuse the change.
+    """
+
+    def watch(self, watcher):
+        watchers = self.__dict__.get("_watchers")
+        if watchers is None:
+            watchers = {}
+            object.__setattr__(self, "_watchers", watchers)
+        watchers[id(watcher)] = weakref.ref(watcher)
+
+    def unwatch(self, watcher):
+        watchers = self.__dict__.get("_watchers")
+        if watchers is not None:
+            watchers.pop(id(watcher), None)
+
+    def _notify_watchers(self, name):
+        watchers = self.__dict__.get("_watchers")
+        if not watchers:
+            return
+        # every watcher is notified, the first one refusing the change raises afterwards
+        error = None
+        for key, ref in list(watchers.items()):
+            watcher = ref()
+            if watcher is None:
+                watchers.pop(key, None)
+                continue
+            try:
+                watcher.on_entity_changed(self, name)
+            except Exception as e:
+                error = e if error is None else error
+        if error is not None:
+            raise error